@@ -0,0 +1,172 @@
+"""
+快慢模型级联：先用快模型生成，输出通过结构校验即返回，校验失败或调用出错时再升级到慢模型
+
+- 用于 PRD、学习内容与测试题的生成；LLM_CASCADE=0 时只调用慢模型（原行为）
+- 指定 best_effort 时（如 PRD），最后一级的输出仍未通过启发式校验也不报错，记录警告后尽力返回
+- 指定 schema 时按 LLM_JSON_MODE 请求结构化输出（JSON 模式或 JSON Schema），
+  模型不支持时自动去掉该参数重试，并在本进程内记住
+- LLM_HEDGE_TASKS 中的任务通过 agents.hedging 发出对冲请求
+- 指标：llm_cascade_requests（按任务与最终完成的角色）、llm_cascade_escalations（按任务与原因）、
+  llm_cascade_escalation_rate（按任务的升级比例）、llm_cascade_seconds（按任务与最终完成的角色的总耗时）
+
+用法：
+    content = run_cascade(context, "learning_content", messages, parse_learning_content,
+                          schema=KnowledgePointGenerateResponse)
+"""
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel
+
+from agents.hedging import hedge_enabled, hedged_completion
+from executor.execution_context import ExecutionContext
+from utils.logger import get_logger
+from utils.metrics import registry
+from utils.settings import get_settings
+from utils.tracing import SPAN_KIND_CLIENT, record_llm_usage, span
+
+# 级联顺序：快模型在前，慢模型兜底
+CASCADE_ROLES = ("fast", "slow")
+
+cascade_requests = registry.counter("llm_cascade_requests", "级联生成次数（按任务与最终完成的角色）")
+cascade_escalations = registry.counter("llm_cascade_escalations", "升级到下一级模型的次数（按任务与原因）")
+cascade_escalation_rate = registry.gauge("llm_cascade_escalation_rate", "需要升级到慢模型的请求比例（按任务）")
+cascade_best_effort = registry.counter("llm_cascade_best_effort", "未通过校验、按尽力而为返回的输出次数（按任务）")
+cascade_seconds = registry.histogram("llm_cascade_seconds", "级联生成总耗时（秒，按任务与最终完成的角色）")
+
+logger = get_logger(__name__)
+
+_totals_lock = threading.Lock()
+# 任务 -> [总次数, 升级次数]
+_totals: Dict[str, List[int]] = {}
+# 拒绝 response_format 参数的模型，之后不再携带该参数
+_json_mode_unsupported = set()
+
+
+class CascadeError(Exception):
+    """所有级别的模型都未生成有效输出"""
+
+    def __init__(self, task: str, errors: List[Tuple[str, str]], generated: bool = False):
+        self.task = task
+        self.errors = errors
+        # 是否有模型返回了输出（只是无法解析或未通过校验），未配置客户端或调用失败时为 False
+        self.generated = generated
+        super().__init__("; ".join(f"{role}: {error}" for role, error in errors))
+
+
+def cascade_roles() -> Tuple[str, ...]:
+    return CASCADE_ROLES if get_settings().llm_cascade else CASCADE_ROLES[-1:]
+
+
+def response_format(task: str, schema: Optional[Type[BaseModel]]) -> Dict[str, Any]:
+    """按 LLM_JSON_MODE 生成结构化输出的请求参数"""
+    mode = get_settings().llm_json_mode
+    if schema is None or mode == "off":
+        return {}
+    if mode == "json_schema":
+        return {"response_format": {"type": "json_schema",
+                                    "json_schema": {"name": task, "schema": schema.schema()}}}
+    return {"response_format": {"type": "json_object"}}
+
+
+def _create(client: Any, model: str, messages: List[Dict[str, str]], extra: Dict[str, Any], task: str) -> Any:
+    if model in _json_mode_unsupported:
+        extra = {}
+    if hedge_enabled(task):
+        create = lambda **kwargs: hedged_completion(client, model, messages, task, **kwargs)
+    else:
+        create = lambda **kwargs: client.chat.completions.create(model=model, messages=messages, **kwargs)
+    try:
+        return create(**extra)
+    except Exception as e:
+        # 部分兼容接口不支持 response_format，返回 400；去掉该参数重试一次。
+        # 其它原因的 400（上下文过长、参数错误等）不重试，也不影响之后的请求
+        if not extra or getattr(e, "status_code", None) != 400 or not _refers_to_response_format(e):
+            raise
+        logger.warning("模型不支持结构化输出参数，改为普通请求", model=model, error=str(e)[:500])
+        response = create()
+        # 去掉参数后成功才确认是该参数的问题，之后对该模型不再携带
+        _json_mode_unsupported.add(model)
+        return response
+
+
+def _refers_to_response_format(error: Exception) -> bool:
+    return getattr(error, "param", None) == "response_format" or "response_format" in str(error)
+
+
+def _record(task: str, role: str, escalated: bool, seconds: float) -> None:
+    cascade_requests.inc(task=task, role=role)
+    cascade_seconds.observe(seconds, task=task, role=role)
+    with _totals_lock:
+        totals = _totals.setdefault(task, [0, 0])
+        totals[0] += 1
+        totals[1] += int(escalated)
+        cascade_escalation_rate.set(round(totals[1] / totals[0], 4), task=task)
+
+
+def run_cascade(context: ExecutionContext, task: str, messages: List[Dict[str, str]],
+                parse: Callable[[str], Any], schema: Optional[Type[BaseModel]] = None,
+                roles: Optional[Sequence[str]] = None,
+                best_effort: Optional[Callable[[str], Any]] = None) -> Any:
+    """
+    按级联顺序调用模型，返回第一个通过校验的输出
+
+    :param task: 任务名称（用于指标与日志，如 prd、learning_content、test_task）
+    :param parse: 解析并校验模型输出，不符合要求时抛出异常（ValueError、pydantic.ValidationError 等）
+    :param schema: 输出为 JSON 时的结构，用于请求结构化输出
+    :param roles: 依次尝试的角色，默认按 cascade_roles()
+    :param best_effort: 所有级别的输出都未通过 parse 时，用它转换最后一个模型输出并返回，而不是抛出异常；
+        只适合校验为启发式、不合格的输出仍可使用的任务
+    :raises CascadeError: 所有级别都失败（指定 best_effort 时为没有任何模型返回输出）
+    """
+    started = time.perf_counter()
+    errors: List[Tuple[str, str]] = []
+    generated = False
+    # 最后一个未通过校验的输出（角色, 模型, 原始输出），供 best_effort 使用
+    rejected: Optional[Tuple[str, str, str]] = None
+    extra = response_format(task, schema)
+    for attempt, role in enumerate(roles or cascade_roles()):
+        client = context.get_client(role)
+        model = context.get_model(role)
+        if client is None:
+            errors.append((role, "客户端未配置"))
+            continue
+        with span("llm.call", kind=SPAN_KIND_CLIENT, **{"gen_ai.request.model": model,
+                                                       "cascade.task": task, "cascade.role": role,
+                                                       "cascade.attempt": attempt}) as current:
+            try:
+                response = _create(client, model, messages, extra, task)
+                record_llm_usage(current, response)
+                choice = response.choices[0]
+                raw = (choice.message.content or "").strip()
+                current.set_attributes(response_chars=len(raw),
+                                       **{"gen_ai.response.finish_reasons": getattr(choice, "finish_reason", None)})
+            except Exception as e:
+                reason, error = "error", e
+                current.set_error(str(e))
+            else:
+                generated = True
+                try:
+                    result = parse(raw)
+                except Exception as e:
+                    reason, error = "invalid", e
+                    if raw:
+                        rejected = (role, model, raw)
+                else:
+                    _record(task, role, attempt > 0, time.perf_counter() - started)
+                    return result
+            current.set_attribute("cascade.outcome", reason)
+        errors.append((role, str(error)))
+        cascade_escalations.inc(task=task, reason=reason)
+        logger.warning("模型输出未通过校验，升级到下一级模型" if reason == "invalid" else "模型调用失败，升级到下一级模型",
+                       task=task, role=role, model=model, error=str(error)[:500])
+    if best_effort is not None and rejected is not None:
+        role, model, raw = rejected
+        _record(task, role, len(errors) > 1, time.perf_counter() - started)
+        cascade_best_effort.inc(task=task)
+        logger.warning("所有级别的输出都未通过校验，返回最后一个输出", task=task, role=role, model=model,
+                       error=errors[-1][1][:500])
+        return best_effort(raw)
+    _record(task, "failed", len(errors) > 1, time.perf_counter() - started)
+    raise CascadeError(task, errors, generated)
@@ -1,16 +1,30 @@
 # fast_mind.py
-import os
-import re
-import json
+from typing import Dict, List
+from agents.cascade import CascadeError, run_cascade
+from agents.schemas import KnowledgeGraphResponse
 from utils.prompts import get_knowledge_points_prompt
 from utils.prompts import get_knowledge_points_prompt_from_html
+from utils.json_codec import dumps
+from utils.storage import storage
 from executor.execution_context import ExecutionContext
+from utils.json_repair import loads_lenient
+from utils.logger import DEBUG, get_logger
+from utils.tracing import span
+
+logger = get_logger(__name__)
+
+
+def _parse_knowledge_points(raw: str) -> dict:
+    with span("parse_knowledge_points"):
+        return loads_lenient(raw, KnowledgeGraphResponse.parse_obj).dict()
 
 class FastMind:
     def __init__(self, context: ExecutionContext):
         self.context = context
         self.client = context.get_client("fast")
         self.model = context.get_model("fast")
+        # 最近一次生成是否退回了模拟知识点（调用方据此决定是否缓存结果）
+        self.used_mock = False
 
     def extract_knowledge_points_from_html(self, html_content: str, prd_text: str = "") -> dict:
         """
@@ -20,37 +34,17 @@ class FastMind:
         :param prd_text: 可选，SlowMind 生成的 PRD 文件内容（用于增强语义理解）
         :return: 生成的知识点数据（Python dict 格式）
         """
-        prompt = get_knowledge_points_prompt_from_html(html_content, prd_text)
+        with span("render_prompt"):
+            messages = get_knowledge_points_prompt_from_html(html_content, prd_text)
 
-        if self.context.use_mock:
-            print("使用 Mock 模式，返回模拟知识点")
-            knowledge_tree = self._get_mock_knowledge_points()
-        else:
-            print("正在分析 HTML 内容并生成知识图谱 / 任务树...\n")
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                raw = response.choices[0].message.content.strip()
-                raw_cleaned = re.sub(r"[\x00-\x1f\x7f]", "", raw)  # 移除非法字符
-                knowledge_tree = json.loads(raw_cleaned)
-
-                print("\n生成知识点：\n")
-                for node in knowledge_tree.get("nodes", []):
-                    print(f"{node['data']['id']} - {node['data']['label']}")
-
-            except Exception as e:
-                print("模型原始返回：", raw[:500])
-                print("解析知识点失败:", e)
-                knowledge_tree = self._get_mock_knowledge_points()
+        logger.info("正在分析 HTML 内容并生成知识图谱 / 任务树", model=self.model)
+        knowledge_tree = self._generate_knowledge_points(messages)
 
         # 保存 JSON 到文件
-        save_path = os.path.join("data", "knowledge", "knowledge_graph.json")
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, "w", encoding="utf-8") as f:
-            json.dump(knowledge_tree, f, ensure_ascii=False, indent=2)
-        print(f"知识点已保存到：{save_path}")
+        save_key = "knowledge/knowledge_graph.json"
+        with span("save_knowledge_graph"):
+            storage.put(save_key, dumps(knowledge_tree))
+        logger.info("知识点已保存", key=save_key)
 
         return knowledge_tree
     
@@ -60,37 +54,17 @@ class FastMind:
         :param reference_url: 示例网站链接
         :return: 知识点树（JSON）
         """
-        prompt = get_knowledge_points_prompt(reference_url)
+        with span("render_prompt"):
+            messages = get_knowledge_points_prompt(reference_url)
 
-        if self.context.use_mock:
-            print("使用 Mock 模式，返回模拟知识点")
-            knowledge_tree = self._get_mock_knowledge_points()
-        else:
-            print("正在分析网站知识点...\n")
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                raw = response.choices[0].message.content.strip()
-                raw_cleaned = re.sub(r"[\x00-\x1f\x7f]", "", raw)  # 移除非法字符
-                knowledge_tree = json.loads(raw_cleaned)
-
-                print("\n生成知识点：\n")
-                for node in knowledge_tree.get("nodes", []):
-                    print(f"{node['data']['id']} - {node['data']['label']}")
-
-            except Exception as e:
-                print("模型原始返回：", raw[:500])
-                print("解析知识点失败:", e)
-                knowledge_tree = self._get_mock_knowledge_points()
+        logger.info("正在分析网站知识点", model=self.model, url=reference_url)
+        knowledge_tree = self._generate_knowledge_points(messages)
 
         # 保存 JSON 到文件
-        save_path = os.path.join("data", "knowledge", "knowledge_graph.json")
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, "w", encoding="utf-8") as f:
-            json.dump(knowledge_tree, f, ensure_ascii=False, indent=2)
-        print(f"知识点已保存到：{save_path}")
+        save_key = "knowledge/knowledge_graph.json"
+        with span("save_knowledge_graph"):
+            storage.put(save_key, dumps(knowledge_tree))
+        logger.info("知识点已保存", key=save_key)
 
         return knowledge_tree
 
@@ -133,6 +107,34 @@ class FastMind:
         
         return learning_content
 
+    def _generate_knowledge_points(self, messages: List[Dict[str, str]]) -> dict:
+        """
+        调用快模型生成知识图谱；输出经容错解析与结构校验，修复后仍无法使用时抛出 CascadeError
+
+        未配置模型（Mock 模式或缺少 API_KEY）或调用失败时返回模拟知识点，并把 used_mock 置为 True
+        """
+        self.used_mock = False
+        if self.context.use_mock:
+            logger.info("使用 Mock 模式，返回模拟知识点")
+            self.used_mock = True
+            return self._get_mock_knowledge_points()
+        try:
+            knowledge_tree = run_cascade(self.context, "knowledge_points", messages, _parse_knowledge_points,
+                                         schema=KnowledgeGraphResponse, roles=("fast",))
+        except CascadeError as e:
+            if e.generated:
+                raise
+            logger.warning("生成知识点失败，返回模拟知识点", error=str(e))
+            self.used_mock = True
+            return self._get_mock_knowledge_points()
+
+        nodes = knowledge_tree["nodes"]
+        logger.info("生成知识点", nodes=len(nodes))
+        if logger.is_enabled_for(DEBUG):
+            for node in nodes:
+                logger.debug("知识点", sample=0.1, node_id=node["data"]["id"], label=node["data"]["label"])
+        return knowledge_tree
+
     def _get_mock_knowledge_points(self) -> dict:
         """模拟数据（调试用）"""
         return {
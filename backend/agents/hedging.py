@@ -0,0 +1,227 @@
+"""
+对冲请求：交互式生成在延迟分位数内还没有收到首个 token 时，再发一个相同的请求，先出首个 token 的胜出
+
+- 胜出后取消其余的对冲请求，主请求则保留到胜出方完成：胜出方中途失败时由主请求接替，任何一方先完成即返回其结果
+- 只对 LLM_HEDGE_TASKS 中列出的任务启用（如 learning_content,test_task），默认关闭
+- 对冲延迟取该任务与模型最近首 token 耗时的 LLM_HEDGE_PERCENTILE 分位数，样本不足时用 LLM_HEDGE_DELAY；
+  从主请求实际开始执行时计时，不包含在线程池中排队的时间
+- 额外请求受 LLM_HEDGE_BUDGET 限制：每个请求积累该比例的额度，对冲一次消耗 1，额度不足时不对冲
+- 对冲的请求以流式方式调用，以便检测首个 token 并在落后时关闭连接；流式响应不含 token 用量
+- 指标：llm_hedge_requests、llm_hedges（按胜出方）、llm_hedge_rate、llm_hedge_delay_seconds、
+  llm_hedge_saved_seconds（对冲请求胜出时，至少节省的首 token 等待时间）
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+from utils.metrics import registry
+from utils.settings import get_settings
+
+hedge_requests = registry.counter("llm_hedge_requests", "启用对冲的模型调用次数（按任务）")
+hedges = registry.counter("llm_hedges", "发出对冲请求的次数（按任务与胜出方 primary/hedge）")
+hedge_skipped = registry.counter("llm_hedge_skipped", "达到对冲延迟但额度不足、未发出对冲的次数（按任务）")
+hedge_rate = registry.gauge("llm_hedge_rate", "发出对冲请求的比例（按任务）")
+hedge_delay = registry.gauge("llm_hedge_delay_seconds", "当前的对冲延迟（秒，按任务与模型）")
+hedge_saved = registry.histogram("llm_hedge_saved_seconds", "对冲请求胜出时至少节省的首 token 等待时间（秒，按任务）")
+
+logger = get_logger(__name__)
+
+# 计算分位数所需的最少样本数，与保留的最近样本数
+MIN_SAMPLES = 20
+MAX_SAMPLES = 200
+# 对冲额度的上限，避免长时间无对冲后集中发出大量额外请求
+MAX_BUDGET_CREDITS = 10.0
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+_lock = threading.Lock()
+# (任务, 模型) -> 最近的首 token 耗时
+_samples: Dict[Tuple[str, str], Deque[float]] = {}
+# 任务 -> [额度, 调用次数, 对冲次数]
+_budgets: Dict[str, List[float]] = {}
+
+
+def hedge_enabled(task: str) -> bool:
+    return task in {name.strip() for name in get_settings().llm_hedge_tasks.split(",") if name.strip()}
+
+
+def _delay(task: str, model: str) -> float:
+    settings = get_settings()
+    with _lock:
+        samples = sorted(_samples.get((task, model), ()))
+    if len(samples) < MIN_SAMPLES:
+        delay = settings.llm_hedge_delay
+    else:
+        delay = samples[min(len(samples) - 1, int(len(samples) * settings.llm_hedge_percentile / 100))]
+    hedge_delay.set(round(delay, 4), task=task, model=model)
+    return delay
+
+
+def _observe(task: str, model: str, seconds: float) -> None:
+    with _lock:
+        _samples.setdefault((task, model), deque(maxlen=MAX_SAMPLES)).append(seconds)
+
+
+def _count_request(task: str) -> None:
+    budget = get_settings().llm_hedge_budget
+    with _lock:
+        state = _budgets.setdefault(task, [MAX_BUDGET_CREDITS, 0, 0])
+        state[0] = min(MAX_BUDGET_CREDITS, state[0] + budget)
+        state[1] += 1
+        hedge_rate.set(round(state[2] / state[1], 4), task=task)
+    hedge_requests.inc(task=task)
+
+
+def _take_budget(task: str) -> bool:
+    with _lock:
+        state = _budgets[task]
+        if state[0] < 1:
+            return False
+        state[0] -= 1
+        state[2] += 1
+        hedge_rate.set(round(state[2] / state[1], 4), task=task)
+        return True
+
+
+class _Attempt:
+    """一次流式调用：在线程池中读取响应，把开始执行、首个 token、完成与错误事件放入队列"""
+
+    def __init__(self, name: str, events: "queue.Queue"):
+        self.name = name
+        self.events = events
+        # 在线程池中实际开始执行的时间（排队期间为 None）
+        self.started: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.cancelled = threading.Event()
+        self._stream = None
+
+    def run(self, client: Any, model: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> None:
+        self.started = time.perf_counter()
+        self.events.put(("started", self, None))
+        try:
+            self._stream = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+            if self.cancelled.is_set():
+                self._close()
+                return
+            parts: List[str] = []
+            finish_reason = None
+            for chunk in self._stream:
+                if self.cancelled.is_set():
+                    break
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta.content:
+                    if self.first_token is None:
+                        self.first_token = time.perf_counter()
+                        self.events.put(("first", self, None))
+                    parts.append(choice.delta.content)
+                finish_reason = choice.finish_reason or finish_reason
+            if self.cancelled.is_set():
+                self._close()
+                return
+            self.events.put(("done", self, SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="".join(parts)), finish_reason=finish_reason)],
+                usage=None,
+            )))
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.events.put(("error", self, e))
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        self._close()
+
+    def _close(self) -> None:
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.response.close()
+            except Exception:
+                pass
+
+
+def hedged_completion(client: Any, model: str, messages: List[Dict[str, str]], task: str, **kwargs) -> Any:
+    """
+    带对冲的模型调用，返回与非流式调用相同结构的响应（choices[0].message.content、finish_reason）
+
+    :raises Exception: 所有请求都失败时抛出最后一个错误
+    """
+    _count_request(task)
+    delay = _delay(task, model)
+    events: "queue.Queue" = queue.Queue()
+    primary = _Attempt("primary", events)
+    attempts = [primary]
+    _executor.submit(primary.run, client, model, messages, kwargs)
+
+    winner: Optional[_Attempt] = None
+    hedged = hedge_decided = False
+    while True:
+        timeout = None
+        if winner is None and not hedge_decided and primary.started is not None:
+            timeout = max(0.0, primary.started + delay - time.perf_counter())
+        try:
+            kind, attempt, payload = events.get(timeout=timeout)
+        except queue.Empty:
+            hedge_decided = True
+            if _take_budget(task):
+                hedged = True
+                logger.info("首 token 超过对冲延迟，发出对冲请求", task=task, model=model, delay=round(delay, 3))
+                backup = _Attempt("hedge", events)
+                attempts.append(backup)
+                _executor.submit(backup.run, client, model, messages, kwargs)
+            else:
+                hedge_skipped.inc(task=task)
+            continue
+
+        if kind == "started":
+            # 主请求开始执行后才开始计算对冲延迟
+            continue
+
+        if kind == "first":
+            if attempt is primary:
+                _observe(task, model, primary.first_token - primary.started)
+            if winner is None:
+                winner = attempt
+                # 主请求不取消：对冲请求中途失败时由主请求接替，胜出方完成时再取消
+                for other in attempts:
+                    if other is not attempt and other is not primary:
+                        other.cancel()
+            elif attempt is primary:
+                hedge_saved.observe(primary.first_token - winner.first_token, task=task)
+            continue
+
+        if kind == "error":
+            attempts.remove(attempt)
+            live = [other for other in attempts if not other.cancelled.is_set()]
+            if live:
+                # 胜出的请求中途失败时，改由仍在进行的请求完成
+                if attempt is winner:
+                    winner = next((other for other in live if other.first_token is not None), None)
+                continue
+            _finish(task, model, attempts, None, primary, hedged)
+            raise payload
+
+        # kind == "done"：已取消的请求不会发出完成事件，任何一方先完成都直接采用
+        winner = attempt
+        _finish(task, model, attempts, winner, primary, hedged)
+        return payload
+
+
+def _finish(task: str, model: str, attempts: List[_Attempt], winner: Optional[_Attempt],
+            primary: _Attempt, hedged: bool) -> None:
+    if winner is not None and winner is not primary and primary in attempts and primary.first_token is None:
+        # 主请求直到对冲请求完成都没有首个 token：节省的时间至少是对冲请求首 token 之后的这段时间
+        now = time.perf_counter()
+        hedge_saved.observe(now - (winner.first_token or now), task=task)
+        if primary.started is not None:
+            _observe(task, model, now - primary.started)
+    for attempt in attempts:
+        if attempt is not winner:
+            attempt.cancel()
+    if hedged:
+        hedges.inc(task=task, winner=winner.name if winner is not None else "failed")
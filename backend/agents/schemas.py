@@ -0,0 +1,98 @@
+"""
+模型输出的结构定义：接口响应与级联调用（agents.cascade）的输出校验共用
+"""
+import re
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, root_validator, validator
+
+# PRD 文档应包含的章节（与 get_website_analysis_prompt 等提示词中的输出格式一致）；
+# 模型常按用户语言翻译章节标题，因此同时按 Markdown 标题行计数，不依赖标题文字
+PRD_SECTIONS = (
+    "Website Overview",
+    "Visual & Style Characteristics",
+    "Layout & Structure",
+    "Interaction Patterns",
+    "Content Strategy",
+    "Technical Implementation Insights",
+    "Component Inventory",
+)
+# 至少包含的章节数与最短长度，低于此视为输出不完整
+PRD_MIN_SECTIONS = 5
+PRD_MIN_CHARS = 300
+# Markdown 标题（# 标题）或单独成行的加粗标题（**标题** / 1. **标题**）
+_HEADING_PATTERN = re.compile(r"^\s{0,3}(?:#{1,6}\s+\S.*|(?:\d+[.、]\s*)?\*\*[^*\n]+\*\*\s*[:：]?)\s*$", re.MULTILINE)
+
+
+class KnowledgeGraphResponse(BaseModel):
+    """知识图谱（cytoscape 元素格式），与 get_knowledge_points_prompt 等提示词中的输出格式一致"""
+    nodes: List[Dict[str, Any]]
+    edges: List[Dict[str, Any]] = []
+    dependent_edges: List[Dict[str, Any]] = []
+
+    class Config:
+        # 保留模型输出中的其它字段
+        extra = "allow"
+
+    @validator("nodes")
+    def nodes_have_id_and_label(cls, nodes):
+        if not nodes:
+            raise ValueError("nodes 不能为空")
+        for node in nodes:
+            data = node.get("data")
+            if not isinstance(data, dict) or not data.get("id") or not data.get("label"):
+                raise ValueError("每个节点都需要 data.id 与 data.label")
+        return nodes
+
+    @root_validator(skip_on_failure=True)
+    def drop_dangling_edges(cls, values):
+        # 输出截断修复后，边可能指向被丢弃的节点
+        ids = {node["data"]["id"] for node in values["nodes"]}
+        for key in ("edges", "dependent_edges"):
+            values[key] = [edge for edge in values[key]
+                           if isinstance(edge.get("data"), dict)
+                           and edge["data"].get("source") in ids and edge["data"].get("target") in ids]
+        return values
+
+
+class KnowledgePointGenerateResponse(BaseModel):
+    topic_id: str
+    title: str
+    levels: List[Dict[str, Any]]
+
+    @validator("levels")
+    def levels_have_description(cls, levels):
+        if not levels:
+            raise ValueError("levels 不能为空")
+        for level in levels:
+            if not isinstance(level.get("description"), str) or not level["description"].strip():
+                raise ValueError("每个 level 都需要 description")
+        return levels
+
+
+class TestTaskGenerateResponse(BaseModel):
+    topic_id: str
+    title: str
+    description_md: str
+    start_code: Dict[str, str]
+    checkpoints: List[Dict[str, Any]]
+    answer: Dict[str, str]
+
+    @validator("checkpoints")
+    def checkpoints_not_empty(cls, checkpoints):
+        if not checkpoints:
+            raise ValueError("checkpoints 不能为空")
+        return checkpoints
+
+
+def validate_prd(text: str) -> str:
+    """检查 PRD 文档是否完整：长度与章节数（预期的英文章节标题，或任意语言的标题行）"""
+    text = text.strip()
+    if len(text) < PRD_MIN_CHARS:
+        raise ValueError(f"PRD 内容过短（{len(text)} 字符）")
+    lowered = text.lower()
+    found = max(sum(1 for section in PRD_SECTIONS if section.lower() in lowered),
+                len(set(heading.strip() for heading in _HEADING_PATTERN.findall(text))))
+    if found < PRD_MIN_SECTIONS:
+        raise ValueError(f"PRD 只包含 {found} 个预期章节")
+    return text
@@ -3,20 +3,30 @@ SlowMind：将用户的模糊需求生成详细方案（PRD）
 拓展：生成多套方案供用户选择
 """
 
-import json
-import os
-from openai import OpenAI
 from typing import Dict, Any, Optional
+from utils.storage import storage
 from utils.prompts import (
     get_slow_mind_prompt_from_html,
     get_website_analysis_prompt,
-    get_knowledge_points_prompt_from_html,
-    get_knowledge_points_prompt,
-    generate_demo_site_prompt,
     generate_learning_content_prompt,
     generate_test_task_prompt
 )
 from executor.execution_context import ExecutionContext
+from agents.cascade import CascadeError, cascade_roles, run_cascade
+from agents.schemas import KnowledgePointGenerateResponse, TestTaskGenerateResponse, validate_prd
+from utils.json_repair import loads_lenient
+from utils.logger import get_logger
+from utils.tracing import span
+
+logger = get_logger(__name__)
+
+
+def _parse_learning_content(raw_content: str) -> dict:
+    return loads_lenient(raw_content, KnowledgePointGenerateResponse.parse_obj).dict()
+
+
+def _parse_test_task(raw_content: str) -> dict:
+    return loads_lenient(raw_content, TestTaskGenerateResponse.parse_obj).dict()
 
 
 class SlowMind:
@@ -28,6 +38,8 @@ class SlowMind:
         self.context = context
         self.client = context.get_client("slow")
         self.model = context.get_model("slow")
+        # 最近一次生成的 PRD 是否通过了校验（未通过时为尽力返回的输出，调用方不应缓存复用）
+        self.prd_validated = False
     
     def generate_prd_from_html(self, html_content: str, user_goal: str = "") -> str:
         """
@@ -36,45 +48,46 @@ class SlowMind:
         :param html_content: 用户上传的HTML内容
         :return: PRD文档内容
         """
-        prompt = get_slow_mind_prompt_from_html(html_content,user_goal)
+        with span("render_prompt"):
+            messages = get_slow_mind_prompt_from_html(html_content,user_goal)
 
-        print("正在分析上传的网页内容，生成结构化 PRD 文档...\n")
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        plan = response.choices[0].message.content.strip()
+        logger.info("正在分析上传的网页内容，生成结构化 PRD 文档", roles=cascade_roles())
+        plan = self._generate_prd(messages)
 
         #  保存 PRD 到文件
-        save_path = os.path.join("data", "prd", "html.txt")
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, "w", encoding="utf-8") as f:
-            f.write(plan)
-        print(f"PRD文档 已保存到：{save_path}")
+        save_key = "prd/html.txt"
+        with span("save_prd"):
+            storage.put(save_key, plan.encode("utf-8"))
+        logger.info("PRD文档已保存", key=save_key)
 
         return plan
     
+    def _generate_prd(self, messages) -> str:
+        self.prd_validated = True
+
+        def best_effort(raw: str) -> str:
+            self.prd_validated = False
+            return raw.strip()
+
+        return run_cascade(self.context, "prd", messages, validate_prd, best_effort=best_effort)
+
     def generate_prd(self, user_input: str) -> str:
         """
         生成PRD文档
         :param user_input: 用户输入的参考网站URL
         :return: PRD文档内容
         """
-        prompt = get_website_analysis_prompt(user_input)
+        with span("render_prompt"):
+            messages = get_website_analysis_prompt(user_input)
 
-        print("分析网站，生成网站技术文档\n")
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        plan = response.choices[0].message.content.strip()
+        logger.info("分析网站，生成网站技术文档", roles=cascade_roles(), url=user_input)
+        plan = self._generate_prd(messages)
 
         #  保存 PRD 到文件
-        save_path = os.path.join("data", "prd", "html.txt")
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        with open(save_path, "w", encoding="utf-8") as f:
-            f.write(plan)
-        print(f"PRD文档 已保存到：{save_path}")
+        save_key = "prd/html.txt"
+        with span("save_prd"):
+            storage.put(save_key, plan.encode("utf-8"))
+        logger.info("PRD文档已保存", key=save_key)
 
         return plan
         
@@ -86,42 +99,25 @@ class SlowMind:
         :return: 生成的学习内容
         """
         # 生成提示词
-        prompt = generate_learning_content_prompt(topic_info)
+        with span("render_prompt"):
+            messages = generate_learning_content_prompt(topic_info)
         
-        print(f"正在生成知识点 {topic_info.get('topic_id')} 的学习内容...\n")
+        logger.info("正在生成学习内容", topic_id=topic_info.get("topic_id"))
         
         if self.context.use_mock:
-            print("使用 Mock 模式，返回模拟学习内容")
+            logger.info("使用 Mock 模式，返回模拟学习内容")
             return self._get_mock_learning_content(topic_info)
         
         try:
-            # 获取执行上下文中的 client 和 model
-            client = self.context.get_client("slow")
-            model = self.context.get_model("slow")
-
-            # 调用AI模型生成内容
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "你是一个专业的前端开发导师，能够根据测试题目生成相关的学习内容。"},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            raw_content = response.choices[0].message.content.strip()
-            # 清理可能的代码标记
-            if raw_content.startswith("```json"):
-                raw_content = raw_content[7:]
-            if raw_content.endswith("```"):
-                raw_content = raw_content[:-3]
-                
-            # 解析JSON
-            learning_content = json.loads(raw_content)
-            return learning_content
-            
-        except Exception as e:
-            print(f"生成学习内容时出错: {str(e)}")
-            print("返回模拟学习内容")
+            # 先用快模型生成，输出不符合 KnowledgePointGenerateResponse 结构时再用慢模型
+            return run_cascade(self.context, "learning_content", messages, _parse_learning_content,
+                               schema=KnowledgePointGenerateResponse)
+
+        except CascadeError as e:
+            # 模型有输出但修复后仍无法使用时直接报错，不用模拟内容掩盖
+            if e.generated:
+                raise
+            logger.warning("生成学习内容时出错，返回模拟学习内容", error=str(e))
             return self._get_mock_learning_content(topic_info)
     
     def _get_mock_learning_content(self, topic_info: dict) -> dict:
@@ -167,42 +163,24 @@ class SlowMind:
         :return: 生成的测试题
         """
         # 生成提示词
-        prompt = generate_test_task_prompt(topic_info, learning_content)
+        with span("render_prompt"):
+            messages = generate_test_task_prompt(topic_info, learning_content)
         
-        print(f"正在生成知识点 {topic_info.get('id')} 的测试题...\n")
+        logger.info("正在生成测试题", topic_id=topic_info.get("id"))
         
         if self.context.use_mock:
-            print("使用 Mock 模式，返回模拟测试题")
+            logger.info("使用 Mock 模式，返回模拟测试题")
             return self._get_mock_test_task(topic_info)
         
         try:
-            # 获取执行上下文中的 client 和 model
-            client = self.context.get_client("slow")
-            model = self.context.get_model("slow")
-
-            # 调用AI模型生成测试题
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "你是一名资历丰富的编程出题专家，专门为初学者设计HTML测试题。请严格按照要求的JSON格式输出，不要添加任何其他内容。"},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            raw_content = response.choices[0].message.content.strip()
-            # 清理可能的代码标记
-            if raw_content.startswith("```json"):
-                raw_content = raw_content[7:]
-            if raw_content.endswith("```"):
-                raw_content = raw_content[:-3]
-                
-            # 解析JSON
-            test_task = json.loads(raw_content)
-            return test_task
-            
-        except Exception as e:
-            print(f"生成测试题时出错: {str(e)}")
-            print("返回模拟测试题")
+            # 先用快模型生成，输出不符合 TestTaskGenerateResponse 结构时再用慢模型
+            return run_cascade(self.context, "test_task", messages, _parse_test_task,
+                               schema=TestTaskGenerateResponse)
+
+        except CascadeError as e:
+            if e.generated:
+                raise
+            logger.warning("生成测试题时出错，返回模拟测试题", error=str(e))
             return self._get_mock_test_task(topic_info)
     
     def _get_mock_test_task(self, topic_info: dict) -> dict:
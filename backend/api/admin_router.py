@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from pydantic import BaseModel
+from typing import Optional, List, Dict, Any
+import secrets
+from utils.file_manager import run_io
+from utils.prompts import templates_info
+from utils.settings import get_settings, reload_settings, settings_info
+
+# 未设置 ADMIN_TOKEN 时只允许本机直接访问的客户端地址
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+def require_admin(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """
+    管理接口鉴权：设置 ADMIN_TOKEN 后需在请求头 X-Admin-Token 中携带该值；
+    未设置时只允许本机直接访问（经反向代理转发、带 X-Forwarded-For 的请求同样拒绝）
+    """
+    admin_token = get_settings().admin_token
+    if admin_token:
+        if not (x_admin_token and secrets.compare_digest(x_admin_token, admin_token)):
+            raise HTTPException(status_code=403, detail="需要管理员令牌")
+        return
+    host = request.client.host if request.client else None
+    if host not in LOOPBACK_HOSTS or request.headers.get("x-forwarded-for"):
+        raise HTTPException(status_code=403, detail="未设置 ADMIN_TOKEN，管理接口只允许本机访问")
+
+admin_router = APIRouter(dependencies=[Depends(require_admin)])
+
+class SettingsResponse(BaseModel):
+    version: int
+    loaded_at: float
+    settings: Dict[str, Any]
+
+class ReloadResponse(SettingsResponse):
+    changed: List[str]
+
+class PromptTemplatesResponse(BaseModel):
+    templates: List[Dict[str, Any]]
+
+@admin_router.get("/settings", response_model=SettingsResponse)
+async def get_current_settings():
+    """查看当前配置（密钥只显示末尾 4 位）"""
+    return SettingsResponse(**settings_info())
+
+@admin_router.post("/settings/reload", response_model=ReloadResponse)
+async def reload_current_settings():
+    """
+    重新读取 .env 与环境变量并替换配置；模型客户端池随之切换，进行中的请求继续使用原配置完成
+    """
+    try:
+        changed = await run_io("settings.reload", reload_settings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ReloadResponse(changed=changed, **settings_info())
+
+@admin_router.get("/prompts", response_model=PromptTemplatesResponse)
+async def list_prompt_templates():
+    """列出提示词模板的版本与静态前缀哈希（哈希变化意味着服务端的前缀缓存失效）"""
+    return PromptTemplatesResponse(templates=templates_info())
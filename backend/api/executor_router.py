@@ -1,19 +1,34 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
 import json
 import uuid
-from datetime import datetime
-from agents.slow_mind import SlowMind
+import zipfile
+import tempfile
 from executor.task_executor import TaskExecutor
 from executor.execution_context import ExecutionContext
-import shutil
-import urllib.parse
+from utils.blocking import run_blocking
+from utils.file_manager import resolve_task_public_prefix, task_key, task_store, run_io
+from utils.site_sections import build_manifest, plan_regeneration
+from utils.storage import join_key, storage
+from utils.metrics import registry
+from utils.logger import get_logger, log_context
+from utils.task_events import record_event_async
+from utils.tracing import current_span, span, trace_summary
+from starlette.background import BackgroundTask
 
 executor_router = APIRouter()
 
+logger = get_logger(__name__)
+
+site_generations = registry.counter("site_generations", "示例网页生成次数（按生成方式）")
+site_sections_regenerated = registry.counter("site_sections_regenerated", "增量生成中重新生成或新增的分段数")
+
+# 生成的主页面（单文件）
+INDEX_FILE = "public/index.html"
+
 class ReferenceInfo(BaseModel):
     title: str
     structure: List[Dict[str, Any]]
@@ -31,17 +46,56 @@ class ExecuteTaskRequest(BaseModel):
     prd: PRDInfo
     knowledge_graph: KnowledgeGraphInfo
     user_note: Optional[str] = None
+    # 基准任务ID：指定时只重新生成输入发生变化的分段
+    base_task_id: Optional[str] = None
 
 class ExecuteTaskResponse(BaseModel):
     task_id: str
     files: List[str]
     status: str
+    mode: str = "full"
+    regenerated_sections: List[str] = []
 
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: str
     message: str
     files: List[str]
+    # 生成流程各阶段的耗时汇总（链路追踪），旧任务没有该字段
+    trace: Optional[Dict[str, Any]] = None
+
+def _read_text(key: str) -> Optional[str]:
+    content = storage.get(key)
+    return content.decode("utf-8") if content is not None else None
+
+async def _load_base_page(base_task_id: str):
+    """读取基准任务的分段清单和生成的页面，页面不存在时返回 (清单, None)"""
+    try:
+        page_key = task_key(base_task_id, INDEX_FILE)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="非法的基准任务ID")
+    task_data = await task_store.load(base_task_id)
+    if task_data is None:
+        raise HTTPException(status_code=404, detail="基准任务未找到")
+    html = await run_io("execute.read_base_page", _read_text, page_key)
+    return task_data.get("sections"), html
+
+def _build_zip(prefix: Optional[str]) -> str:
+    """把存储中 prefix 下的文件流式写入临时 ZIP 文件，返回文件路径"""
+    fd, zip_path = tempfile.mkstemp(suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name in storage.list(prefix, recursive=True) if prefix else []:
+                chunks = storage.open_read(join_key(prefix, name))
+                if chunks is None:
+                    continue
+                with archive.open(name, "w") as entry:
+                    for chunk in chunks:
+                        entry.write(chunk)
+    except Exception:
+        os.remove(zip_path)
+        raise
+    return zip_path
 
 @executor_router.post("/", response_model=ExecuteTaskResponse)
 async def execute_task(task_request: ExecuteTaskRequest):
@@ -52,10 +106,22 @@ async def execute_task(task_request: ExecuteTaskRequest):
     - prd: PRD信息
     - knowledge_graph: 知识点图谱
     - user_note: 用户备注
+    - base_task_id: 基准任务ID（可选），指定时只重新生成关联知识点发生变化的分段，
+      PRD 或用户备注变化、基准页面被修改时回退为整页生成
     """
+    # 创建任务ID，任务执行期间的日志都带上该ID
+    task_id = str(uuid.uuid4())
+    root = current_span()
+    if root is not None:
+        root.set_attribute("task_id", task_id)
+    with log_context(task_id=task_id):
+        return await _execute_task(task_id, task_request)
+
+async def _execute_task(task_id: str, task_request: ExecuteTaskRequest) -> ExecuteTaskResponse:
     try:
-        # 创建任务ID
-        task_id = str(uuid.uuid4())
+        logger.info("开始执行网页生成任务", base_task_id=task_request.base_task_id)
+        await record_event_async("start", "开始执行网页生成任务", status="running",
+                                 base_task_id=task_request.base_task_id)
         
         # 初始化执行上下文
         context = ExecutionContext()
@@ -69,12 +135,44 @@ async def execute_task(task_request: ExecuteTaskRequest):
         # 将知识点图谱转换为existing_code_context格式
         existing_code_context = json.dumps(task_request.knowledge_graph.graph, ensure_ascii=False)
         
-        # 执行任务，传递user_note作为user_goal参数
-        result = executor.execute_task(
-            dependency_context=dependency_context,
-            existing_code_context=existing_code_context,
-            user_goal=task_request.user_note or ""
-        )
+        graph = task_request.knowledge_graph.graph
+        user_goal = task_request.user_note or ""
+        output_prefix = task_key(task_id)
+        
+        # 指定基准任务时，与其分段清单比对，决定整页生成还是只生成变化的分段
+        plan = {"mode": "full", "reason": "未指定基准任务"}
+        if task_request.base_task_id:
+            with span("load_base_page", base_task_id=task_request.base_task_id):
+                manifest, base_html = await _load_base_page(task_request.base_task_id)
+            if base_html is None:
+                plan = {"mode": "full", "reason": "基准任务页面不存在"}
+            else:
+                with span("plan_regeneration") as current:
+                    plan = plan_regeneration(manifest, base_html, graph, dependency_context, user_goal)
+                    current.set_attribute("mode", plan["mode"])
+        await record_event_async("plan", plan["reason"], mode=plan["mode"])
+        
+        result = None
+        if plan["mode"] != "full":
+            result = await run_blocking(
+                executor.regenerate_sections,
+                base_html, plan, graph, dependency_context, user_goal, output_prefix=output_prefix
+            )
+            if "error" in result:
+                logger.warning("增量生成失败，改为整页生成", error=result["error"])
+                await record_event_async("plan", "增量生成失败，改为整页生成", mode="full", error=result["error"])
+                plan = {"mode": "full", "reason": result["error"]}
+                result = None
+        
+        if result is None:
+            # 执行任务，传递user_note作为user_goal参数，生成的文件写入任务专属目录
+            result = await run_blocking(
+                executor.execute_task,
+                dependency_context=dependency_context,
+                existing_code_context=existing_code_context,
+                user_goal=user_goal,
+                output_prefix=output_prefix
+            )
         
         # 如果执行出错，抛出异常
         if "error" in result:
@@ -82,32 +180,50 @@ async def execute_task(task_request: ExecuteTaskRequest):
         
         # 提取生成的文件列表
         generated_files = list(result.get("files", {}).keys())
+        regenerated_sections = result.get("regenerated_sections", [])
+        site_generations.inc(mode=plan["mode"])
+        site_sections_regenerated.inc(len(regenerated_sections))
         
-        # 保存任务结果到文件
-        results_dir = os.path.join("data", "results", "project")
-        os.makedirs(results_dir, exist_ok=True)
-        task_file = os.path.join(results_dir, f"{task_id}.json")
-        
+        # 保存任务结果到文件，附带分段清单供下次增量生成使用
+        index_html = result.get("files", {}).get(INDEX_FILE)
         task_data = {
             "task_id": task_id,
             "status": "success",
             "message": "任务执行成功",
             "files": generated_files,
-            "result": result
+            "result": result,
+            "generation": {
+                "mode": plan["mode"],
+                "reason": plan["reason"],
+                "base_task_id": task_request.base_task_id,
+                "regenerated_sections": regenerated_sections
+            },
         }
+        with span("build_manifest"):
+            task_data["sections"] = (build_manifest(index_html.strip(), graph, dependency_context, user_goal)
+                                     if index_html else None)
+        # 各阶段耗时汇总（截至保存任务记录前），完整链路按 OTLP 格式导出
+        task_data["trace"] = trace_summary()
         
-        with open(task_file, "w", encoding="utf-8") as f:
-            json.dump(task_data, f, ensure_ascii=False, indent=2)
+        await task_store.save(task_id, task_data)
+        logger.info("网页生成任务完成", mode=plan["mode"], reason=plan["reason"], files=len(generated_files))
+        await record_event_async("done", "任务执行成功", status="success", mode=plan["mode"],
+                                 files=generated_files, regenerated_sections=regenerated_sections)
         
         return ExecuteTaskResponse(
             task_id=task_id,
             files=generated_files,
-            status="success"
+            status="success",
+            mode=plan["mode"],
+            regenerated_sections=regenerated_sections
         )
-    except HTTPException:
+    except HTTPException as e:
+        await record_event_async("done", "任务执行失败", status="failed", error=e.detail)
         # 重新抛出HTTP异常
         raise
     except Exception as e:
+        logger.exception("任务执行失败")
+        await record_event_async("done", "任务执行失败", status="failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"任务执行失败: {str(e)}")
 
 @executor_router.get("/status/{task_id}", response_model=TaskStatusResponse)
@@ -120,20 +236,17 @@ async def get_task_status(task_id: str):
     """
     try:
         # 读取任务结果文件
-        results_dir = os.path.join("data", "results", "project")
-        task_file = os.path.join(results_dir, f"{task_id}.json")
+        task_data = await task_store.load(task_id)
         
-        if not os.path.exists(task_file):
+        if task_data is None:
             raise HTTPException(status_code=404, detail="任务未找到")
         
-        with open(task_file, "r", encoding="utf-8") as f:
-            task_data = json.load(f)
-        
         return TaskStatusResponse(
             task_id=task_id,
             status=task_data.get("status", "unknown"),
             message=task_data.get("message", ""),
-            files=task_data.get("files", [])
+            files=task_data.get("files", []),
+            trace=task_data.get("trace")
         )
     except HTTPException:
         # 重新抛出HTTP异常
@@ -151,37 +264,17 @@ async def download_generated_files(task_id: str):
     """
     try:
         # 检查任务是否存在
-        results_dir = os.path.join("data", "results", "project")
-        task_file = os.path.join(results_dir, f"{task_id}.json")
-        
-        if not os.path.exists(task_file):
+        if not await task_store.exists(task_id):
             raise HTTPException(status_code=404, detail="任务未找到")
         
-        # 创建临时目录用于打包文件
-        temp_dir = os.path.join(results_dir, f"temp_{task_id}")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 复制生成的文件到临时目录
-        public_dir = os.path.join(results_dir, "public")
-        if os.path.exists(public_dir):
-            for item in os.listdir(public_dir):
-                source = os.path.join(public_dir, item)
-                destination = os.path.join(temp_dir, item)
-                if os.path.isfile(source):
-                    shutil.copy2(source, destination)
-                elif os.path.isdir(source):
-                    shutil.copytree(source, destination)
-        
-        # 创建ZIP文件
-        zip_path = os.path.join(results_dir, f"{task_id}.zip")
-        shutil.make_archive(os.path.splitext(zip_path)[0], 'zip', temp_dir)
-        
-        # 清理临时目录
-        shutil.rmtree(temp_dir)
+        # 打包生成的文件（旧任务回退到共享的 public 目录），ZIP 写入临时文件，响应发送后删除
+        public_prefix = await run_io("download.resolve", resolve_task_public_prefix, task_id)
+        zip_path = await run_io("download.zip", _build_zip, public_prefix)
         
         return FileResponse(
             path=zip_path, 
-            filename=f"generated_website_{task_id}.zip"
+            filename=f"generated_website_{task_id}.zip",
+            background=BackgroundTask(os.remove, zip_path)
         )
     except HTTPException:
         # 重新抛出HTTP异常
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
-import json
 import uuid
 from datetime import datetime
 from agents.fast_mind import FastMind
 from executor.execution_context import ExecutionContext
 import urllib.parse
+from utils.json_codec import FastJSONResponse, json_bytes_response, json_download_response, loads
+from utils.file_manager import knowledge_store, run_io, VersionConflict
+from utils.json_patch import PatchError, PatchTestFailed, parse_if_match, patch_kind_for, version_etag
+from utils import search_index
+from utils.blocking import run_blocking
+from utils.graph_layout import compute_layout_async, layout_is_current
 
 knowledge_router = APIRouter()
 
@@ -39,6 +43,10 @@ class KnowledgeListItem(BaseModel):
     name: str
     created_at: str
 
+class SubgraphRequest(BaseModel):
+    node_ids: List[str]
+    edge_types: Optional[List[str]] = None
+
 class KnowledgeListResponse(BaseModel):
     knowledge_graphs: List[KnowledgeListItem]
 
@@ -59,7 +67,7 @@ async def extract_knowledge(extract_request: KnowledgeExtractRequest):
         # 根据提供的参数提取知识点
         if extract_request.reference_url:
             # 基于URL提取知识点
-            knowledge_data = fast_mind.extract_knowledge_points(extract_request.reference_url)
+            knowledge_data = await run_blocking(fast_mind.extract_knowledge_points, extract_request.reference_url)
         else:
             raise HTTPException(status_code=422, detail="必须提供参考URL或参考信息")
         
@@ -76,13 +84,8 @@ async def extract_knowledge(extract_request: KnowledgeExtractRequest):
 @knowledge_router.post("/save", response_model=KnowledgeSaveResponse)
 async def save_knowledge_graph(knowledge_data: KnowledgeSaveRequest):
     """保存知识点图谱"""
-    # 创建知识点目录
-    knowledge_dir = os.path.join("data", "knowledge")
-    os.makedirs(knowledge_dir, exist_ok=True)
-    
     # 生成唯一ID
     knowledge_id = str(uuid.uuid4())
-    file_path = os.path.join(knowledge_dir, f"{knowledge_id}.json")
     
     # 创建知识点数据
     knowledge_record = {
@@ -92,9 +95,12 @@ async def save_knowledge_graph(knowledge_data: KnowledgeSaveRequest):
         "created_at": datetime.now().isoformat()
     }
     
-    # 保存到文件
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(knowledge_record, f, ensure_ascii=False, indent=2)
+    # 预先计算节点坐标，前端直接按 preset 布局渲染
+    knowledge_record["layout"] = await compute_layout_async(knowledge_data.graph)
+    
+    # 保存到文件（在I/O线程池中执行）
+    await knowledge_store.save(knowledge_id, knowledge_record)
+    await run_io("search.index_knowledge", search_index.index_knowledge_graph, knowledge_record)
     
     return KnowledgeSaveResponse(
         id=knowledge_id,
@@ -105,64 +111,211 @@ async def save_knowledge_graph(knowledge_data: KnowledgeSaveRequest):
 @knowledge_router.get("/", response_model=KnowledgeListResponse)
 async def list_knowledge_graphs():
     """获取知识点图谱列表"""
-    knowledge_dir = os.path.join("data", "knowledge")
-    os.makedirs(knowledge_dir, exist_ok=True)
-    
     knowledge_graphs = []
-    if os.path.exists(knowledge_dir):
-        for filename in os.listdir(knowledge_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(knowledge_dir, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        knowledge_data = json.load(f)
-                        knowledge_graphs.append(KnowledgeListItem(
-                            id=knowledge_data["id"],
-                            name=knowledge_data["name"],
-                            created_at=knowledge_data["created_at"]
-                        ))
-                except Exception:
-                    continue
+    # 只读取元数据，紧凑格式存储时无需解码图谱本身
+    for knowledge_data in await knowledge_store.list_metadata():
+        try:
+            knowledge_graphs.append(KnowledgeListItem(
+                id=knowledge_data["id"],
+                name=knowledge_data["name"],
+                created_at=knowledge_data["created_at"]
+            ))
+        except Exception:
+            continue
     
     return KnowledgeListResponse(knowledge_graphs=knowledge_graphs)
 
 @knowledge_router.get("/{knowledge_id}")
 async def get_knowledge_graph(knowledge_id: str):
     """获取指定知识点图谱详情"""
-    file_path = os.path.join("data", "knowledge", f"{knowledge_id}.json")
+    cached = await knowledge_store.load_cached(knowledge_id)
     
-    if not os.path.exists(file_path):
+    if cached is None:
         raise HTTPException(status_code=404, detail="知识点图谱未找到")
     
-    with open(file_path, "r", encoding="utf-8") as f:
-        knowledge_data = json.load(f)
+    # 早期保存的图谱没有布局（或布局算法已更新）：补算后仅在版本未变时写回，不覆盖并发的补丁
+    record = cached.record
+    if not layout_is_current(record.get("layout"), record.get("graph")):
+        record = await _refresh_layout(knowledge_id, record)
+        if record is None:
+            cached = await knowledge_store.load_cached(knowledge_id)
+            if cached is None:
+                raise HTTPException(status_code=404, detail="知识点图谱未找到")
+        else:
+            # 写回失败（期间图谱被修改）时直接返回本次补算的结果
+            return FastJSONResponse(content=record, headers={"ETag": version_etag(record.get("version", 0))})
     
-    return knowledge_data
+    # 直接返回缓存中已序列化的字节，跳过 FastAPI 默认的 jsonable_encoder
+    return json_bytes_response(cached.body, headers={"ETag": version_etag(cached.record.get("version", 0))})
+
+async def _refresh_layout(knowledge_id: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    重新计算布局，并以读取时的版本为条件写回
+
+    :return: 写回成功时返回 None；期间记录已被修改时返回补算了布局、未保存的记录
+    """
+    record = dict(record, layout=await compute_layout_async(record.get("graph")))
+    if await knowledge_store.save_if_version(knowledge_id, record, record.get("version", 0)):
+        return None
+    return record
+
+def _validate_knowledge_graph(record: Dict[str, Any]) -> None:
+    graph = record.get("graph")
+    if not isinstance(record.get("name"), str) or not isinstance(graph, dict):
+        raise PatchError("知识点图谱的 name 必须是字符串，graph 必须是对象")
+    if not isinstance(graph.get("nodes", []), list):
+        raise PatchError("graph.nodes 必须是数组")
+
+@knowledge_router.patch("/{knowledge_id}")
+async def patch_knowledge_graph(knowledge_id: str, request: Request):
+    """
+    增量修改知识点图谱（如修改单个节点的名称）
+    
+    请求体为 JSON Patch（application/json-patch+json）或 JSON Merge Patch（application/merge-patch+json），
+    可通过 If-Match 携带读取时的 ETag，图谱已被他人修改时返回 412
+    """
+    try:
+        patch = loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="请求体不是合法的JSON")
+    
+    try:
+        expected_version = parse_if_match(request.headers.get("if-match"))
+        kind = patch_kind_for(request.headers.get("content-type"), patch)
+        knowledge_record = await knowledge_store.patch(
+            knowledge_id, kind, patch, expected_version, _validate_knowledge_graph
+        )
+    except VersionConflict as e:
+        raise HTTPException(status_code=412, detail=str(e), headers={"ETag": version_etag(e.current_version)})
+    except PatchTestFailed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if knowledge_record is None:
+        raise HTTPException(status_code=404, detail="知识点图谱未找到")
+    # 增删节点后布局不再覆盖全部节点，像保存时一样重新计算（期间又有补丁时由后者负责）
+    if not layout_is_current(knowledge_record.get("layout"), knowledge_record.get("graph")):
+        await _refresh_layout(knowledge_id, knowledge_record)
+    await run_io("search.index_knowledge", search_index.index_knowledge_graph, knowledge_record)
+    
+    return FastJSONResponse(
+        content={
+            "id": knowledge_id,
+            "version": knowledge_record["version"],
+            "updated_at": knowledge_record["updated_at"]
+        },
+        headers={"ETag": version_etag(knowledge_record["version"])}
+    )
+
+@knowledge_router.get("/{knowledge_id}/nodes/{node_id}")
+async def get_knowledge_node(knowledge_id: str, node_id: str):
+    """获取知识点图谱中的单个节点"""
+    node = await knowledge_store.load_node(knowledge_id, node_id)
+    
+    if node is None:
+        raise HTTPException(status_code=404, detail="知识点未找到")
+    
+    return node
+
+def _parse_edge_types(edge_types: Optional[str]) -> Optional[List[str]]:
+    """解析逗号分隔的边类型参数（edges / dependent_edges），为空表示全部"""
+    if not edge_types:
+        return None
+    return [edge_type.strip() for edge_type in edge_types.split(",") if edge_type.strip()]
+
+async def _load_graph_index(knowledge_id: str):
+    index = await knowledge_store.load_graph_index(knowledge_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="知识点图谱未找到")
+    return index
+
+@knowledge_router.get("/{knowledge_id}/nodes/{node_id}/neighborhood")
+async def get_node_neighborhood(
+    knowledge_id: str,
+    node_id: str,
+    k: int = Query(1, ge=1, le=50, description="最大跳数"),
+    direction: str = Query("both", description="out: 后续知识点, in: 前置知识点, both: 不区分方向"),
+    edge_types: Optional[str] = Query(None, description="边类型，逗号分隔：edges, dependent_edges")
+):
+    """获取节点的 k 跳邻域，返回邻域子图及各节点到起点的跳数"""
+    index = await _load_graph_index(knowledge_id)
+    try:
+        types = _parse_edge_types(edge_types)
+        distances = index.k_hop(node_id, k, direction, types)
+        return {
+            "center": node_id,
+            "distances": distances,
+            "graph": index.subgraph(list(distances), types)
+        }
+    except KeyError:
+        raise HTTPException(status_code=404, detail="知识点未找到")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@knowledge_router.post("/{knowledge_id}/subgraph")
+async def extract_subgraph(knowledge_id: str, request: SubgraphRequest):
+    """提取由指定节点导出的子图"""
+    index = await _load_graph_index(knowledge_id)
+    try:
+        return index.subgraph(request.node_ids, request.edge_types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@knowledge_router.get("/{knowledge_id}/learning-order")
+async def get_learning_order(
+    knowledge_id: str,
+    target: Optional[str] = Query(None, description="只返回学习该知识点所需的前置知识点"),
+    edge_types: Optional[str] = Query(None, description="边类型，逗号分隔：edges, dependent_edges")
+):
+    """按拓扑顺序返回学习顺序"""
+    index = await _load_graph_index(knowledge_id)
+    try:
+        order, has_cycle = index.learning_order(target, _parse_edge_types(edge_types))
+        return {"order": index.nodes(order), "has_cycle": has_cycle}
+    except KeyError:
+        raise HTTPException(status_code=404, detail="知识点未找到")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@knowledge_router.get("/{knowledge_id}/path")
+async def get_prerequisite_path(
+    knowledge_id: str,
+    target: str = Query(..., description="目标知识点"),
+    source: Optional[str] = Query(None, description="起始知识点，不指定时从最近的起点开始"),
+    edge_types: Optional[str] = Query(None, description="边类型，逗号分隔：edges, dependent_edges")
+):
+    """获取到达目标知识点的最短前置路径"""
+    index = await _load_graph_index(knowledge_id)
+    try:
+        path = index.shortest_path(target, source, _parse_edge_types(edge_types))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="知识点未找到")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if path is None:
+        raise HTTPException(status_code=404, detail="不存在到达目标知识点的路径")
+    
+    return {"path": index.nodes(path), "length": len(path) - 1}
 
 @knowledge_router.delete("/{knowledge_id}")
 async def delete_knowledge_graph(knowledge_id: str):
     """删除指定知识点图谱"""
-    file_path = os.path.join("data", "knowledge", f"{knowledge_id}.json")
-    
-    if not os.path.exists(file_path):
+    if not await knowledge_store.delete(knowledge_id):
         raise HTTPException(status_code=404, detail="知识点图谱未找到")
-    
-    os.remove(file_path)
+    search_index.remove_knowledge_graph(knowledge_id)
     
     return {"message": "知识点图谱删除成功"}
 
 @knowledge_router.get("/download/{knowledge_id}")
 async def download_knowledge_graph(knowledge_id: str):
     """下载指定知识点图谱"""
-    file_path = os.path.join("data", "knowledge", f"{knowledge_id}.json")
+    cached = await knowledge_store.load_cached(knowledge_id)
     
-    if not os.path.exists(file_path):
+    if cached is None:
         raise HTTPException(status_code=404, detail="知识点图谱未找到")
     
-    # 获取知识图谱名称用于文件名
-    with open(file_path, "r", encoding="utf-8") as f:
-        knowledge_data = json.load(f)
-    
-    # 使用URL编码处理文件名，避免特殊字符导致的编码问题
-    filename = f"{knowledge_data['name']}.json"
-    return FileResponse(path=file_path, filename=filename)
\ No newline at end of file
+    # 落盘为紧凑格式，下载时返回缓存的格式化版本；文件名在响应中做URL编码，避免特殊字符导致的编码问题
+    filename = f"{cached.record['name']}.json"
+    return json_download_response(cached.pretty_body, filename)
\ No newline at end of file
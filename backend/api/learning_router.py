@@ -3,7 +3,9 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import json
 from agents.slow_mind import SlowMind
+from agents.schemas import KnowledgePointGenerateResponse
 from executor.execution_context import ExecutionContext
+from utils.blocking import run_blocking
 
 learning_router = APIRouter()
 
@@ -13,11 +15,6 @@ class KnowledgePointGenerateRequest(BaseModel):
     type: str
     select_element: List[str]
 
-class KnowledgePointGenerateResponse(BaseModel):
-    topic_id: str
-    title: str
-    levels: List[Dict[str, Any]]
-
 @learning_router.post("/generate-knowledge-point", response_model=KnowledgePointGenerateResponse)
 async def generate_knowledge_point(request: KnowledgePointGenerateRequest):
     """
@@ -43,7 +40,7 @@ async def generate_knowledge_point(request: KnowledgePointGenerateRequest):
         }
             
         # 生成知识点内容
-        knowledge_content = slow_mind.generate_learning_content(topic_info)
+        knowledge_content = await run_blocking(slow_mind.generate_learning_content, topic_info)
         
         return KnowledgePointGenerateResponse(**knowledge_content)
         
@@ -1,88 +1,173 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
-import os
-import json
+from typing import Optional, List, Dict, Any
+import asyncio
 from datetime import datetime
+from utils.file_manager import run_io
+from utils.json_codec import dumps
+from utils.task_events import TERMINAL_STATUSES, event_log_key, task_events
 
 logs_router = APIRouter()
 
+# 实时跟踪时的心跳间隔（秒），防止代理因连接空闲而断开
+TAIL_HEARTBEAT_SECONDS = 15
+
 class LogEntry(BaseModel):
     task_id: str
     timestamp: str
     files: List[str]
     status: str
+    stage: Optional[str] = None
+    message: str = ""
+    events: int = 0
+    created_at: Optional[str] = None
 
 class LogsResponse(BaseModel):
     logs: List[LogEntry]
+    total: int
+    offset: int
+    limit: int
+
+class TaskEventsResponse(BaseModel):
+    task_id: str
+    events: List[Dict[str, Any]]
+    next_after: int
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+def _log_entry(summary: dict) -> LogEntry:
+    return LogEntry(
+        task_id=summary["task_id"],
+        timestamp=_isoformat(summary["updated_at"]),
+        files=summary["files"],
+        status=summary["status"],
+        stage=summary["stage"],
+        message=summary["message"],
+        events=summary["events"],
+        created_at=_isoformat(summary["created_at"])
+    )
+
+async def _load_summary(task_id: str) -> Optional[dict]:
+    # 本地索引中没有时从存储读取（多实例共用存储时，任务可能由其它实例执行）
+    return await run_io("logs.summary", task_events.load_summary, task_id)
+
+def _check_task_id(task_id: str) -> None:
+    try:
+        event_log_key(task_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="非法的任务ID")
 
 @logs_router.get("/", response_model=LogsResponse)
-async def get_logs():
+async def get_logs(
+    status: Optional[str] = Query(None, description="按任务状态过滤：running、success、failed"),
+    stage: Optional[str] = Query(None, description="按当前阶段过滤"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200)
+):
     """
-    日志查询接口
+    日志查询接口：按最后更新时间倒序分页返回任务摘要
     """
-    # 创建日志目录
-    logs_dir = os.path.join("data", "logs")
-    os.makedirs(logs_dir, exist_ok=True)
-    
-    logs = []
-    
-    # 查找所有任务记录
-    tasks_dir = os.path.join("data", "tasks")
-    if os.path.exists(tasks_dir):
-        for filename in os.listdir(tasks_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(tasks_dir, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        task_data = json.load(f)
-                    
-                    # 构造日志条目
-                    log_entry = LogEntry(
-                        task_id=task_data.get("task_id", filename.replace(".json", "")),
-                        timestamp=task_data.get("finished_at", task_data.get("created_at", datetime.now().isoformat())),
-                        files=["index.html", "style.css"],  # 示例文件
-                        status=task_data.get("status", "unknown")
-                    )
-                    logs.append(log_entry)
-                except Exception:
-                    continue
-    
-    # 按时间倒序排列
-    logs.sort(key=lambda x: x.timestamp, reverse=True)
-    
-    return LogsResponse(logs=logs)
+    summaries, total = task_events.query(status=status, stage=stage, offset=offset, limit=limit)
+    return LogsResponse(logs=[_log_entry(summary) for summary in summaries], total=total,
+                        offset=offset, limit=limit)
 
 @logs_router.get("/{task_id}", response_model=LogEntry)
 async def get_log_detail(task_id: str):
-    """获取指定任务的日志详情"""
-    tasks_dir = os.path.join("data", "tasks")
-    task_file = os.path.join(tasks_dir, f"{task_id}.json")
-    
-    if not os.path.exists(task_file):
+    """获取指定任务的日志摘要"""
+    _check_task_id(task_id)
+    summary = await _load_summary(task_id)
+
+    if summary is None:
         raise HTTPException(status_code=404, detail="日志未找到")
-    
-    with open(task_file, "r", encoding="utf-8") as f:
-        task_data = json.load(f)
-    
-    return LogEntry(
-        task_id=task_data.get("task_id", task_id),
-        timestamp=task_data.get("finished_at", task_data.get("created_at", datetime.now().isoformat())),
-        files=["index.html", "style.css"],  # 示例文件
-        status=task_data.get("status", "unknown")
+
+    return _log_entry(summary)
+
+@logs_router.get("/{task_id}/events", response_model=TaskEventsResponse)
+async def get_task_events(
+    task_id: str,
+    after: int = Query(0, ge=0, description="只返回序号大于该值的事件"),
+    limit: int = Query(200, ge=1, le=1000)
+):
+    """分页读取任务的事件，用返回的 next_after 继续读取"""
+    _check_task_id(task_id)
+    if await _load_summary(task_id) is None:
+        raise HTTPException(status_code=404, detail="日志未找到")
+
+    events = await run_io("logs.events", task_events.read, task_id, after, limit)
+    return TaskEventsResponse(task_id=task_id, events=events,
+                              next_after=events[-1]["seq"] if events else after)
+
+def _sse(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: ".encode() + dumps(data) + b"\n\n"
+
+@logs_router.get("/{task_id}/tail")
+async def tail_task_events(
+    task_id: str,
+    request: Request,
+    after: int = Query(0, ge=0, description="从序号大于该值的事件开始"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    实时跟踪任务事件（Server-Sent Events）
+
+    先推送已有事件，之后每追加一条事件立即推送；任务结束（success / failed）后发送 end 事件并关闭连接。
+    断线重连时浏览器会带上 Last-Event-ID，从断开处继续
+    """
+    _check_task_id(task_id)
+    if await _load_summary(task_id) is None:
+        raise HTTPException(status_code=404, detail="日志未找到")
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    async def stream():
+        last_seq = after
+        # 在生成器中订阅：客户端在响应开始前断开时生成器不会运行，也就不会留下订阅者；
+        # 先订阅再读取已有事件，两者之间追加的事件按序号去重
+        subscriber = task_events.subscribe(task_id)
+        try:
+            backlog = await run_io("logs.tail", task_events.read, task_id, after)
+            for event in backlog:
+                last_seq = event["seq"]
+                yield _sse("task_event", event, last_seq)
+            summary = await _load_summary(task_id)
+            finished = summary is None or (summary["status"] in TERMINAL_STATUSES and summary["events"] <= last_seq)
+            while not finished:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), TAIL_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield b": keep-alive\n\n"
+                    if task_events.summary(task_id) is None:
+                        # 其它实例执行的任务不会通知本实例的订阅者，按心跳间隔从存储读取新事件
+                        for event in await run_io("logs.tail", task_events.read, task_id, last_seq):
+                            last_seq = event["seq"]
+                            yield _sse("task_event", event, last_seq)
+                            finished = finished or event.get("status") in TERMINAL_STATUSES
+                    continue
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+                yield _sse("task_event", event, last_seq)
+                finished = event.get("status") in TERMINAL_STATUSES
+            yield _sse("end", await _load_summary(task_id) or {"task_id": task_id})
+        finally:
+            task_events.unsubscribe(task_id, subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @logs_router.delete("/{task_id}")
 async def delete_log(task_id: str):
-    """删除指定任务的日志"""
-    logs_dir = os.path.join("data", "logs")
-    os.makedirs(logs_dir, exist_ok=True)
-    
-    # 查找并删除匹配的日志文件
-    for filename in os.listdir(logs_dir):
-        if filename.startswith(f"{task_id}_") and filename.endswith(".txt"):
-            filepath = os.path.join(logs_dir, filename)
-            os.remove(filepath)
-            return {"message": "Log deleted successfully"}
-    
-    raise HTTPException(status_code=404, detail="Log not found")
\ No newline at end of file
+    """删除指定任务的事件日志"""
+    _check_task_id(task_id)
+    if await run_io("logs.delete", task_events.delete, task_id):
+        return {"message": "Log deleted successfully"}
+
+    raise HTTPException(status_code=404, detail="Log not found")
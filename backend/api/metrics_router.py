@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from utils.metrics import registry
+
+metrics_router = APIRouter()
+
+@metrics_router.get("/")
+async def get_metrics():
+    """
+    获取服务运行指标（压缩比等）
+    """
+    return registry.snapshot()
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
-import json
 import uuid
 from datetime import datetime
 from agents.slow_mind import SlowMind
 from executor.execution_context import ExecutionContext
 import urllib.parse
+from utils.blocking import run_blocking
+from utils.json_codec import FastJSONResponse, json_bytes_response, json_download_response, loads
+from utils.file_manager import prd_store, run_io, VersionConflict
+from utils.json_patch import PatchError, PatchTestFailed, parse_if_match, patch_kind_for, version_etag
+from utils import search_index
 
 prd_router = APIRouter()
 
@@ -59,7 +62,7 @@ async def generate_prd(prd_request: PRDGenerateRequest):
         # 根据提供的参数生成PRD内容
         if prd_request.reference_url:
             # 基于URL生成PRD
-            prd_text = slow_mind.generate_prd(prd_request.reference_url)
+            prd_text = await run_blocking(slow_mind.generate_prd, prd_request.reference_url)
         else:
             raise HTTPException(status_code=422, detail="必须提供参考URL或参考信息")
         
@@ -76,13 +79,8 @@ async def generate_prd(prd_request: PRDGenerateRequest):
 @prd_router.post("/save", response_model=PRDSaveResponse)
 async def save_prd(prd_data: PRDSaveRequest):
     """保存PRD文档"""
-    # 创建PRD目录
-    prd_dir = os.path.join("data", "prd")
-    os.makedirs(prd_dir, exist_ok=True)
-    
     # 生成唯一ID
     prd_id = str(uuid.uuid4())
-    file_path = os.path.join(prd_dir, f"{prd_id}.json")
     
     # 创建PRD数据
     prd_record = {
@@ -92,9 +90,9 @@ async def save_prd(prd_data: PRDSaveRequest):
         "created_at": datetime.now().isoformat()
     }
     
-    # 保存到文件
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(prd_record, f, ensure_ascii=False, indent=2)
+    # 保存到文件（在I/O线程池中执行）
+    await prd_store.save(prd_id, prd_record)
+    await run_io("search.index_prd", search_index.index_prd, prd_record)
     
     return PRDSaveResponse(
         id=prd_id,
@@ -105,64 +103,84 @@ async def save_prd(prd_data: PRDSaveRequest):
 @prd_router.get("/", response_model=PRDListResponse)
 async def list_prds():
     """获取PRD列表"""
-    prd_dir = os.path.join("data", "prd")
-    os.makedirs(prd_dir, exist_ok=True)
-    
     prds = []
-    if os.path.exists(prd_dir):
-        for filename in os.listdir(prd_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(prd_dir, filename)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        prd_data = json.load(f)
-                        prds.append(PRDListItem(
-                            id=prd_data["id"],
-                            title=prd_data["title"],
-                            created_at=prd_data["created_at"]
-                        ))
-                except Exception:
-                    continue
+    for prd_data in await prd_store.list():
+        try:
+            prds.append(PRDListItem(
+                id=prd_data["id"],
+                title=prd_data["title"],
+                created_at=prd_data["created_at"]
+            ))
+        except Exception:
+            continue
     
     return PRDListResponse(prds=prds)
 
 @prd_router.get("/{prd_id}")
 async def get_prd(prd_id: str):
     """获取指定PRD详情"""
-    file_path = os.path.join("data", "prd", f"{prd_id}.json")
+    cached = await prd_store.load_cached(prd_id)
     
-    if not os.path.exists(file_path):
+    if cached is None:
         raise HTTPException(status_code=404, detail="PRD未找到")
     
-    with open(file_path, "r", encoding="utf-8") as f:
-        prd_data = json.load(f)
+    # 直接返回缓存中已序列化的字节，跳过 FastAPI 默认的 jsonable_encoder
+    return json_bytes_response(cached.body, headers={"ETag": version_etag(cached.record.get("version", 0))})
+
+def _validate_prd(record: Dict[str, Any]) -> None:
+    if not isinstance(record.get("title"), str) or not isinstance(record.get("content"), str):
+        raise PatchError("PRD的 title 和 content 必须是字符串")
+
+@prd_router.patch("/{prd_id}")
+async def patch_prd(prd_id: str, request: Request):
+    """
+    增量修改PRD
+    
+    请求体为 JSON Patch（application/json-patch+json）或 JSON Merge Patch（application/merge-patch+json），
+    可通过 If-Match 携带读取时的 ETag，记录已被他人修改时返回 412
+    """
+    try:
+        patch = loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="请求体不是合法的JSON")
     
-    return prd_data
+    try:
+        expected_version = parse_if_match(request.headers.get("if-match"))
+        kind = patch_kind_for(request.headers.get("content-type"), patch)
+        prd_record = await prd_store.patch(prd_id, kind, patch, expected_version, _validate_prd)
+    except VersionConflict as e:
+        raise HTTPException(status_code=412, detail=str(e), headers={"ETag": version_etag(e.current_version)})
+    except PatchTestFailed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if prd_record is None:
+        raise HTTPException(status_code=404, detail="PRD未找到")
+    await run_io("search.index_prd", search_index.index_prd, prd_record)
+    
+    return FastJSONResponse(
+        content={"id": prd_id, "version": prd_record["version"], "updated_at": prd_record["updated_at"]},
+        headers={"ETag": version_etag(prd_record["version"])}
+    )
 
 @prd_router.delete("/{prd_id}")
 async def delete_prd(prd_id: str):
     """删除指定PRD"""
-    file_path = os.path.join("data", "prd", f"{prd_id}.json")
-    
-    if not os.path.exists(file_path):
+    if not await prd_store.delete(prd_id):
         raise HTTPException(status_code=404, detail="PRD未找到")
-    
-    os.remove(file_path)
+    search_index.remove_prd(prd_id)
     
     return {"message": "PRD删除成功"}
 
 @prd_router.get("/download/{prd_id}")
 async def download_prd(prd_id: str):
     """下载指定PRD文档"""
-    file_path = os.path.join("data", "prd", f"{prd_id}.json")
+    cached = await prd_store.load_cached(prd_id)
     
-    if not os.path.exists(file_path):
+    if cached is None:
         raise HTTPException(status_code=404, detail="PRD未找到")
     
-    # 获取PRD标题用于文件名
-    with open(file_path, "r", encoding="utf-8") as f:
-        prd_data = json.load(f)
-    
-    # 使用URL编码处理文件名，避免特殊字符导致的编码问题
-    filename = f"{prd_data['title']}.json"
-    return FileResponse(path=file_path, filename=filename)
\ No newline at end of file
+    # 落盘为紧凑格式，下载时返回缓存的格式化版本；文件名在响应中做URL编码，避免特殊字符导致的编码问题
+    filename = f"{cached.record['title']}.json"
+    return json_download_response(cached.pretty_body, filename)
\ No newline at end of file
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
-import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+from utils.file_manager import resolve_task_key, run_io
+from utils.static_files import build_storage_response
+from utils.storage import storage
 
 preview_router = APIRouter()
 
@@ -12,12 +14,14 @@ async def preview_website(task_id: str):
     参数：
     - task_id: 任务 ID
     """
-    # 构建结果文件路径 - 根据实际生成的文件结构调整路径
-    result_dir = os.path.join("data", "results", "project", "public")
-    html_path = os.path.join(result_dir, "index.html")
+    # 按任务目录解析页面，旧任务回退到共享目录
+    try:
+        html_key = await run_io("preview.resolve", resolve_task_key, task_id, "public/index.html")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="非法的任务ID")
     
     # 检查文件是否存在
-    if not os.path.exists(html_path):
+    if html_key is None:
         # 创建一个默认的预览页面
         html_content = f"""
 <!DOCTYPE html>
@@ -66,21 +70,26 @@ async def preview_website(task_id: str):
 """
         return HTMLResponse(content=html_content)
     
-    # 返回实际的HTML文件内容
-    with open(html_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    
-    return HTMLResponse(content=content)
+    # 重定向到任务专属的静态文件路由，页面中的相对路径（如 ../src/1-1.jpeg）即按该任务目录解析
+    return RedirectResponse(url=f"/api/preview/file/{task_id}/public/index.html", status_code=307)
 
 @preview_router.get("/file/{task_id}/{file_path:path}")
-async def get_preview_file(task_id: str, file_path: str):
-    """获取预览文件（CSS, JS等）"""
-    # 根据实际生成的文件结构调整路径
-    result_dir = os.path.join("data", "results", "project", "public")
-    full_path = os.path.join(result_dir, file_path)
+async def get_preview_file(task_id: str, file_path: str, request: Request):
+    """
+    获取任务产物文件（HTML、CSS、JS、图片、音视频等）
+    
+    支持 ETag 条件请求、内容哈希文件名的长期缓存和 Range 分段请求（音视频拖动播放）
+    """
+    try:
+        key = await run_io("preview.resolve", resolve_task_key, task_id, file_path)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="非法的任务ID")
     
     # 检查文件是否存在
-    if not os.path.exists(full_path):
+    if key is None:
         raise HTTPException(status_code=404, detail="文件未找到")
     
-    return FileResponse(full_path)
\ No newline at end of file
+    try:
+        return await build_storage_response(request, storage, key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="文件未找到")
\ No newline at end of file
@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+import re
+from api.admin_router import require_admin
+from utils.file_manager import run_io
+from utils.profiling import DEFAULT_ENGINE, PROFILES_PREFIX, request_profiler
+from utils.static_files import build_storage_response
+from utils.storage import join_key, storage
+
+profiling_router = APIRouter(dependencies=[Depends(require_admin)])
+
+_PROFILE_ID_PATTERN = re.compile(r"^[0-9A-Za-z\-]{1,64}$")
+
+class ProfileSessionRequest(BaseModel):
+    path: Optional[str] = Field(None, description="请求路径，支持通配符，如 /api/execute/*")
+    method: Optional[str] = None
+    header: Optional[str] = Field(None, description="按请求头匹配，如 X-Profile")
+    header_value: Optional[str] = Field(None, description="请求头的值，省略时只要求请求头存在")
+    count: int = Field(1, ge=1, le=100, description="剖析的请求数，用完后会话自动结束")
+    engine: str = Field(DEFAULT_ENGINE, description="pyinstrument、sampler 或 cprofile")
+    memory: bool = Field(False, description="是否同时用 tracemalloc 记录内存分配")
+
+class ProfileSessionResponse(BaseModel):
+    session_id: str
+    path: Optional[str]
+    method: Optional[str]
+    header: Optional[str]
+    header_value: Optional[str]
+    count: int
+    remaining: int
+    engine: str
+    memory: bool
+    created_at: float
+    profile_ids: List[str]
+
+class ProfilesResponse(BaseModel):
+    profiles: List[Dict[str, Any]]
+
+@profiling_router.post("/sessions", response_model=ProfileSessionResponse)
+async def start_profile_session(request: ProfileSessionRequest):
+    """
+    开启剖析会话：接下来命中路径 / 请求头的 count 个请求将被剖析，无需重启服务
+    """
+    try:
+        session = request_profiler.start_session(**request.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ProfileSessionResponse(**session.to_dict())
+
+@profiling_router.get("/sessions", response_model=List[ProfileSessionResponse])
+async def list_profile_sessions():
+    """列出仍在等待请求的剖析会话"""
+    return [ProfileSessionResponse(**session.to_dict()) for session in request_profiler.sessions]
+
+@profiling_router.delete("/sessions/{session_id}")
+async def stop_profile_session(session_id: str):
+    """提前结束剖析会话"""
+    if request_profiler.stop_session(session_id) is None:
+        raise HTTPException(status_code=404, detail="剖析会话未找到")
+    return {"message": "剖析会话已结束"}
+
+@profiling_router.get("/profiles", response_model=ProfilesResponse)
+async def list_profiles():
+    """列出已保存的剖析结果（按时间倒序）"""
+    return ProfilesResponse(profiles=await run_io("profiling.list", request_profiler.list))
+
+async def _load_profile(profile_id: str) -> Dict[str, Any]:
+    meta = None
+    if _PROFILE_ID_PATTERN.match(profile_id):
+        meta = await run_io("profiling.get", request_profiler.get, profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="剖析结果未找到")
+    return meta
+
+@profiling_router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """获取剖析结果的请求信息与文件列表"""
+    return await _load_profile(profile_id)
+
+@profiling_router.get("/profiles/{profile_id}/files/{filename}")
+async def download_profile_file(profile_id: str, filename: str, request: Request):
+    """
+    下载剖析文件：*.collapsed 为折叠栈，可用 flamegraph.pl 生成火焰图或直接拖入 speedscope；
+    *.speedscope.json 在 speedscope 中打开；*.prof 可用 snakeviz 等 pstats 工具打开
+    """
+    meta = await _load_profile(profile_id)
+    if filename not in meta["files"]:
+        raise HTTPException(status_code=404, detail="文件未找到")
+    try:
+        return await build_storage_response(request, storage, join_key(PROFILES_PREFIX, filename))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="文件未找到")
+
+@profiling_router.delete("/profiles/{profile_id}")
+async def delete_profile(profile_id: str):
+    """删除剖析结果"""
+    if not _PROFILE_ID_PATTERN.match(profile_id) or not await run_io(
+            "profiling.delete", request_profiler.delete, profile_id):
+        raise HTTPException(status_code=404, detail="剖析结果未找到")
+    return {"message": "剖析结果已删除"}
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+from typing import Optional, List, Dict, Any
+from utils.search_index import search_index
+
+search_router = APIRouter()
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    results: List[Dict[str, Any]]
+
+@search_router.get("/", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, description="查询内容，中英文均可"),
+    type: Optional[str] = Query(None, description="结果类型：prd 或 node"),
+    knowledge_id: Optional[str] = Query(None, description="只检索指定知识点图谱中的节点"),
+    limit: int = Query(20, ge=1, le=100),
+    prefix: bool = Query(True, description="最后一个词是否按前缀匹配")
+):
+    """
+    全文检索PRD（标题/正文）与知识点图谱节点（名称/类别），按相关度排序
+    """
+    if type is not None and type not in ("prd", "node"):
+        raise HTTPException(status_code=400, detail="type 只能是 prd 或 node")
+    
+    filters = {}
+    if type:
+        filters["type"] = type
+    if knowledge_id:
+        filters["knowledge_id"] = knowledge_id
+    
+    # 内存索引查询为纯计算且耗时在毫秒级，直接在事件循环中执行
+    results = search_index.search(q, limit=limit, prefix=prefix, filters=filters or None)
+    return SearchResponse(query=q, total=len(results), results=results)
@@ -3,7 +3,9 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import json
 from agents.slow_mind import SlowMind
+from agents.schemas import TestTaskGenerateResponse
 from executor.execution_context import ExecutionContext
+from utils.blocking import run_blocking
 
 test_router = APIRouter()
 
@@ -12,14 +14,6 @@ class TestTaskGenerateRequest(BaseModel):
     knowledge_node: Dict[str, Any]  # 知识点节点数据
     learning_content: Optional[Dict[str, Any]] = None  # 学习内容（如果已生成）
 
-class TestTaskGenerateResponse(BaseModel):
-    topic_id: str
-    title: str
-    description_md: str
-    start_code: Dict[str, str]
-    checkpoints: List[Dict[str, Any]]
-    answer: Dict[str, str]
-
 @test_router.post("/generate-test-task", response_model=TestTaskGenerateResponse)
 async def generate_test_task(request: TestTaskGenerateRequest):
     """
@@ -36,7 +30,7 @@ async def generate_test_task(request: TestTaskGenerateRequest):
         slow_mind = SlowMind(context)
         
         # 生成测试题
-        test_task = slow_mind.generate_test_task(request.knowledge_node, request.learning_content)
+        test_task = await run_blocking(slow_mind.generate_test_task, request.knowledge_node, request.learning_content)
         
         return TestTaskGenerateResponse(**test_task)
         
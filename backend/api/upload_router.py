@@ -2,7 +2,6 @@ from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
-import shutil
 from pathlib import Path
 import json
 import uuid
@@ -10,9 +9,20 @@ from datetime import datetime
 from agents.slow_mind import SlowMind
 from agents.fast_mind import FastMind
 from executor.execution_context import ExecutionContext
+from utils.blocking import run_blocking
+from utils.file_manager import run_io, analysis_store
+from utils.storage import join_key, storage
+from utils.similarity import duplicate_index, page_fingerprint, similarity_score
+from utils.metrics import registry
 
 upload_router = APIRouter()
 
+# 上传文件在存储中的前缀
+UPLOAD_PREFIX = "uploads"
+
+duplicate_uploads = registry.counter("duplicate_uploads", "检测到与已分析页面近似重复的上传次数")
+llm_calls_avoided = registry.counter("llm_calls_avoided", "复用近似重复页面的分析结果而省去的大模型调用次数")
+
 class UploadResponse(BaseModel):
     title: str
     structure: List[Dict[str, Any]]
@@ -22,10 +32,26 @@ class UploadResponse(BaseModel):
 class PRDGenerateResponse(BaseModel):
     prd_text: str
     status: str
+    reused_from: Optional[str] = None
+    similarity: Optional[float] = None
 
 class KnowledgeExtractResponse(BaseModel):
     graph: dict
     status: str
+    reused_from: Optional[str] = None
+    similarity: Optional[float] = None
+
+class SimilarPage(BaseModel):
+    id: str
+    title: str
+    distance: int
+    similarity: float
+    has_prd: bool
+    has_knowledge: bool
+    created_at: str
+
+class SimilarPagesResponse(BaseModel):
+    matches: List[SimilarPage]
 
 class HTMLStructure(BaseModel):
     tag: str
@@ -73,6 +99,10 @@ def extract_html_structure(content: str) -> dict:
         "text_blocks": text_blocks[:10]  # 限制文本块数量
     }
 
+def _save_upload_file(key: str, content: bytes) -> None:
+    """保存上传的文件内容"""
+    storage.put(key, content)
+
 @upload_router.post("/html", response_model=UploadResponse)
 async def upload_html(
     file: Optional[UploadFile] = File(None),
@@ -85,10 +115,6 @@ async def upload_html(
     - file: HTML 文件
     - url: 可选网页链接
     """
-    # 创建上传目录
-    upload_dir = os.path.join("data", "uploads")
-    os.makedirs(upload_dir, exist_ok=True)
-    
     if file and file.filename:
         # 保存上传的文件
         file_extension = Path(file.filename).suffix.lower()
@@ -96,16 +122,13 @@ async def upload_html(
             raise HTTPException(status_code=400, detail="只支持HTML文件")
         
         # 生成唯一文件名
-        unique_filename = f"{uuid.uuid4()}_{file.filename}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        unique_filename = f"{uuid.uuid4()}_{Path(file.filename).name}"
+        file_key = join_key(UPLOAD_PREFIX, unique_filename)
         
-        # 读取文件内容
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
+        # 读取上传内容，并在I/O线程池中保存文件
+        raw_content = await file.read()
+        await run_io("upload.save", _save_upload_file, file_key, raw_content)
+        content = raw_content.decode("utf-8", errors="ignore")
         
         # 提取结构信息
         structure_info = extract_html_structure(content)
@@ -129,25 +152,74 @@ async def upload_html(
     else:
         raise HTTPException(status_code=422, detail="请提供HTML文件或URL")
 
+async def _find_previous_analysis(fingerprint: int, field: str):
+    """
+    查找近似重复页面中已有 field（prd_text / graph）的分析记录，返回 (记录, 汉明距离)
+    """
+    for analysis_id, distance in duplicate_index.find(fingerprint):
+        record = await analysis_store.load(analysis_id)
+        if record and record.get(field) is not None:
+            return record, distance
+    return None
+
+async def _remember_analysis(fingerprint: int, title: str, field: str, value: Any) -> None:
+    """
+    保存分析结果；已有近似重复页面的记录时合并到该记录中
+    """
+    record = None
+    matches = duplicate_index.find(fingerprint)
+    if matches:
+        record = await analysis_store.load(matches[0][0])
+    if record is None:
+        record = {
+            "id": str(uuid.uuid4()),
+            "fingerprint": f"{fingerprint:016x}",
+            "title": title,
+            "created_at": datetime.now().isoformat()
+        }
+    record[field] = value
+    record["updated_at"] = datetime.now().isoformat()
+    await analysis_store.save(record["id"], record)
+    duplicate_index.add(record["id"], int(record["fingerprint"], 16))
+
 @upload_router.post("/generate-prd", response_model=PRDGenerateResponse)
-async def generate_prd_from_file(file: UploadFile = File(...)):
+async def generate_prd_from_file(file: UploadFile = File(...), reuse: bool = Form(True)):
     """
     通过上传的HTML文件生成PRD文档
     
     参数：
     - file: HTML 文件
+    - reuse: 与已分析过的页面近似重复时，是否直接复用已有的PRD
     """
     try:
         # 读取上传的文件内容
         content = await file.read()
         html_content = content.decode('utf-8')
         
+        # 近似重复的页面直接复用之前生成的PRD，省去一次大模型调用
+        fingerprint = await run_io("similarity.fingerprint", page_fingerprint, html_content)
+        if reuse:
+            previous = await _find_previous_analysis(fingerprint, "prd_text")
+            if previous is not None:
+                record, distance = previous
+                duplicate_uploads.inc(kind="prd")
+                llm_calls_avoided.inc(kind="prd")
+                return PRDGenerateResponse(
+                    prd_text=record["prd_text"],
+                    status="reused",
+                    reused_from=record["id"],
+                    similarity=similarity_score(distance)
+                )
+        
         # 初始化AI执行上下文
         context = ExecutionContext()
         slow_mind = SlowMind(context)
         
         # 使用正确的函数生成PRD内容，传递HTML内容而不是文件路径
-        prd_text = slow_mind.generate_prd_from_html(html_content)
+        prd_text = await run_blocking(slow_mind.generate_prd_from_html, html_content)
+        # 只缓存通过校验的 PRD，尽力返回的输出不供之后的近似重复页面复用
+        if slow_mind.prd_validated:
+            await _remember_analysis(fingerprint, extract_html_structure(html_content)["title"], "prd_text", prd_text)
         
         return PRDGenerateResponse(
             prd_text=prd_text,
@@ -157,24 +229,43 @@ async def generate_prd_from_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"PRD生成失败: {str(e)}")
 
 @upload_router.post("/extract-knowledge", response_model=KnowledgeExtractResponse)
-async def extract_knowledge_from_file(file: UploadFile = File(...)):
+async def extract_knowledge_from_file(file: UploadFile = File(...), reuse: bool = Form(True)):
     """
     通过上传的HTML文件提取知识点
     
     参数：
     - file: HTML 文件
+    - reuse: 与已分析过的页面近似重复时，是否直接复用已有的知识点图谱
     """
     try:
         # 读取上传的文件内容
         content = await file.read()
         html_content = content.decode('utf-8')
         
+        # 近似重复的页面直接复用之前提取的知识点图谱
+        fingerprint = await run_io("similarity.fingerprint", page_fingerprint, html_content)
+        if reuse:
+            previous = await _find_previous_analysis(fingerprint, "graph")
+            if previous is not None:
+                record, distance = previous
+                duplicate_uploads.inc(kind="knowledge")
+                llm_calls_avoided.inc(kind="knowledge")
+                return KnowledgeExtractResponse(
+                    graph=record["graph"],
+                    status="reused",
+                    reused_from=record["id"],
+                    similarity=similarity_score(distance)
+                )
+        
         # 初始化AI执行上下文
         context = ExecutionContext()
         fast_mind = FastMind(context)
         
         # 使用正确的函数提取知识点，传递HTML内容而不是文件路径
-        knowledge_data = fast_mind.extract_knowledge_points_from_html(html_content)
+        knowledge_data = await run_blocking(fast_mind.extract_knowledge_points_from_html, html_content)
+        # 模型不可用时返回的模拟知识点不缓存，否则之后的近似重复页面都会复用模拟数据
+        if not fast_mind.used_mock:
+            await _remember_analysis(fingerprint, extract_html_structure(html_content)["title"], "graph", knowledge_data)
         
         return KnowledgeExtractResponse(
             graph=knowledge_data,
@@ -183,22 +274,55 @@ async def extract_knowledge_from_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"知识点提取失败: {str(e)}")
 
+@upload_router.post("/similar", response_model=SimilarPagesResponse)
+async def find_similar_pages(file: UploadFile = File(...), max_distance: Optional[int] = Form(None)):
+    """
+    查找与上传的HTML文件近似重复的已分析页面
+    
+    参数：
+    - file: HTML 文件
+    - max_distance: 指纹汉明距离阈值，越小越严格（不超过服务配置的阈值）
+    """
+    try:
+        content = await file.read()
+        html_content = content.decode('utf-8', errors='ignore')
+        fingerprint = await run_io("similarity.fingerprint", page_fingerprint, html_content)
+        
+        matches = []
+        for analysis_id, distance in duplicate_index.find(fingerprint, max_distance):
+            record = await analysis_store.load(analysis_id)
+            if record is None:
+                continue
+            matches.append(SimilarPage(
+                id=record["id"],
+                title=record.get("title", ""),
+                distance=distance,
+                similarity=similarity_score(distance),
+                has_prd=record.get("prd_text") is not None,
+                has_knowledge=record.get("graph") is not None,
+                created_at=record.get("created_at", "")
+            ))
+        
+        return SimilarPagesResponse(matches=matches)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"相似页面查询失败: {str(e)}")
+
+def _list_upload_files() -> List[Dict[str, Any]]:
+    """读取上传文件的信息"""
+    files = []
+    for filename in storage.list(UPLOAD_PREFIX):
+        stat = storage.stat(join_key(UPLOAD_PREFIX, filename))
+        if stat is not None:
+            files.append({
+                "filename": filename,
+                "size": stat.size,
+                "modified": datetime.fromtimestamp(stat.modified).isoformat()
+            })
+    return files
+
 @upload_router.get("/list")
 async def list_uploaded_files():
     """列出所有上传的文件"""
-    upload_dir = os.path.join("data", "uploads")
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    files = []
-    if os.path.exists(upload_dir):
-        for filename in os.listdir(upload_dir):
-            file_path = os.path.join(upload_dir, filename)
-            if os.path.isfile(file_path):
-                stat = os.stat(file_path)
-                files.append({
-                    "filename": filename,
-                    "size": stat.st_size,
-                    "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
-                })
+    files = await run_io("upload.list", _list_upload_files)
     
     return {"files": files}
\ No newline at end of file
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+JSON 序列化基准测试：对比标准库 json（原落盘方式）与 utils.json_codec
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_json.py
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import json_codec
+
+
+def build_knowledge_graph(target_size: int = 5 * 1024 * 1024) -> dict:
+    """构造约 target_size 字节（缩进 JSON）的知识点图谱"""
+    nodes, edges, dependent_edges = [], [], []
+    i = 0
+    while True:
+        node_id = f"{i // 20 + 1}_{i % 20 + 1}"
+        nodes.append({"data": {
+            "id": node_id,
+            "label": f"知识点{i}：使用 h 元素和 p 元素体验标题与段落的语义化结构",
+            "type": "knowledge",
+            "category": "media-block",
+            "placementHint": "main-content",
+            "select_element": ["h1", "h2", "h3", "p", "span"],
+        }})
+        if i:
+            edges.append({"data": {"source": f"{(i - 1) // 20 + 1}_{(i - 1) % 20 + 1}", "target": node_id}})
+            dependent_edges.append({"data": {"source": nodes[i - 1]["data"]["id"], "target": node_id}})
+        i += 1
+        if i % 1000 == 0:
+            graph = {"nodes": nodes, "edges": edges, "dependent_edges": dependent_edges}
+            if len(json.dumps(graph, ensure_ascii=False, indent=2).encode("utf-8")) >= target_size:
+                return {"id": "bench", "name": "基准测试图谱", "graph": graph, "created_at": "2024-01-01T00:00:00"}
+
+
+def build_task_record(target_size: int = 5 * 1024 * 1024) -> dict:
+    """构造内嵌 raw_response 的任务结果 JSON"""
+    block = (
+        "<section id=\"text_paragraph_title\"><h1>标题与段落</h1><p>这是一个用于演示的段落，包含\"引号\"与换行。\n</p></section>\n"
+    )
+    html = block * (target_size // (2 * len(block.encode("utf-8"))))
+    raw = f"```html filename=public/index.html\n{html}```\n\n```json\n{{\"files\": [\"public/index.html\"]}}\n```"
+    return {
+        "task_id": "bench",
+        "status": "success",
+        "message": "任务执行成功",
+        "files": ["public/index.html"],
+        "result": {"files": {"public/index.html": html}, "interfaces": {"files": ["public/index.html"]}, "raw_response": raw},
+    }
+
+
+def timeit(func, repeat: int = 5) -> float:
+    """返回多次运行中的最短耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def bench(name: str, obj: dict) -> None:
+    tmp_dir = tempfile.mkdtemp()
+    legacy_path = os.path.join(tmp_dir, "legacy.json")
+    codec_path = os.path.join(tmp_dir, "codec.json")
+
+    def legacy_dump():
+        with open(legacy_path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+
+    def legacy_load():
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            json.load(f)
+
+    legacy_dump()
+    json_codec.dump_file(codec_path, obj)
+
+    rows = [
+        ("落盘写入", timeit(legacy_dump), timeit(lambda: json_codec.dump_file(codec_path, obj))),
+        ("读取解析", timeit(legacy_load), timeit(lambda: json_codec.load_file(codec_path))),
+        ("响应序列化", timeit(lambda: json.dumps(obj, ensure_ascii=False).encode("utf-8")), timeit(lambda: json_codec.dumps(obj))),
+    ]
+
+    backend = "orjson" if json_codec.orjson is not None else "json(回退)"
+    print(f"\n=== {name} ===")
+    print(f"文件大小: 原格式 {os.path.getsize(legacy_path) / 1024 / 1024:.2f} MB, "
+          f"紧凑格式 {os.path.getsize(codec_path) / 1024 / 1024:.2f} MB")
+    print(f"{'操作':<10}{'json(ms)':>12}{backend + '(ms)':>16}{'加速比':>10}")
+    for label, baseline, optimized in rows:
+        print(f"{label:<10}{baseline:>12.1f}{optimized:>16.1f}{baseline / optimized:>10.1f}x")
+
+
+def main():
+    print("开始 JSON 序列化基准测试...")
+    bench("5MB 知识点图谱", build_knowledge_graph())
+    bench("5MB 任务结果（含 raw_response）", build_task_record())
+
+
+if __name__ == "__main__":
+    main()
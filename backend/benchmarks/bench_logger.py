@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+日志基准测试：utils.logger 在调用方的单次耗时（格式化与写文件在后台线程中完成），
+以同步 print() 写入文件作为参照
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_logger.py
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 日志写入临时文件，不输出到控制台；队列足够大，测试期间不丢弃日志
+_tmp_dir = tempfile.mkdtemp()
+os.environ["LOG_FILE"] = os.path.join(_tmp_dir, "bench.jsonl")
+os.environ["LOG_CONSOLE"] = "0"
+os.environ["LOG_LEVEL"] = "INFO"
+os.environ.setdefault("LOG_QUEUE_SIZE", "1000000")
+
+from utils.logger import get_logger, log_context, shutdown_logging
+
+ITERATIONS = 100000
+
+
+def timeit(func) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        func(i)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def main():
+    print("开始日志基准测试...")
+    logger = get_logger("bench")
+    with open(os.path.join(_tmp_dir, "print.txt"), "w", encoding="utf-8") as f:
+        def legacy(i):
+            print(f"1_{i} - 使用 h 元素和 p 元素体验标题与段落的语义化结构", file=f, flush=True)
+        baseline = timeit(legacy)
+
+    with log_context(task_id="bench-task", request_id="bench-request"):
+        rows = [
+            ("info", timeit(lambda i: logger.info("知识点", node_id=f"1_{i}", label="标题与段落"))),
+            ("debug(过滤)", timeit(lambda i: logger.debug("知识点", node_id=f"1_{i}"))),
+            ("info(采样1%)", timeit(lambda i: logger.info("知识点", sample=0.01, node_id=f"1_{i}"))),
+        ]
+
+    flush_start = time.perf_counter()
+    shutdown_logging()
+    print(f"后台线程写完剩余日志耗时: {(time.perf_counter() - flush_start) * 1000:.1f} ms")
+    print(f"参照 print(): {baseline:.2f} us/次（写入页缓存，未计入终端或管道阻塞）")
+    print(f"{'调用':<14}{'logger(us)':>12}")
+    for label, cost in rows:
+        print(f"{label:<14}{cost:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+冷启动基准测试：在新进程中测量 import main 的耗时，以及 uvicorn 启动到首个请求返回的耗时，
+超出预算或启动时导入了应延迟导入的模块时以非零状态退出，可在 CI 中作为启动回归检查
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_startup.py
+    STARTUP_BUDGET_SECONDS=1.5 python benchmarks/bench_startup.py --runs 10
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 预算（秒）：import main 的耗时，与 uvicorn 启动到 GET / 返回的耗时，均取多次运行的中位数。
+# 开发机上 import main 的中位数为 0.37~0.61s、启动到首个请求为 0.54~0.75s（随机器负载波动），
+# 预算约留一倍余量，只拦截明显的回归（如重新在启动时导入 SDK）；延迟导入的检查不受机器快慢影响
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.0"))
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "1.5"))
+
+# 只在首次使用时导入的模块，出现在启动后的 sys.modules 中即视为回归
+DEFERRED_MODULES = ("openai", "httpx", "boto3", "pyinstrument")
+
+_IMPORT_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [name for name in %r if name in sys.modules]}))
+""" % (DEFERRED_MODULES,)
+
+
+def _environment(storage_dir: str) -> dict:
+    env = dict(os.environ)
+    # 使用空的临时存储，日志不写文件，避免测试数据写入仓库
+    env.update(STORAGE_URL=storage_dir, LOG_FILE="", LOG_CONSOLE="0", PYTHONDONTWRITEBYTECODE="1")
+    return env
+
+
+def measure_import(env: dict) -> dict:
+    output = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_startup(env: dict, timeout: float = 30.0) -> float:
+    """启动 uvicorn，返回从创建进程到 GET / 返回 200 的耗时"""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"服务启动失败: {process.stderr.read().decode(errors='replace')}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("服务启动超时")
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def top_imports(env: dict, limit: int = 10) -> list:
+    """用 -X importtime 列出 main 直接导入的模块中累计耗时最多的几个"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # 只统计顶层导入（缩进两个空格）
+        if cumulative.strip().isdigit() and name.startswith("   ") and not name.startswith("    "):
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print("开始冷启动基准测试...")
+    failures = []
+    with tempfile.TemporaryDirectory() as storage_dir:
+        env = _environment(storage_dir)
+        imports = [measure_import(env) for _ in range(args.runs)]
+        startups = [measure_startup(env) for _ in range(args.runs)]
+
+        print(f"{'顶层导入':<40}{'累计(s)':>10}")
+        for seconds, name in top_imports(env):
+            print(f"{name:<40}{seconds:>10.3f}")
+
+    import_median = statistics.median(result["seconds"] for result in imports)
+    startup_median = statistics.median(startups)
+    loaded = sorted({name for result in imports for name in result["loaded"]})
+    print(f"import main: 中位数 {import_median:.3f}s（预算 {IMPORT_BUDGET_SECONDS}s）")
+    print(f"启动到首个请求: 中位数 {startup_median:.3f}s，最大 {max(startups):.3f}s（预算 {STARTUP_BUDGET_SECONDS}s）")
+
+    if import_median > IMPORT_BUDGET_SECONDS:
+        failures.append(f"import main 耗时超出预算: {import_median:.3f}s > {IMPORT_BUDGET_SECONDS}s")
+    if startup_median > STARTUP_BUDGET_SECONDS:
+        failures.append(f"启动耗时超出预算: {startup_median:.3f}s > {STARTUP_BUDGET_SECONDS}s")
+    if loaded:
+        failures.append(f"启动时导入了应延迟导入的模块: {', '.join(loaded)}")
+
+    for failure in failures:
+        print(f"失败: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
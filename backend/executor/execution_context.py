@@ -1,42 +1,125 @@
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
-import httpx
+import threading
+from typing import TYPE_CHECKING, Dict, Optional
+from utils.settings import Settings, get_settings, on_reload
+from utils.logger import get_logger
 
-class ExecutionContext:
-    def __init__(self, use_mock: bool = False):
-        load_dotenv()
+if TYPE_CHECKING:  # pragma: no cover
+    import httpx
+    from openai import OpenAI
 
-        self.use_mock = use_mock
+logger = get_logger(__name__)
+
+ROLES = ("fast", "slow", "executor")
+
+class ClientPool:
+    """
+    按同一份配置创建的模型客户端：各角色的 OpenAI 客户端共用一个 httpx 连接池，在首次使用时创建
+
+    配置重载时换用新的客户端池；旧池在仍在使用它的请求全部结束后关闭，进行中的模型调用不受影响
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._clients: Dict[str, "OpenAI"] = {}
+        self._http_client: Optional["httpx.Client"] = None
+        self._lock = threading.Lock()
+        self._users = 0
+        self._retired = False
+
+    def get(self, role: str) -> "OpenAI":
+        client = self._clients.get(role)
+        if client is not None:
+            return client
+        # openai SDK 导入较慢，不在服务启动或未调用模型的请求中导入
+        import httpx
+        from openai import OpenAI
+
+        with self._lock:
+            if self._http_client is None:
+                # 创建httpx客户端解决版本兼容性问题
+                self._http_client = httpx.Client(limits=httpx.Limits(
+                    max_connections=self.settings.llm_max_connections,
+                    max_keepalive_connections=self.settings.llm_max_connections
+                ))
+            client = self._clients.get(role)
+            if client is None:
+                # 各角色使用独立的 OpenAI 客户端（可选：未来支持不同 Key）
+                client = self._clients[role] = OpenAI(api_key=self.settings.api_key,
+                                                      http_client=self._http_client)
+            return client
+
+    def acquire(self) -> "ClientPool":
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            close = self._retired and self._users == 0
+        if close:
+            self.close()
+
+    def retire(self) -> None:
+        """不再分配给新请求，没有请求使用时关闭"""
+        with self._lock:
+            self._retired = True
+            close = self._users == 0
+        if close:
+            self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            http_client, self._http_client = self._http_client, None
+            self._clients = {}
+        if http_client is not None:
+            http_client.close()
 
-        # 从环境变量读取 API Key 和模型配置
-        self.api_key = os.getenv("API_KEY", "")
 
-        self.fast_model = os.getenv("FAST_MODEL", "gpt-3.5-turbo")
-        self.slow_model = os.getenv("SLOW_MODEL", "gpt-4")
-        self.executor_model = os.getenv("Executor_MODEL", "gpt-4")
+_pool: Optional[ClientPool] = None
+_pool_lock = threading.Lock()
 
-        # 创建httpx客户端解决版本兼容性问题
-        self.http_client = httpx.Client() if self.api_key else None
+def acquire_client_pool() -> ClientPool:
+    """取得当前客户端池，用完后调用 release()"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool(get_settings())
+        return _pool.acquire()
 
-        # 初始化两个独立的 OpenAI 客户端（可选：未来支持不同 Key）
-        self.fast_client = OpenAI(api_key=self.api_key, http_client=self.http_client) if self.api_key else None
-        self.slow_client = OpenAI(api_key=self.api_key, http_client=self.http_client) if self.api_key else None
-        self.executor_client = OpenAI(api_key=self.api_key, http_client=self.http_client) if self.api_key else None
+def _swap_client_pool(settings: Settings) -> None:
+    # 配置重载后，新请求使用新配置创建的客户端池，进行中的请求继续使用旧池
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, ClientPool(settings)
+    if old is not None:
+        old.retire()
 
-    def get_client(self, role: str = "fast") -> OpenAI:
+on_reload(_swap_client_pool)
+
+class ExecutionContext:
+    def __init__(self, use_mock: bool = False):
+        self.use_mock = use_mock
+
+        # 整个请求使用同一份配置与客户端池，请求期间配置重载不影响本次请求
+        self.pool = acquire_client_pool()
+        settings = self.pool.settings
+        self.api_key = settings.api_key
+
+        self.fast_model = settings.fast_model
+        self.slow_model = settings.slow_model
+        self.executor_model = settings.executor_model
+
+    def get_client(self, role: str = "fast") -> Optional["OpenAI"]:
         if self.use_mock:
-            print(f"✅ 使用 Mock 模式，跳过真实调用。({role})")
+            logger.debug("使用 Mock 模式，跳过真实调用", role=role)
             return None  # 或返回 mock client
 
-        if role == "fast":
-            return self.fast_client
-        elif role == "slow":
-            return self.slow_client
-        elif role == "executor":
-            return self.executor_client
-        else:
+        if role not in ROLES:
             raise ValueError(f"未知角色类型: {role}")
+        if not self.api_key:
+            return None
+        return self.pool.get(role)
 
     def get_model(self, role: str = "fast") -> str:
         if role == "fast":
@@ -52,25 +135,29 @@ class ExecutionContext:
         """
         测试 client 是否能正常连接（默认测试 fast 模型）
         """
-        if not self.fast_client:
-            print("❌ API Key未配置")
+        fast_client = self.get_client("fast")
+        if not fast_client:
+            logger.warning("API Key未配置")
             return False
             
         try:
-            print(f"🔍 正在测试 OpenAI API：模型 = {self.fast_model}")
-            response = self.fast_client.chat.completions.create(
+            logger.info("正在测试 OpenAI API", model=self.fast_model)
+            response = fast_client.chat.completions.create(
                 model=self.fast_model,
                 messages=[{"role": "user", "content": "你好，1+1=？"}],
                 timeout=5
             )
-            print("✅ API 响应成功")
-            print("💬 返回内容:", response.choices[0].message.content)
+            logger.info("API 响应成功", content=response.choices[0].message.content)
             return True
         except Exception as e:
-            print(f"❌ API 调用失败：{e}")
+            logger.warning("API 调用失败", error=str(e))
             return False
 
+    def close(self):
+        """归还客户端池（重复调用无影响）"""
+        pool, self.pool = getattr(self, "pool", None), None
+        if pool is not None:
+            pool.release()
+
     def __del__(self):
-        # 清理http客户端
-        if self.http_client:
-            self.http_client.close()
\ No newline at end of file
+        self.close()
\ No newline at end of file
@@ -2,24 +2,31 @@
 TaskExecutor：执行任务，调用OpenAI接口，处理异常
 核心功能：执行单个任务，整合依赖任务的接口和文件信息
 """
-import os
 import re
 import json
-import datetime
-from utils.prompts import generate_demo_site_prompt
+from utils.prompts import generate_demo_site_prompt, generate_demo_sections_prompt
+from utils.site_sections import extract_sections, graph_node_data, node_for_element_id, splice_sections
+from utils.file_manager import RESULTS_PREFIX
+from utils.json_codec import loads
+from utils.storage import join_key, storage
 from executor.execution_context import ExecutionContext
+from utils.logger import get_logger
+from utils.task_events import record_event
+from utils.tracing import SPAN_KIND_CLIENT, record_llm_usage, span
+
+logger = get_logger(__name__)
 
 # 检查是否存在已有的 PRD 文件
 def check_existing_prd():
-    prd_path = os.path.join("data", "prd", "html.txt")
-    return prd_path if os.path.exists(prd_path) else None
+    prd_key = "prd/html.txt"
+    return prd_key if storage.exists(prd_key) else None
 
 # 加载知识点数据
-def load_knowledge_data(path: str = "data/knowledge/knowledge_graph.json") -> dict:
-    if not os.path.exists(path):
+def load_knowledge_data(key: str = "knowledge/knowledge_graph.json") -> dict:
+    content = storage.get(key)
+    if content is None:
         raise FileNotFoundError("未检测到知识点文件，请先生成知识点文件")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return loads(content)
 
 
 class TaskExecutor:
@@ -28,39 +35,46 @@ class TaskExecutor:
         self.client = context.get_client("executor")
         self.model = context.get_model("executor")
 
-    def execute_task(self, dependency_context: str, existing_code_context: str, user_goal: str = "") -> dict:
+    def execute_task(self, dependency_context: str, existing_code_context: str, user_goal: str = "", output_prefix: str = None) -> dict:
         """
         执行单个任务，生成结构化代码并保存到对应目录
         :param dependency_context: 参考网站信息
         :param existing_code_context: 知识点信息
         :param user_goal: 用户目标
+        :param output_prefix: 代码输出的存储前缀，默认写入共享的 project 前缀
         :return: 执行结果描述字典
         """
        
-        prompt = generate_demo_site_prompt(dependency_context, existing_code_context,user_goal)
+        with span("render_prompt") as current:
+            messages = generate_demo_site_prompt(dependency_context, existing_code_context,user_goal)
+            prompt_chars = sum(len(message["content"]) for message in messages)
+            current.set_attribute("prompt_chars", prompt_chars)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            raw = response.choices[0].message.content.strip()
+            record_event("generate", "请求模型生成页面", model=self.model, prompt_chars=prompt_chars)
+            with span("llm.call", kind=SPAN_KIND_CLIENT, **{"gen_ai.request.model": self.model}) as current:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages
+                )
+                raw = response.choices[0].message.content.strip()
+                current.set_attribute("response_chars", len(raw))
+                record_llm_usage(current, response)
+            record_event("generate", "模型返回", response_chars=len(raw))
 
             # 解析代码块
-            files = self._parse_code_blocks(raw)
+            with span("parse_code_blocks") as current:
+                files = self._parse_code_blocks(raw)
+                current.set_attribute("files", len(files))
             # 解析接口描述块
-            interfaces = self._parse_interfaces_block(raw)
-            # 所有代码集中写入 project 文件夹
-            task_dir = os.path.join("data", "results", "project")  
-            os.makedirs(task_dir, exist_ok=True)
-
-            for filename, code in files.items():
-                filepath = os.path.join(task_dir, filename)
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(code.strip())
+            with span("parse_interfaces"):
+                interfaces = self._parse_interfaces_block(raw)
+            # 代码写入任务目录（未指定时集中写入 project 文件夹）
+            with span("write_files", files=len(files)):
+                task_dir = self._write_files(files, output_prefix)
+            record_event("write", "写入生成的文件", files=list(files))
 
-            print(f"示例网页生成完成，生成至 {task_dir}\n")
+            logger.info("示例网页生成完成", prefix=task_dir, files=len(files))
 
             result = {
                 "files": files,
@@ -71,9 +85,105 @@ class TaskExecutor:
             return result
 
         except Exception as e:
-            print(f"执行任务出错：{str(e)}")
+            logger.exception("执行任务出错")
+            return {"error": str(e)}
+
+    def regenerate_sections(self, html: str, plan: dict, graph: dict, dependency_context: str,
+                            user_goal: str = "", output_prefix: str = None) -> dict:
+        """
+        增量生成：只重新生成输入发生变化的分段，拼接回基准页面
+        :param html: 基准任务生成的页面
+        :param plan: plan_regeneration 的结果
+        :param graph: 新的知识点图谱
+        :param dependency_context: 参考网站信息
+        :param user_goal: 用户目标
+        :param output_prefix: 代码输出的存储前缀
+        :return: 执行结果描述字典，另含 regenerated_sections；模型输出不完整时返回 error
+        """
+        nodes = graph_node_data(graph)
+        base_node_ids = plan["base_node_ids"]
+        current = {section["id"]: section for section in extract_sections(html, base_node_ids)}
+        sections = [{
+            "id": section_id,
+            "html": html[current[section_id]["start"]:current[section_id]["end"]],
+            "nodes": [nodes[node_id] for node_id in current[section_id]["node_ids"] if node_id in nodes],
+        } for section_id in plan["regenerate"]]
+        new_nodes = [nodes[node_id] for node_id in plan["new_nodes"]]
+
+        raw = ""
+        replacements, inserted = {}, []
+        try:
+            if sections or new_nodes:
+                with span("render_prompt") as current:
+                    messages = generate_demo_sections_prompt(
+                        sections, new_nodes, dependency_context, self._page_style(html), user_goal
+                    )
+                    current.set_attribute("prompt_chars", sum(len(message["content"]) for message in messages))
+                record_event("generate", "请求模型生成分段", model=self.model,
+                             sections=[section["id"] for section in sections], new_nodes=plan["new_nodes"])
+                with span("llm.call", kind=SPAN_KIND_CLIENT, **{"gen_ai.request.model": self.model}) as current:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages
+                    )
+                    raw = response.choices[0].message.content.strip()
+                    current.set_attribute("response_chars", len(raw))
+                    record_llm_usage(current, response)
+                record_event("generate", "模型返回", response_chars=len(raw))
+                with span("parse_section_blocks"):
+                    blocks = self._parse_section_blocks(raw)
+
+                all_node_ids = list(set(base_node_ids) | set(nodes))
+                for section in sections:
+                    code = blocks.pop(section["id"], None)
+                    parsed = extract_sections(code, all_node_ids) if code else []
+                    # 最外层元素ID必须保持不变，否则下次无法按分段定位
+                    if not parsed or parsed[0]["id"] != section["id"]:
+                        return {"error": f"模型未返回完整的分段: {section['id']}"}
+                    replacements[section["id"]] = code
+                # 其余代码块为新增分段，只接受属于新增知识点的组件
+                for block_id, code in blocks.items():
+                    if node_for_element_id(block_id, plan["new_nodes"]) is not None:
+                        inserted.append(code)
+
+            with span("splice_sections", replaced=len(replacements), inserted=len(inserted)):
+                page = splice_sections(html, base_node_ids, replacements, plan["remove"], inserted)
+            files = {"public/index.html": page}
+            with span("write_files", files=len(files)):
+                task_dir = self._write_files(files, output_prefix)
+            record_event("write", "写入拼接后的页面", files=list(files))
+            logger.info("示例网页增量生成完成", prefix=task_dir, reason=plan["reason"],
+                        replaced=len(replacements), inserted=len(inserted))
+
+            return {
+                "files": files,
+                "interfaces": {},
+                "raw_response": raw,
+                "regenerated_sections": list(replacements) + [
+                    section["id"] for section in extract_sections("\n".join(inserted), plan["new_nodes"])
+                ],
+            }
+
+        except Exception as e:
+            logger.exception("增量生成出错")
             return {"error": str(e)}
 
+    def _write_files(self, files: dict, output_prefix: str = None) -> str:
+        """代码写入存储中的任务前缀（未指定时集中写入 project 前缀），返回写入的前缀"""
+        task_prefix = output_prefix or RESULTS_PREFIX
+        for filename, code in files.items():
+            storage.put(join_key(task_prefix, filename), code.strip().encode("utf-8"))
+        return task_prefix
+
+    def _page_style(self, html: str) -> str:
+        """提取页面中的样式代码，供增量生成时保持风格一致"""
+        return "\n".join(re.findall(r"<style[^>]*>(.*?)</style>", html, re.DOTALL | re.IGNORECASE)).strip()
+
+    def _parse_section_blocks(self, content: str) -> dict:
+        """解析增量生成返回的分段代码块"""
+        pattern = re.compile(r"```(?:\w+)? section=(.+?)\n(.*?)```", re.DOTALL)
+        return {section_id.strip(): code.strip() for section_id, code in pattern.findall(content)}
+
     def _parse_code_blocks(self, content: str) -> dict:
         """解析 LLM 返回的多个代码块"""
         pattern = re.compile(r"```(?:\w+)? filename=(.+?)\n(.*?)```", re.DOTALL)
@@ -87,5 +197,5 @@ class TaskExecutor:
             try:
                 return json.loads(match.group(1))
             except Exception as e:
-                print("⚠️ 接口描述解析失败：", e)
+                logger.warning("接口描述解析失败", error=str(e))
         return {}
\ No newline at end of file
@@ -1,4 +1,8 @@
-from fastapi import FastAPI
+# 启动时加载并校验一次配置（含 .env），之后导入的模块读取环境变量（日志、存储等配置）时即可生效
+from utils.settings import get_settings, reload_settings
+get_settings()
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from api.upload_router import upload_router
 from api.prd_router import prd_router
@@ -8,9 +12,30 @@ from api.preview_router import preview_router
 from api.logs_router import logs_router
 from api.learning_router import learning_router
 from api.test_router import test_router  # 添加这一行
+from api.metrics_router import metrics_router
+from api.search_router import search_router
+from api.profiling_router import profiling_router
+from api.admin_router import admin_router
+from utils.compression import CompressionMiddleware
+from utils.logger import RequestContextMiddleware, shutdown_logging
+from utils.tracing import TracingMiddleware, shutdown_tracing
+from utils.profiling import ProfilingMiddleware
+from utils.loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
+from utils.json_codec import FastJSONResponse
+from utils.file_manager import (
+    RESULTS_PREFIX, normalize_relative_key, ALL_STORES, prd_store, knowledge_store, analysis_store, run_io
+)
+from utils.search_index import rebuild_from_records
+from utils.task_events import task_events
+from utils.similarity import duplicate_index
+from utils.static_files import build_storage_response
+from utils.storage import join_key, storage
 import os
+import signal
+import asyncio
 
-app = FastAPI()
+# 默认使用 orjson 渲染 JSON 响应
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # 配置CORS
 app.add_middleware(
@@ -22,6 +47,22 @@ app.add_middleware(
     expose_headers=["Content-Disposition"]  # 暴露Content-Disposition头部，用于文件下载
 )
 
+# 响应压缩：知识图谱、PRD、测试题等大体积 JSON 按 zstd/br/gzip 协商压缩
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    offload_size=int(os.getenv("COMPRESSION_OFFLOAD_SIZE", str(64 * 1024)))
+)
+
+# 为每个请求开启链路追踪，生成流程各阶段的 span 嵌套在请求的根 span 下
+app.add_middleware(TracingMiddleware)
+
+# 按需剖析命中管理接口所设会话的请求；没有会话时直接放行
+app.add_middleware(ProfilingMiddleware)
+
+# 为每个请求绑定 request_id，写入该请求期间的结构化日志（在链路追踪之外，根 span 可带上 request_id）
+app.add_middleware(RequestContextMiddleware)
+
 # 注册路由
 app.include_router(upload_router, prefix="/api/upload", tags=["Upload"])
 app.include_router(prd_router, prefix="/api/prd", tags=["PRD"])
@@ -31,12 +72,79 @@ app.include_router(preview_router, prefix="/api/preview", tags=["Preview"])
 app.include_router(logs_router, prefix="/api/logs", tags=["Logs"])
 app.include_router(learning_router, prefix="/api/learning", tags=["Learning"])
 app.include_router(test_router, prefix="/api/test", tags=["Test"])  # 添加这一行
-# 添加静态文件服务
-# 设置静态文件目录路径
-STATIC_DIR = os.path.join("data", "results", "project", "src")
-if os.path.exists(STATIC_DIR):
-    from fastapi.staticfiles import StaticFiles
-    app.mount("/api/src", StaticFiles(directory=STATIC_DIR), name="static")
+app.include_router(metrics_router, prefix="/api/metrics", tags=["Metrics"])
+app.include_router(search_router, prefix="/api/search", tags=["Search"])
+app.include_router(profiling_router, prefix="/api/admin/profiling", tags=["Admin"])
+app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
+# 共享静态素材服务（兼容旧页面中 /api/src/ 的引用）
+# 每次请求时解析路径，服务启动后新增的素材无需重启即可访问；按任务解析的素材见 /api/preview/file/{task_id}/
+STATIC_PREFIX = join_key(RESULTS_PREFIX, "src")
+
+@app.get("/api/src/{file_path:path}")
+async def get_shared_static_file(file_path: str, request: Request):
+    relative_key = normalize_relative_key(file_path)
+    if relative_key is None:
+        raise HTTPException(status_code=404, detail="文件未找到")
+    try:
+        return await build_storage_response(request, storage, join_key(STATIC_PREFIX, relative_key))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="文件未找到")
+
+@app.on_event("startup")
+async def cleanup_temp_files():
+    # 清理上次崩溃时遗留的临时文件
+    for store in ALL_STORES:
+        await store.cleanup()
+
+@app.on_event("startup")
+async def build_search_index():
+    # 从已保存的 PRD 与知识点图谱重建全文检索索引，之后随保存/删除增量更新
+    prd_records = await prd_store.list()
+    knowledge_records = await knowledge_store.list()
+    await run_io("search.rebuild", rebuild_from_records, prd_records, knowledge_records)
+
+@app.on_event("startup")
+async def build_duplicate_index():
+    # 加载已分析页面的指纹，用于识别近似重复的上传
+    for analysis_id, record in await analysis_store.items():
+        if isinstance(record, dict) and record.get("fingerprint"):
+            duplicate_index.add(analysis_id, int(record["fingerprint"], 16))
+
+@app.on_event("startup")
+async def build_task_event_index():
+    # 从任务事件日志重建任务摘要索引，日志查询接口直接分页
+    await run_io("events.rebuild", task_events.rebuild)
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    # 采样事件循环延迟，记录阻塞事件循环的调用栈
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+@app.on_event("startup")
+async def handle_sighup():
+    # kill -HUP 重新加载配置（模型、API Key 等），无需重启服务
+    if not hasattr(signal, "SIGHUP"):
+        return
+    def reload():
+        try:
+            reload_settings()
+        except ValueError:
+            pass  # 失败原因已记录日志，保留原配置
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload)
+    except (NotImplementedError, RuntimeError):
+        pass  # 非主线程中的事件循环（如测试客户端）不支持信号处理
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
+@app.on_event("shutdown")
+async def flush_logs():
+    # 导出剩余的 span，写完队列中剩余的日志
+    shutdown_tracing()
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+对冲请求测试：首 token 超过对冲延迟时发出对冲请求，先出首 token 的胜出；胜出的对冲请求中途失败时由主请求接替；
+额度不足时不对冲；线程池排队时间不计入对冲延迟
+使用模拟的流式客户端，不需要模型服务
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+os.environ.setdefault("LOG_FILE", "")
+
+import pytest
+
+from agents import hedging
+
+TASK = "learning_content"
+
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStream:
+    """按给定的延迟逐个输出字符；连接被关闭后读取时抛出异常（与 httpx 的行为一致）"""
+
+    def __init__(self, text, delays, error=None):
+        self.text = text
+        self.delays = delays
+        self.error = error
+        self.response = FakeResponse()
+
+    def __iter__(self):
+        for index, (char, delay) in enumerate(zip(self.text, self.delays)):
+            deadline = time.perf_counter() + delay
+            while time.perf_counter() < deadline:
+                if self.response.closed:
+                    raise OSError("连接已关闭")
+                time.sleep(0.002)
+            if self.response.closed:
+                raise OSError("连接已关闭")
+            yield SimpleNamespace(choices=[SimpleNamespace(
+                delta=SimpleNamespace(content=char),
+                finish_reason="stop" if index == len(self.text) - 1 else None,
+            )])
+        if self.error is not None:
+            raise self.error
+
+
+class FakeClient:
+    """依次用 plans 中的流（或异常）响应每次调用"""
+
+    def __init__(self, *plans):
+        self.plans = list(plans)
+        self.streams = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False, **kwargs):
+        assert stream is True
+        plan = self.plans[len(self.streams)]
+        if isinstance(plan, Exception):
+            self.streams.append(None)
+            raise plan
+        self.streams.append(plan)
+        return plan
+
+
+@pytest.fixture(autouse=True)
+def hedge_settings(monkeypatch):
+    settings = SimpleNamespace(llm_hedge_tasks=f"{TASK}, test_task", llm_hedge_percentile=95,
+                               llm_hedge_delay=0.1, llm_hedge_budget=1.0)
+    monkeypatch.setattr(hedging, "get_settings", lambda: settings)
+    monkeypatch.setattr(hedging, "_samples", {})
+    monkeypatch.setattr(hedging, "_budgets", {})
+    return settings
+
+
+def _content(response):
+    return response.choices[0].message.content
+
+
+def _wait_closed(stream, timeout=1.0):
+    deadline = time.perf_counter() + timeout
+    while not stream.response.closed and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    return stream.response.closed
+
+
+def test_hedge_enabled_only_for_configured_tasks():
+    assert hedging.hedge_enabled(TASK)
+    assert hedging.hedge_enabled("test_task")
+    assert not hedging.hedge_enabled("prd")
+
+
+def test_fast_primary_is_not_hedged():
+    client = FakeClient(FakeStream("abc", [0.01, 0, 0]))
+    response = hedging.hedged_completion(client, "m", [], TASK)
+    assert _content(response) == "abc"
+    assert response.choices[0].finish_reason == "stop"
+    assert len(client.streams) == 1
+
+
+def test_slow_primary_loses_to_hedge_and_is_cancelled():
+    primary = FakeStream("slow", [2.0, 0, 0, 0])
+    backup = FakeStream("fast", [0.01, 0, 0, 0])
+    client = FakeClient(primary, backup)
+
+    started = time.perf_counter()
+    response = hedging.hedged_completion(client, "m", [], TASK)
+    assert _content(response) == "fast"
+    assert time.perf_counter() - started < 1.0
+    assert _wait_closed(primary)
+    assert not backup.response.closed
+
+
+def test_primary_first_token_after_hedge_wins_and_cancels_hedge():
+    """对冲请求发出后主请求先出首 token：主请求胜出，对冲请求被取消"""
+    primary = FakeStream("primary", [0.15, 0, 0, 0, 0, 0, 0])
+    backup = FakeStream("hedge", [1.0, 0, 0, 0, 0])
+    client = FakeClient(primary, backup)
+
+    response = hedging.hedged_completion(client, "m", [], TASK)
+    assert _content(response) == "primary"
+    assert len(client.streams) == 2
+    assert _wait_closed(backup)
+
+
+def test_winner_failing_mid_stream_falls_back_to_other_attempt():
+    primary = FakeStream("abc", [0.3, 0, 0])
+    backup = FakeStream("x", [0.01], error=RuntimeError("中途断开"))
+    client = FakeClient(primary, backup)
+
+    response = hedging.hedged_completion(client, "m", [], TASK)
+    assert _content(response) == "abc"
+
+
+def test_hedge_failing_after_winning_falls_back_to_primary():
+    """对冲请求先出首 token，主请求随后也出首 token 但不被取消；对冲请求中途失败时由主请求完成"""
+    primary = FakeStream("abc", [0.25, 0.3, 0])
+    backup = FakeStream("hh", [0.01, 0.3], error=RuntimeError("中途断开"))
+    client = FakeClient(primary, backup)
+
+    response = hedging.hedged_completion(client, "m", [], TASK)
+    assert _content(response) == "abc"
+    assert len(client.streams) == 2
+
+
+def test_queue_wait_does_not_count_toward_hedge_delay(monkeypatch):
+    """线程池繁忙时主请求排队超过对冲延迟，开始执行后很快出首 token：不发出对冲请求"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hedging, "_executor", executor)
+    executor.submit(time.sleep, 0.3)
+    client = FakeClient(FakeStream("abc", [0.01, 0, 0]), FakeStream("unused", [0]))
+
+    response = hedging.hedged_completion(client, "m", [], TASK)
+    assert _content(response) == "abc"
+    assert len(client.streams) == 1
+    executor.shutdown()
+
+
+def test_all_attempts_failing_raises():
+    client = FakeClient(RuntimeError("服务不可用"))
+    with pytest.raises(RuntimeError):
+        hedging.hedged_completion(client, "m", [], TASK)
+
+
+def test_exhausted_budget_skips_hedge(hedge_settings):
+    hedge_settings.llm_hedge_budget = 0.0
+    hedging._budgets[TASK] = [0.0, 0, 0]
+    client = FakeClient(FakeStream("abc", [0.25, 0, 0]), FakeStream("unused", [0]))
+
+    response = hedging.hedged_completion(client, "m", [], TASK)
+    assert _content(response) == "abc"
+    assert len(client.streams) == 1
+
+
+def test_delay_uses_percentile_once_enough_samples(hedge_settings):
+    assert hedging._delay(TASK, "m") == hedge_settings.llm_hedge_delay
+    for index in range(hedging.MIN_SAMPLES):
+        hedging._observe(TASK, "m", 0.01 * (index + 1))
+    assert hedging._delay(TASK, "m") == pytest.approx(0.2)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+容错 JSON 解析测试：可修复的常见格式问题、截断输出的回退，以及必须拒绝的输入
+不需要启动服务与模型
+"""
+
+import os
+
+os.environ.setdefault("LOG_FILE", "")
+
+import pytest
+
+from agents.schemas import KnowledgePointGenerateResponse
+from utils.json_repair import IncrementalJSONParser, JSONRepairError, loads_lenient
+
+
+def _repairs(raw):
+    parser = IncrementalJSONParser()
+    parser.feed(raw)
+    return parser.value(), parser.repairs
+
+
+@pytest.mark.parametrize("raw, expected, repair", [
+    ('说明如下：\n```json\n{"a": 1}\n```\n以上。', {"a": 1}, "surrounding_text"),
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}, "trailing_comma"),
+    ('[1,, 2]', [1, 2], "extra_comma"),
+    ('{"text": "第一行\n第二行\t结束"}', {"text": "第一行\n第二行\t结束"}, "control_char"),
+    ('{"pattern": "\\d+"}', {"pattern": "\\d+"}, "invalid_escape"),
+    ('{"a": [1, {"b": "x', {"a": [1, {"b": "x"}]}, "truncated"),
+])
+def test_repairs(raw, expected, repair):
+    value, repairs = _repairs(raw)
+    assert value == expected
+    assert repair in repairs
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('Sure! Here [is] the JSON: {"a":1}', {"a": 1}),
+    ('步骤 [见下]：\n```json\n{"a": [1]}\n```', {"a": [1]}),
+    ('见 [附录] 与 {说明}。{"a": 1}', {"a": 1}),
+])
+def test_brackets_in_surrounding_text_are_skipped(raw, expected):
+    """说明文字中的括号闭合后不是 JSON：从其后的下一个 { / [ 重新开始"""
+    value, repairs = _repairs(raw)
+    assert value == expected
+    assert "surrounding_text" in repairs
+
+
+def test_candidate_failing_validation_falls_through_to_fenced_json():
+    raw = ('第 [1] 步的结果：\n```json\n'
+           '{"topic_id": "t", "title": "标题", "levels": [{"level": 1, "description": "完整"}]}\n```')
+    data = loads_lenient(raw, validate=KnowledgePointGenerateResponse.parse_obj)
+    assert data.title == "标题"
+
+
+def test_whitespace_is_preserved_inside_strings_and_collapsed_outside():
+    assert loads_lenient('{ "a" :\n  [ 1 ,\t2 ] , "b" : "x  y" }') == {"a": [1, 2], "b": "x  y"}
+
+
+@pytest.mark.parametrize("raw", [
+    "[1, 2 3]",
+    '{"a": 1 "b": 2}',
+    '{"a": {"b": 1} "c": 2}',
+    '{"a": tru e}',
+    "没有 JSON 的回答",
+    "",
+])
+def test_rejects_malformed_input(raw):
+    """缺少逗号等无法确定原意的错误不做猜测，直接拒绝"""
+    with pytest.raises(JSONRepairError):
+        loads_lenient(raw)
+
+
+def test_truncated_output_backtracks_to_valid_prefix():
+    """截断补全后未通过校验时，退回到最后一个完整且通过校验的元素"""
+    raw = ('{"topic_id": "t", "title": "标题", "levels": ['
+           '{"level": 1, "description": "完整"}, {"level": 2, "descr')
+    data = loads_lenient(raw, validate=KnowledgePointGenerateResponse.parse_obj)
+    assert [level["description"] for level in data.levels] == ["完整"]
+
+
+def test_truncated_output_without_valid_prefix_is_rejected():
+    raw = '{"topic_id": "t", "title": "标题", "levels": [{"level": 1'
+    with pytest.raises(JSONRepairError):
+        loads_lenient(raw, validate=KnowledgePointGenerateResponse.parse_obj)
+
+
+def test_complete_output_failing_validation_raises_validation_error():
+    """未截断的输出不回退，直接抛出校验异常"""
+    with pytest.raises(ValueError) as error:
+        loads_lenient('{"topic_id": "t", "title": "标题", "levels": []}',
+                      validate=KnowledgePointGenerateResponse.parse_obj)
+    assert not isinstance(error.value, JSONRepairError)
+
+
+def test_incremental_feed_matches_single_feed():
+    raw = '```json\n{"nodes": [{"id": "a", "label": "A"}, {"id": "b", "label": "B"},], "edges": []}\n```'
+    parser = IncrementalJSONParser()
+    for start in range(0, len(raw), 7):
+        parser.feed(raw[start:start + 7])
+    assert parser.complete
+    assert parser.value() == loads_lenient(raw)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+全文检索接口测试脚本
+保存一份PRD后按标题、正文和前缀检索，删除后确认索引同步更新
+"""
+
+import requests
+
+# API基础URL
+BASE_URL = "http://localhost:8000"
+
+def search(query, **params):
+    params["q"] = query
+    response = requests.get(f"{BASE_URL}/api/search/", params=params)
+    response.raise_for_status()
+    return response.json()["results"]
+
+def test_search_prd():
+    """测试PRD保存、检索与删除后的索引更新"""
+    print("=== 测试PRD检索 ===")
+    try:
+        response = requests.post(f"{BASE_URL}/api/prd/save", json={
+            "title": "检索测试：Flexbox 布局",
+            "content": "使用 flex 实现响应式导航栏"
+        })
+        prd_id = response.json()["id"]
+
+        checks = {
+            "标题检索": search("Flexbox 布局", type="prd"),
+            "正文检索": search("响应式导航", type="prd"),
+            "前缀检索": search("flexb", type="prd"),
+        }
+        passed = True
+        for name, results in checks.items():
+            found = any(item["id"] == prd_id for item in results)
+            print(f"{name}: {'通过' if found else '失败'}")
+            passed = passed and found
+
+        requests.delete(f"{BASE_URL}/api/prd/{prd_id}")
+        removed = all(item["id"] != prd_id for item in search("响应式导航", type="prd"))
+        print(f"删除后不再返回: {'通过' if removed else '失败'}")
+        return passed and removed
+    except Exception as e:
+        print(f"发生异常: {str(e)}")
+        return False
+
+def test_search_nodes():
+    """测试知识点节点检索"""
+    print("\n=== 测试知识点节点检索 ===")
+    try:
+        graph = {
+            "nodes": [
+                {"data": {"id": "1_end", "label": "模块一: 检索测试基础", "type": "chapter"}},
+                {"data": {"id": "1_1", "label": "使用网格布局排列卡片", "type": "knowledge"}}
+            ],
+            "edges": []
+        }
+        response = requests.post(f"{BASE_URL}/api/knowledge/save", json={"name": "检索测试图谱", "graph": graph})
+        knowledge_id = response.json()["id"]
+
+        results = search("网格布局", type="node", knowledge_id=knowledge_id)
+        found = bool(results) and results[0]["id"] == "1_1"
+        print(f"节点检索: {'通过' if found else '失败'}")
+
+        requests.delete(f"{BASE_URL}/api/knowledge/{knowledge_id}")
+        return found
+    except Exception as e:
+        print(f"发生异常: {str(e)}")
+        return False
+
+def main():
+    """
+    主测试函数
+    """
+    print("=" * 50)
+    print("全文检索功能测试")
+    print("=" * 50)
+
+    success1 = test_search_prd()
+    success2 = test_search_nodes()
+
+    print("\n" + "=" * 50)
+    if success1 and success2:
+        print("所有测试通过!")
+    else:
+        print("部分测试失败!")
+    print("=" * 50)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+存储层测试：组提交的持久化顺序、三种存储后端（本地目录、SQLite、S3）的读写与条件写入，
+以及增量日志的重放、合并和多个实例共享存储时的并发补丁
+不需要启动服务，S3 后端使用 moto 模拟（未安装 moto / boto3 时跳过）
+"""
+
+import os
+import asyncio
+import threading
+
+os.environ.setdefault("LOG_FILE", "")
+
+import pytest
+
+from utils import atomic_writer, file_manager
+from utils.atomic_writer import GroupCommitter, TEMP_SUFFIX
+from utils.delta_log import DELTA_LOG_SUFFIX, append_delta, has_patches, read_deltas
+from utils.file_manager import DocumentStore
+from utils.storage import LocalStorage, PreconditionFailed, SQLiteStorage
+
+
+@pytest.fixture
+def committer():
+    # 提交延迟放大到 50ms，保证并发写入能合并到同一批
+    return GroupCommitter(max_batch=64, max_delay=0.05)
+
+
+def _temp_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith(TEMP_SUFFIX)]
+
+
+def test_group_commit_batches_concurrent_writes(tmp_path, committer):
+    """并发写入合并为一批提交，返回时全部落盘且没有遗留临时文件"""
+    batches = []
+    commit = committer._commit
+    committer._commit = lambda batch: (batches.append(len(batch)), commit(batch))
+
+    def write(index):
+        committer.write(str(tmp_path / f"{index}.json"), f"record-{index}".encode())
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for index in range(16):
+        assert (tmp_path / f"{index}.json").read_bytes() == f"record-{index}".encode()
+    assert sum(batches) == 16
+    assert max(batches) > 1
+    assert _temp_files(tmp_path) == []
+
+
+def test_group_commit_syncs_before_rename(tmp_path, committer, monkeypatch):
+    """每个写入的数据先 fsync 再 rename 覆盖目标文件，写入方在 rename 之后才返回"""
+    events = []
+    real_fsync, real_replace = os.fsync, os.replace
+    monkeypatch.setattr(atomic_writer, "_syncfs", None)
+    monkeypatch.setattr(atomic_writer.os, "fsync", lambda fd: (events.append(("fsync", fd)), real_fsync(fd))[1])
+    monkeypatch.setattr(atomic_writer.os, "replace",
+                        lambda src, dst: (events.append(("replace", dst)), real_replace(src, dst))[1])
+
+    target = str(tmp_path / "record.json")
+    committer.write(target, b"v1")
+    events.append(("returned", target))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds.index("fsync") < kinds.index("replace") < kinds.index("returned")
+
+
+def test_group_commit_keeps_write_order_for_same_file(tmp_path, committer):
+    """同一文件的先后写入按提交顺序生效，后写入的内容不会被先前的覆盖"""
+    target = str(tmp_path / "record.json")
+    for version in range(20):
+        committer.write(target, f"v{version}".encode())
+    assert open(target, "rb").read() == b"v19"
+
+
+def test_group_commit_failed_sync_leaves_target_untouched(tmp_path, committer, monkeypatch):
+    """刷盘失败时写入方收到异常，目标文件保持原内容，临时文件被清理"""
+    target = str(tmp_path / "record.json")
+    committer.write(target, b"old")
+
+    def failing_fsync(fd):
+        raise OSError("disk error")
+
+    monkeypatch.setattr(atomic_writer, "_syncfs", None)
+    monkeypatch.setattr(atomic_writer.os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        committer.write(target, b"new")
+    assert open(target, "rb").read() == b"old"
+    assert _temp_files(tmp_path) == []
+
+
+def _moto_s3_backend():
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    from utils.storage import S3Storage
+
+    mock = moto.mock_aws()
+    mock.start()
+    client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+    client.create_bucket(Bucket="scot-test")
+    return S3Storage("scot-test", prefix="app", client=client), mock.stop
+
+
+@pytest.fixture(params=["local", "sqlite", "s3"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        yield LocalStorage(str(tmp_path))
+        return
+    if request.param == "sqlite":
+        backend = SQLiteStorage(str(tmp_path / "storage.db"))
+        yield backend
+        backend.close()
+        return
+    backend, stop = _moto_s3_backend()
+    yield backend
+    backend.close()
+    stop()
+
+
+def test_backend_roundtrip(backend):
+    """读写、追加、列举、批量读取与删除"""
+    assert backend.get("prd/missing.json") is None
+    backend.put("prd/a.json", b'{"id": "a"}')
+    backend.put("prd/b.json", b'{"id": "b"}')
+    backend.put("prd/nested/c.json", b"c")
+    assert backend.get("prd/a.json") == b'{"id": "a"}'
+    assert backend.stat("prd/a.json").size == len(b'{"id": "a"}')
+    assert sorted(backend.list("prd")) == ["a.json", "b.json"]
+    assert sorted(backend.list("prd", recursive=True)) == ["a.json", "b.json", "nested/c.json"]
+    assert backend.get_many(["prd/a.json", "prd/b.json", "prd/missing.json"]) == {
+        "prd/a.json": b'{"id": "a"}', "prd/b.json": b'{"id": "b"}'
+    }
+
+    backend.append("events/t.jsonl", b"1\n")
+    backend.append("events/t.jsonl", b"2\n")
+    assert backend.get("events/t.jsonl") == b"1\n2\n"
+    assert b"".join(backend.open_read("events/t.jsonl", offset=2)) == b"2\n"
+
+    assert backend.delete("prd/a.json") is True
+    assert backend.delete("prd/a.json") is False
+    assert backend.exists("prd/a.json") is False
+
+
+def test_backend_conditional_writes(backend):
+    """条件写入：版本标记不一致（或对象已存在 / 不存在）时抛出 PreconditionFailed，内容不变"""
+    assert backend.get_versioned("log/a.jsonl") == (None, None)
+    with pytest.raises(PreconditionFailed):
+        backend.append_if("log/a.jsonl", b"x\n", "stale")
+
+    backend.append_if("log/a.jsonl", b"1\n", None)
+    with pytest.raises(PreconditionFailed):
+        backend.append_if("log/a.jsonl", b"x\n", None)
+    data, token = backend.get_versioned("log/a.jsonl")
+    assert data == b"1\n"
+
+    backend.append_if("log/a.jsonl", b"2\n", token)
+    with pytest.raises(PreconditionFailed):
+        backend.append_if("log/a.jsonl", b"x\n", token)
+    with pytest.raises(PreconditionFailed):
+        backend.put_if("log/a.jsonl", b"x\n", token)
+
+    data, token = backend.get_versioned("log/a.jsonl")
+    assert data == b"1\n2\n"
+    backend.put_if("log/a.jsonl", b"reset\n", token)
+    assert backend.get("log/a.jsonl") == b"reset\n"
+    assert backend.get_versioned("log/a.jsonl")[1] != token
+
+
+def test_backend_concurrent_appends_are_not_lost(backend):
+    def append(index):
+        for line in range(10):
+            backend.append("events/t.jsonl", f"{index}-{line}\n".encode())
+
+    threads = [threading.Thread(target=append, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = backend.get("events/t.jsonl").decode().split()
+    assert sorted(lines) == sorted(f"{index}-{line}" for index in range(4) for line in range(10))
+
+
+def test_backend_rejects_path_traversal(backend):
+    with pytest.raises(ValueError):
+        backend.put("../outside.json", b"x")
+
+
+def test_delta_log_replay(backend):
+    """补丁只追加增量日志，新的存储实例读取时在记录之上按顺序重放"""
+    store = DocumentStore("test", "prd", backend=backend)
+    asyncio.run(store.save("doc", {"id": "doc", "title": "v0", "tags": []}))
+    asyncio.run(store.patch("doc", "merge-patch", {"title": "v1"}))
+    asyncio.run(store.patch("doc", "json-patch", [{"op": "add", "path": "/tags/-", "value": "x"}], 1))
+
+    assert len(read_deltas(backend, "prd/doc" + DELTA_LOG_SUFFIX)) == 2
+    record = asyncio.run(DocumentStore("test", "prd", backend=backend).load("doc"))
+    assert (record["title"], record["tags"], record["version"]) == ("v1", ["x"], 2)
+
+    with pytest.raises(file_manager.VersionConflict):
+        asyncio.run(store.patch("doc", "merge-patch", {"title": "stale"}, 1))
+
+
+def test_delta_log_skips_entries_already_in_record(backend):
+    """合并后、删除日志前崩溃：记录已包含的增量按 version 跳过，不会重复应用"""
+    store = DocumentStore("test", "prd", backend=backend)
+    asyncio.run(store.save("doc", {"id": "doc", "tags": [], "version": 1}))
+    append_delta(backend, "prd/doc" + DELTA_LOG_SUFFIX,
+                 {"version": 1, "kind": "json-patch", "patch": [{"op": "add", "path": "/tags/-", "value": "old"}],
+                  "updated_at": "t1"})
+    append_delta(backend, "prd/doc" + DELTA_LOG_SUFFIX,
+                 {"version": 2, "kind": "json-patch", "patch": [{"op": "add", "path": "/tags/-", "value": "new"}],
+                  "updated_at": "t2"})
+
+    record = asyncio.run(store.load("doc"))
+    assert (record["tags"], record["version"]) == (["new"], 2)
+
+
+def test_delta_log_compaction(backend, monkeypatch):
+    """增量达到阈值时合并回记录并删除日志"""
+    monkeypatch.setattr(file_manager, "DELTA_COMPACT_THRESHOLD", 3)
+    store = DocumentStore("test", "prd", backend=backend)
+    asyncio.run(store.save("doc", {"id": "doc", "count": 0}))
+    for count in range(1, 4):
+        asyncio.run(store.patch("doc", "merge-patch", {"count": count}))
+
+    # 日志重置为合并标记而不是删除
+    assert not has_patches(backend.get("prd/doc" + DELTA_LOG_SUFFIX))
+    record = asyncio.run(store.load("doc"))
+    assert (record["count"], record["version"]) == (3, 3)
+    assert asyncio.run(store.patch("doc", "merge-patch", {"count": 4}))["version"] == 4
+    assert asyncio.run(DocumentStore("test", "prd", backend=backend).load("doc"))["count"] == 4
+
+
+def test_save_if_version_does_not_overwrite_newer_patch(backend):
+    """按版本条件保存：读取后记录已被修改时不写入，不会丢失并发的补丁"""
+    store = DocumentStore("test", "prd", backend=backend)
+    asyncio.run(store.save("doc", {"id": "doc", "title": "v0"}))
+    stale = asyncio.run(store.load("doc"))
+    asyncio.run(store.patch("doc", "merge-patch", {"title": "v1"}))
+
+    assert asyncio.run(store.save_if_version("doc", dict(stale, derived=True), 0)) is False
+    current = asyncio.run(store.load("doc"))
+    assert (current["title"], current["version"]) == ("v1", 1)
+    assert asyncio.run(store.save_if_version("doc", dict(current, derived=True), 1)) is True
+    assert asyncio.run(store.load("doc"))["derived"] is True
+
+
+def _interleave(monkeypatch, backend, action):
+    """在下一次条件追加之前执行 action（模拟另一个节点在读取与追加之间写入）"""
+    append_if = backend.append_if
+
+    def interleaved(key, data, token):
+        monkeypatch.setattr(backend, "append_if", append_if)
+        action()
+        return append_if(key, data, token)
+    monkeypatch.setattr(backend, "append_if", interleaved)
+
+
+def test_concurrent_patches_from_separate_stores_conflict(backend, monkeypatch):
+    """两个存储实例（相当于两个节点，进程内的锁互不可见）基于同一版本修改：后追加的一方版本冲突"""
+    first = DocumentStore("test", "prd", backend=backend)
+    second = DocumentStore("test", "prd", backend=backend)
+    asyncio.run(first.save("doc", {"id": "doc", "title": "v0"}))
+
+    _interleave(monkeypatch, backend, lambda: second._patch("doc", "merge-patch", {"title": "second"}, 0, None))
+    with pytest.raises(file_manager.VersionConflict):
+        asyncio.run(first.patch("doc", "merge-patch", {"title": "first"}, 0))
+
+    assert [entry["version"] for entry in read_deltas(backend, "prd/doc" + DELTA_LOG_SUFFIX)] == [1]
+    record = asyncio.run(first.load("doc"))
+    assert (record["title"], record["version"]) == ("second", 1)
+
+
+@pytest.mark.parametrize("threshold", [32, 1])
+def test_concurrent_patches_without_if_match_are_both_applied(backend, monkeypatch, threshold):
+    """不带 If-Match 时冲突的一方重新读取后追加；另一方在此期间合并日志（threshold=1）也不会丢失修改"""
+    monkeypatch.setattr(file_manager, "DELTA_COMPACT_THRESHOLD", threshold)
+    first = DocumentStore("test", "prd", backend=backend)
+    second = DocumentStore("test", "prd", backend=backend)
+    asyncio.run(first.save("doc", {"id": "doc"}))
+
+    _interleave(monkeypatch, backend, lambda: second._patch("doc", "merge-patch", {"b": 2}, None, None))
+    assert asyncio.run(first.patch("doc", "merge-patch", {"a": 1}))["version"] == 2
+
+    record = asyncio.run(DocumentStore("test", "prd", backend=backend).load("doc"))
+    assert (record["a"], record["b"], record["version"]) == (1, 2, 2)
+
+
+def test_local_append_truncates_partial_tail(tmp_path):
+    """崩溃遗留的半行在读取时被忽略，下次追加前截断"""
+    backend = LocalStorage(str(tmp_path))
+    append_delta(backend, "prd/doc" + DELTA_LOG_SUFFIX, {"version": 1})
+    with open(tmp_path / "prd" / ("doc" + DELTA_LOG_SUFFIX), "ab") as f:
+        f.write(b'{"version": 2, "kin')
+    assert [entry["version"] for entry in read_deltas(backend, "prd/doc" + DELTA_LOG_SUFFIX)] == [1]
+
+    append_delta(backend, "prd/doc" + DELTA_LOG_SUFFIX, {"version": 2})
+    assert [entry["version"] for entry in read_deltas(backend, "prd/doc" + DELTA_LOG_SUFFIX)] == [1, 2]
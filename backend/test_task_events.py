@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+任务事件日志测试：摘要索引（分页、过滤、重建、跨实例读取）与实时跟踪接口（SSE）
+不需要启动服务，事件写入临时目录
+"""
+
+import os
+import json
+import time
+import threading
+
+os.environ.setdefault("LOG_FILE", "")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import logs_router as logs_module
+from utils.storage import LocalStorage
+from utils.task_events import TaskEventLog
+
+
+@pytest.fixture
+def event_log(tmp_path):
+    return TaskEventLog(LocalStorage(str(tmp_path)))
+
+
+@pytest.fixture
+def client(event_log, monkeypatch):
+    monkeypatch.setattr(logs_module, "task_events", event_log)
+    app = FastAPI()
+    app.include_router(logs_module.logs_router, prefix="/api/logs")
+    return TestClient(app)
+
+
+def test_summary_tracks_latest_event(event_log):
+    event_log.record("start", "开始", task_id="t1", status="running")
+    event_log.record("save", "写入文件", task_id="t1", files=["index.html"])
+    event_log.record("done", "完成", task_id="t1", status="success")
+
+    summary = event_log.summary("t1")
+    assert (summary["status"], summary["stage"], summary["events"]) == ("success", "done", 3)
+    assert summary["files"] == ["index.html"]
+    assert [event["seq"] for event in event_log.read("t1", after=1)] == [2, 3]
+
+
+def test_query_pages_by_update_time_and_filters(event_log):
+    for index in range(5):
+        event_log.record("start", task_id=f"t{index}", status="running")
+    event_log.record("done", task_id="t1", status="success")
+
+    page, total = event_log.query(offset=0, limit=2)
+    assert total == 5
+    assert [summary["task_id"] for summary in page] == ["t1", "t4"]
+    page, total = event_log.query(offset=2, limit=10)
+    assert [summary["task_id"] for summary in page] == ["t3", "t2", "t0"]
+
+    page, total = event_log.query(status="success")
+    assert (total, [summary["task_id"] for summary in page]) == (1, ["t1"])
+    page, total = event_log.query(status="running", limit=2)
+    assert (total, len(page)) == (4, 2)
+
+
+def test_concurrent_appends_keep_per_task_order(event_log):
+    """多个线程同时向多个任务追加：每个任务的事件按 seq 连续编号、按顺序落盘"""
+    def record(task_id):
+        for index in range(25):
+            event_log.record("step", str(index), task_id=task_id)
+
+    threads = [threading.Thread(target=record, args=(f"t{index % 3}",)) for index in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for index in range(3):
+        assert [event["seq"] for event in event_log.read(f"t{index}")] == list(range(1, 51))
+        assert event_log.summary(f"t{index}")["events"] == 50
+
+
+def test_rebuild_and_load_summary_from_storage(tmp_path, event_log):
+    """重启后从事件日志重建索引；另一个实例按任务ID读取本地索引中没有的任务"""
+    event_log.record("start", task_id="t1", status="running")
+    event_log.record("done", task_id="t1", status="failed")
+
+    other = TaskEventLog(LocalStorage(str(tmp_path)))
+    assert other.summary("t1") is None
+    summary = other.load_summary("t1")
+    assert (summary["status"], summary["events"]) == ("failed", 2)
+    assert other.summary("t1") is None
+    assert other.load_summary("missing") is None
+
+    assert other.rebuild() == 1
+    assert other.summary("t1")["status"] == "failed"
+
+
+def test_delete_removes_summary_and_log(event_log):
+    event_log.record("start", task_id="t1")
+    assert event_log.delete("t1") is True
+    assert event_log.summary("t1") is None
+    assert event_log.read("t1") == []
+    assert event_log.delete("t1") is False
+
+
+def _sse_events(lines):
+    """解析 SSE 文本行，返回 (event, data) 列表"""
+    events, name = [], None
+    for line in lines:
+        if line.startswith("event: "):
+            name = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((name, json.loads(line[len("data: "):])))
+    return events
+
+
+def test_tail_streams_backlog_and_live_events(client, event_log):
+    """先推送已有事件，再推送之后追加的事件，任务结束后发送 end 并释放订阅"""
+    event_log.record("start", "开始", task_id="t1", status="running")
+
+    def finish():
+        time.sleep(0.3)
+        event_log.record("generate", "生成中", task_id="t1")
+        event_log.record("done", "完成", task_id="t1", status="success")
+
+    worker = threading.Thread(target=finish)
+    worker.start()
+    with client.stream("GET", "/api/logs/t1/tail") as response:
+        assert response.status_code == 200
+        events = _sse_events(response.iter_lines())
+    worker.join()
+
+    assert [data["seq"] for name, data in events if name == "task_event"] == [1, 2, 3]
+    assert events[-1][0] == "end" and events[-1][1]["status"] == "success"
+    assert event_log._subscribers == {}
+
+
+def test_tail_resumes_from_last_event_id(client, event_log):
+    for stage in ("start", "generate"):
+        event_log.record(stage, task_id="t1")
+    event_log.record("done", task_id="t1", status="success")
+
+    response = client.get("/api/logs/t1/tail", headers={"Last-Event-ID": "2"})
+    events = _sse_events(response.text.splitlines())
+    assert [data["seq"] for name, data in events if name == "task_event"] == [3]
+    assert event_log._subscribers == {}
+
+
+def test_tail_unknown_task(client):
+    assert client.get("/api/logs/missing/tail").status_code == 404
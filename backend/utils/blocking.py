@@ -0,0 +1,18 @@
+"""
+在线程池中执行阻塞调用，避免占用事件循环
+
+模型调用（同步 OpenAI 客户端）一次往往需要数秒到数十秒，直接在 async 接口中调用会阻塞事件循环，
+期间其他请求、健康检查与任务事件跟踪都无法响应。
+"""
+import asyncio
+import contextvars
+from functools import partial
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """在默认线程池中执行耗时的模型调用；沿用调用方的上下文（日志的 request_id / task_id、链路 span）"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, partial(func, *args, **kwargs))
@@ -0,0 +1,230 @@
+"""
+响应压缩中间件：按 Accept-Encoding 协商 zstd / br / gzip，
+大响应体的压缩放到线程池中执行，避免阻塞事件循环
+"""
+import os
+import gzip
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.metrics import registry
+
+# 可选依赖：未安装时对应编码不参与协商
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# 可压缩的内容类型（图片、音视频、zip 等本身已压缩，不再处理）
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+# 编码优先级：客户端权重相同时按此顺序选择
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+# 压缩级别：(负载较低时, 负载较高时)
+COMPRESSION_LEVELS = {
+    "zstd": (6, 1),
+    "br": (5, 1),
+    "gzip": (6, 1),
+}
+
+compression_bytes_in = registry.counter("compression_bytes_in", "压缩前响应体字节数")
+compression_bytes_out = registry.counter("compression_bytes_out", "压缩后响应体字节数")
+compression_ratio = registry.histogram(
+    "compression_ratio", "压缩比（压缩前/压缩后）", buckets=[1.5, 2, 3, 4, 6, 8, 12, 16]
+)
+compression_seconds = registry.histogram("compression_seconds", "单次压缩耗时（秒）")
+
+
+def _compress_gzip(body: bytes, level: int) -> bytes:
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _compress_br(body: bytes, level: int) -> bytes:
+    return brotli.compress(body, quality=level)
+
+
+def _compress_zstd(body: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def available_encoders() -> Dict[str, Callable[[bytes, int], bytes]]:
+    """当前环境可用的压缩编码"""
+    encoders = {"gzip": _compress_gzip}
+    if brotli is not None:
+        encoders["br"] = _compress_br
+    if zstandard is not None:
+        encoders["zstd"] = _compress_zstd
+    return encoders
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 {编码: 权重}"""
+    weights = {}
+    for part in header.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    return weights
+
+
+def choose_encoding(accept_encoding: str, encoders: Dict[str, Callable]) -> Optional[str]:
+    """在客户端接受且服务端支持的编码中选择权重最高的一个"""
+    weights = parse_accept_encoding(accept_encoding)
+    wildcard = weights.get("*", 0.0)
+    candidates: List[Tuple[float, int, str]] = []
+    for rank, name in enumerate(ENCODING_PREFERENCE):
+        if name not in encoders:
+            continue
+        q = weights.get(name, wildcard)
+        if q > 0:
+            candidates.append((-q, rank, name))
+    if not candidates:
+        return None
+    return min(candidates)[2]
+
+
+def choose_level(encoding: str, body_size: int, large_body_size: int) -> int:
+    """
+    根据 CPU 负载与响应体大小选择压缩级别：
+    负载高或响应体很大时使用低级别，优先保证吞吐
+    """
+    normal_level, fast_level = COMPRESSION_LEVELS[encoding]
+    try:
+        load_per_cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        load_per_cpu = 0.0
+    if load_per_cpu >= 0.75 or body_size >= large_body_size * 16:
+        return fast_level
+    if load_per_cpu >= 0.5:
+        return (normal_level + fast_level) // 2
+    return normal_level
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件
+
+    - 仅压缩一次性发送的响应体（流式响应如 SSE 原样透传）
+    - 小于 minimum_size 的响应不压缩
+    - 大于 offload_size 的响应在线程池中压缩
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        offload_size: int = 64 * 1024,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.encoders = available_encoders()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""), self.encoders)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+
+    def _should_compress(self, headers: Headers) -> bool:
+        if self.start_message["status"] in (204, 206, 304) or self.start_message["status"] < 200:
+            return False
+        if "content-encoding" in headers or "content-range" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        if content_type.startswith("text/event-stream"):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._should_compress(Headers(raw=message["headers"]))
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if self.passthrough or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        if message.get("more_body", False) or len(body) < self.middleware.minimum_size:
+            # 流式响应或小响应体：原样发送
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        compressed = await self._compress(body)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        # 强 ETag 标识的是未压缩的字节，压缩后的表示改为弱 ETag：
+        # If-None-Match 按弱比较仍能命中 304，If-Range 按强比较不再匹配，不会把未压缩内容的区间拼到压缩体上
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+        headers.add_vary_header("Accept-Encoding")
+        await self._send(self.start_message)
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+    async def _compress(self, body: bytes) -> bytes:
+        middleware = self.middleware
+        level = choose_level(self.encoding, len(body), middleware.offload_size)
+        encoder = middleware.encoders[self.encoding]
+
+        started = time.perf_counter()
+        if len(body) >= middleware.offload_size:
+            compressed = await anyio.to_thread.run_sync(encoder, body, level)
+        else:
+            compressed = encoder(body, level)
+        elapsed = time.perf_counter() - started
+
+        compression_bytes_in.inc(len(body), encoding=self.encoding)
+        compression_bytes_out.inc(len(compressed), encoding=self.encoding)
+        compression_ratio.observe(len(body) / max(len(compressed), 1), encoding=self.encoding)
+        compression_seconds.observe(elapsed, encoding=self.encoding)
+        return compressed
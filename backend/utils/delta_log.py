@@ -0,0 +1,81 @@
+"""
+追加写入的增量日志：每条记录的修改以一行 JSON 追加到 <id>.deltas.jsonl
+
+- 追加后持久化（本地后端 fsync），返回时修改已落盘；只写入变化部分，不重写整个记录
+- 崩溃可能在末尾留下半行：读取时忽略，下次追加前截断
+- 日志条数达到阈值时由存储层合并回记录文件（compaction），日志重置为一条合并标记
+- 多个进程或节点共享存储时，追加以读取日志时的版本标记为条件（append_delta_if），
+  日志在读取之后被其它写入方追加或重置时追加失败，调用方重新读取后重试
+
+合并后日志不删除而是重置为标记：日志一旦删除，"读取时不存在"的条件在其它写入方
+追加、合并、删除之后会再次成立，基于旧记录计算的增量就会被当作最新的写入
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.json_codec import dumps, loads
+from utils.metrics import registry
+from utils.storage import StorageBackend
+
+DELTA_LOG_SUFFIX = ".deltas.jsonl"
+
+delta_log_appends = registry.counter("delta_log_appends", "增量日志追加次数")
+delta_log_bytes = registry.counter("delta_log_bytes", "增量日志追加的字节数")
+
+
+def append_delta(backend: StorageBackend, key: str, entry: Dict[str, Any]) -> int:
+    """
+    追加一条增量，返回写入的字节数
+    """
+    data = dumps(entry) + b"\n"
+    backend.append(key, data)
+    delta_log_appends.inc()
+    delta_log_bytes.inc(len(data))
+    return len(data)
+
+
+def append_delta_if(backend: StorageBackend, key: str, entry: Dict[str, Any], token: Optional[str]) -> int:
+    """
+    仅当日志的版本标记仍为 token（None 表示日志不存在）时追加，返回写入的字节数
+
+    :raises PreconditionFailed: 日志在读取之后已被修改
+    """
+    data = dumps(entry) + b"\n"
+    backend.append_if(key, data, token)
+    delta_log_appends.inc()
+    delta_log_bytes.inc(len(data))
+    return len(data)
+
+
+def compacted_marker(version: int) -> bytes:
+    """合并标记：记录已包含 version 及之前的全部增量；重放时跳过（没有 patch 字段）"""
+    return dumps({"version": version, "compacted_at": datetime.now().isoformat()}) + b"\n"
+
+
+def has_patches(content: Any) -> bool:
+    """日志中是否有需要重放的增量（不含合并标记）"""
+    return any("patch" in entry for entry in parse_deltas(content))
+
+
+def read_deltas(backend: StorageBackend, key: str) -> List[Dict[str, Any]]:
+    """读取全部增量，日志不存在时返回空列表；遇到不完整的末行时停止"""
+    return parse_deltas(backend.get(key))
+
+
+def parse_deltas(content: Any) -> List[Dict[str, Any]]:
+    """解析日志内容（None 表示日志不存在）"""
+    if not content:
+        return []
+    entries = []
+    for line in content.split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            entries.append(loads(line))
+        except ValueError:
+            break
+    return entries
+
+
+def remove_delta_log(backend: StorageBackend, key: str) -> bool:
+    return backend.delete(key)
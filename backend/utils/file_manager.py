@@ -0,0 +1,678 @@
+"""
+文件管理工具：统一解析任务产物在存储中的位置，并提供异步的 JSON 文档存储
+
+所有读写都经过 utils/storage 的存储后端（本地目录、SQLite、S3 兼容存储），由环境变量 STORAGE_URL 选择
+"""
+import os
+import re
+import time
+import asyncio
+import contextvars
+import posixpath
+from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from utils.json_codec import dumps, loads
+from utils.storage import PreconditionFailed, StorageBackend, join_key, storage
+from utils.delta_log import (
+    DELTA_LOG_SUFFIX, append_delta_if, compacted_marker, has_patches, parse_deltas, read_deltas, remove_delta_log
+)
+from utils.json_patch import PatchError, apply_patch
+from utils.record_cache import CachedRecord, RecordCache
+from utils import graph_codec
+from utils.graph_index import GraphIndex, graph_index_cache
+from utils.metrics import registry
+from utils.tracing import current_span, span
+
+T = TypeVar("T")
+
+# 网页生成结果在存储中的前缀：旧任务的产物直接写在此前缀下，新任务写入其下的 <task_id>/
+RESULTS_PREFIX = "results/project"
+
+# 允许从共享目录回退读取的子目录（旧任务的页面与公共素材）
+SHARED_SUBDIRS = ("public", "src")
+
+
+def _check_task_id(task_id: str) -> str:
+    if not task_id or task_id in (".", "..") or "/" in task_id or "\\" in task_id:
+        raise ValueError(f"非法的任务ID: {task_id}")
+    return task_id
+
+
+def task_key(task_id: str, relative_path: str = "") -> str:
+    """
+    任务产物在存储中的键
+
+    :param task_id: 任务ID
+    :param relative_path: 相对任务目录的文件路径，如 public/index.html
+    :return: results/project/<task_id>[/<relative_path>]
+    """
+    return join_key(RESULTS_PREFIX, _check_task_id(task_id), relative_path)
+
+
+def normalize_relative_key(relative_path: str) -> Optional[str]:
+    """
+    规范化相对路径，拒绝越出基础目录的路径（如 ../../etc/passwd）
+
+    :return: 以 / 分隔的相对键，越界或为空时返回 None
+    """
+    normalized = posixpath.normpath("/" + relative_path.replace("\\", "/")).lstrip("/")
+    if not normalized or normalized == "." or ".." in normalized.split("/"):
+        return None
+    return normalized
+
+
+def resolve_task_key(task_id: str, relative_path: str) -> Optional[str]:
+    """
+    解析任务产物文件：优先查找任务目录，找不到时回退到共享目录（兼容旧任务与公共素材）
+
+    阻塞调用（访问存储后端），应在 I/O 线程池中执行
+    :param task_id: 任务ID
+    :param relative_path: 相对任务目录的文件路径，如 public/index.html、src/1-1.jpeg
+    :return: 文件在存储中的键，不存在时返回 None
+    """
+    relative_key = normalize_relative_key(relative_path)
+    candidate = task_key(task_id, relative_key) if relative_key else None
+    if candidate is None:
+        return None
+    if storage.exists(candidate):
+        return candidate
+
+    if relative_key.split("/", 1)[0] in SHARED_SUBDIRS:
+        candidate = join_key(RESULTS_PREFIX, relative_key)
+        if storage.exists(candidate):
+            return candidate
+    return None
+
+
+def resolve_task_public_prefix(task_id: str) -> Optional[str]:
+    """获取任务 public 目录在存储中的前缀，旧任务回退到共享的 public 目录"""
+    for base in (task_key(task_id), RESULTS_PREFIX):
+        prefix = join_key(base, "public")
+        if storage.list(prefix, recursive=True):
+            return prefix
+    return None
+
+
+# ---------------------------------------------------------------------------
+# 异步文档存储：磁盘操作统一放到有界 I/O 线程池中执行，避免阻塞事件循环
+# ---------------------------------------------------------------------------
+
+# I/O 线程池大小，可通过环境变量 IO_MAX_WORKERS 调整
+IO_MAX_WORKERS = int(os.getenv("IO_MAX_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+
+_io_executor = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="doc-io")
+
+io_queue_seconds = registry.histogram("io_queue_seconds", "磁盘操作在 I/O 线程池中的排队时间（秒）")
+io_run_seconds = registry.histogram("io_run_seconds", "磁盘操作的执行时间（秒）")
+io_pending = registry.gauge("io_pending", "已提交但尚未完成的磁盘操作数")
+
+# 详情记录缓存容量（字节，每个存储单独计算），设为 0 关闭缓存
+RECORD_CACHE_MAX_BYTES = int(os.getenv("RECORD_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 增量日志累计多少条后合并回记录文件
+DELTA_COMPACT_THRESHOLD = int(os.getenv("RECORD_DELTA_COMPACT_THRESHOLD", "32"))
+
+# 记录ID只允许字母、数字、下划线和连字符，防止路径穿越
+_DOC_ID_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+async def run_io(op: str, func: Callable[..., T], *args) -> T:
+    """
+    在 I/O 线程池中执行阻塞的磁盘操作，并记录排队时间与执行时间
+
+    :param op: 操作名称（用作指标标签）
+    :param func: 阻塞函数
+    """
+    loop = asyncio.get_running_loop()
+    submitted_at = time.perf_counter()
+
+    def run():
+        started_at = time.perf_counter()
+        io_queue_seconds.observe(started_at - submitted_at, op=op)
+        try:
+            # 在链路中时记录为子 span（如保存任务记录时的 JSON 序列化与写入）
+            if current_span() is None:
+                return func(*args)
+            with span(f"io.{op}"):
+                return func(*args)
+        finally:
+            io_run_seconds.observe(time.perf_counter() - started_at, op=op)
+
+    # 在调用方的上下文中执行，I/O 线程中的日志同样带有 request_id / task_id
+    context = contextvars.copy_context()
+    io_pending.inc(op=op)
+    try:
+        return await loop.run_in_executor(_io_executor, context.run, run)
+    finally:
+        io_pending.dec(op=op)
+
+
+def is_valid_doc_id(doc_id: str) -> bool:
+    return bool(doc_id) and _DOC_ID_PATTERN.match(doc_id) is not None
+
+
+class VersionConflict(Exception):
+    """PATCH 时客户端持有的版本与当前版本不一致"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"记录已被修改，当前版本为 {current_version}")
+        self.current_version = current_version
+
+
+# 修改记录时不允许变更的字段
+IMMUTABLE_FIELDS = ("id", "created_at")
+
+
+class DocumentStore:
+    """
+    JSON 文档存储：存储后端中 <prefix>/ 下每条记录对应一个 <id>.json 对象
+
+    所有方法均为协程，实际的读写在 I/O 线程池中完成；
+    开启缓存时 load_cached 会复用解析结果和序列化字节，保存/删除时自动失效。
+
+    patch 只把补丁追加到 <id>.deltas.jsonl，读取时在记录之上重放；
+    日志达到 DELTA_COMPACT_THRESHOLD 条时合并回记录。记录的 version 字段为已应用的补丁数
+
+    进程内按记录加锁；版本检查与追加、合并写回都是以读取时的版本标记为条件的写入（见 utils/storage），
+    多个进程或节点共享同一存储时，同一版本上的并发补丁只有一个成功，其余重新读取后按 If-Match 判定冲突
+    """
+
+    def __init__(self, name: str, prefix: str, cache_bytes: int = 0, backend: Optional[StorageBackend] = None):
+        self.name = name
+        self.prefix = prefix.strip("/")
+        self.backend = backend or storage
+        self.cache = RecordCache(name, cache_bytes) if cache_bytes > 0 else None
+        # 按记录ID分片的锁：同一记录的补丁与保存串行，不同记录互不阻塞（不影响组提交）
+        self._locks = [threading.RLock() for _ in range(64)]
+
+    # 可识别的扩展名，保存时使用第一个
+    extensions = (".json",)
+
+    def key(self, doc_id: str) -> str:
+        if not is_valid_doc_id(doc_id):
+            raise ValueError(f"非法的记录ID: {doc_id}")
+        return f"{self.prefix}/{doc_id}{self.extensions[0]}"
+
+    def _candidate_keys(self, doc_id: str) -> List[str]:
+        if not is_valid_doc_id(doc_id):
+            raise ValueError(f"非法的记录ID: {doc_id}")
+        return [f"{self.prefix}/{doc_id}{extension}" for extension in self.extensions]
+
+    def _delta_key(self, doc_id: str) -> str:
+        return f"{self.prefix}/{doc_id}{DELTA_LOG_SUFFIX}"
+
+    def _get(self, key: str, blobs: Optional[Dict[str, bytes]] = None) -> Optional[bytes]:
+        """读取对象内容；blobs 为批量预读的结果时直接从中获取"""
+        if blobs is not None:
+            return blobs.get(key)
+        return self.backend.get(key)
+
+    def _find(self, doc_id: str, blobs: Optional[Dict[str, bytes]] = None) -> Optional[str]:
+        """查找记录实际所在的键（按扩展名顺序）"""
+        for key in self._candidate_keys(doc_id):
+            if (key in blobs) if blobs is not None else self.backend.exists(key):
+                return key
+        return None
+
+    def _decode(self, key: str, data: bytes) -> Any:
+        return loads(data)
+
+    def _encode(self, key: str, record: Any) -> bytes:
+        return dumps(record)
+
+    def _write(self, doc_id: str, record: Any) -> None:
+        # 本地后端为临时文件 + fsync + rename，崩溃时不会留下截断的 JSON；并发写入由组提交合并刷盘
+        key = self.key(doc_id)
+        self.backend.put(key, self._encode(key, record))
+
+    def _lock_for(self, doc_id: str) -> threading.RLock:
+        return self._locks[hash(doc_id) % len(self._locks)]
+
+    @staticmethod
+    def _version(record: Any) -> int:
+        return record.get("version", 0) if isinstance(record, dict) else 0
+
+    def _save(self, doc_id: str, record: Any) -> None:
+        with self._lock_for(doc_id):
+            self._write(doc_id, record)
+            # 完整保存后增量日志已无意义；先写记录再重置日志，中途崩溃时按 version 跳过已包含的增量。
+            # 重置期间其它写入方追加的增量基于被覆盖的记录，同样丢弃
+            delta_key = self._delta_key(doc_id)
+            while True:
+                content, token = self.backend.get_versioned(delta_key)
+                if content is None:
+                    return
+                try:
+                    self.backend.put_if(delta_key, compacted_marker(self._version(record)), token)
+                    return
+                except PreconditionFailed:
+                    continue
+
+    def _read_versioned(self, doc_id: str) -> Optional[Tuple[str, str, Any, int, Optional[str]]]:
+        """
+        读取记录并重放增量日志，返回 (键, 记录的版本标记, 记录, 重放的增量条数, 日志的版本标记)，记录不存在时返回 None
+
+        先读日志再读记录：合并与保存都是先写记录再重置日志，以日志的版本标记为条件追加成功时，
+        读到的记录已包含日志之前的全部修改（日志一旦创建就不会再回到不存在，删除记录时除外）
+        """
+        while True:
+            key = self._find(doc_id)
+            if key is None:
+                return None
+            content, delta_token = self.backend.get_versioned(self._delta_key(doc_id))
+            data, token = self.backend.get_versioned(key)
+            if data is None:
+                # 记录在查找之后被删除或切换了格式，重新查找
+                continue
+            record, pending = self._materialize(doc_id, key, data, parse_deltas(content))
+            return key, token, record, pending, delta_token
+
+    def _write_back(self, doc_id: str, key: str, token: str, record: Any, delta_token: Optional[str]) -> bool:
+        """
+        以读取时的版本标记为条件写回记录并重置日志；记录已被其它写入方替换时不写入并返回 False
+
+        重置日志失败说明读取之后又有新的增量，其版本高于写回的记录，读取时照常重放
+        """
+        try:
+            self.backend.put_if(key, self._encode(key, record), token)
+        except PreconditionFailed:
+            return False
+        if delta_token is not None:
+            try:
+                self.backend.put_if(self._delta_key(doc_id), compacted_marker(self._version(record)), delta_token)
+            except PreconditionFailed:
+                pass
+        return True
+
+    def _save_if_version(self, doc_id: str, record: Any, expected_version: int) -> bool:
+        with self._lock_for(doc_id):
+            current = self._read_versioned(doc_id)
+            if current is None:
+                return False
+            key, token, materialized, _, delta_token = current
+            if self._version(materialized) != expected_version:
+                return False
+            return self._write_back(doc_id, key, token, record, delta_token)
+
+    def _materialize(self, doc_id: str, key: str, data: Optional[bytes] = None,
+                     deltas: Optional[List[dict]] = None) -> Tuple[Any, int]:
+        """
+        读取记录并重放增量日志，返回 (记录, 重放的增量条数)
+
+        :param data: 已读取的记录内容，None 时从存储读取
+        :param deltas: 已读取的增量，None 时从存储读取
+        """
+        if data is None:
+            data = self.backend.get(key)
+            if data is None:
+                raise FileNotFoundError(key)
+        record = self._decode(key, data)
+        if deltas is None:
+            deltas = read_deltas(self.backend, self._delta_key(doc_id))
+        base_version = record.get("version", 0) if isinstance(record, dict) else 0
+        applied = 0
+        for delta in deltas:
+            # 合并标记没有 patch 字段
+            if delta["version"] <= base_version or "patch" not in delta:
+                continue
+            record = apply_patch(record, delta["kind"], delta["patch"])
+            record["version"] = delta["version"]
+            record["updated_at"] = delta["updated_at"]
+            applied += 1
+        return record, applied
+
+    def _load(self, doc_id: str, blobs: Optional[Dict[str, bytes]] = None) -> Optional[Any]:
+        key = self._find(doc_id, blobs)
+        if key is None:
+            return None
+        try:
+            if blobs is not None:
+                return self._materialize(doc_id, key, blobs[key], parse_deltas(blobs.get(self._delta_key(doc_id))))[0]
+            return self._materialize(doc_id, key)[0]
+        except FileNotFoundError:
+            return None
+
+    def _load_cached(self, doc_id: str) -> Optional[CachedRecord]:
+        key, info = None, None
+        for candidate in self._candidate_keys(doc_id):
+            info = self.backend.stat(candidate)
+            if info is not None:
+                key = candidate
+                break
+        if key is None:
+            if self.cache is not None:
+                self.cache.invalidate(doc_id)
+            return None
+
+        # 缓存版本同时反映记录与增量日志（日志只追加，大小单调增长）
+        version, size = info.version, info.size
+        delta_info = self.backend.stat(self._delta_key(doc_id))
+        if delta_info is not None:
+            version, size = max(version, delta_info.version), size + delta_info.size
+
+        if self.cache is not None:
+            entry = self.cache.get(doc_id, version, size)
+            if entry is not None:
+                return entry
+
+        try:
+            record = self._materialize(doc_id, key)[0]
+        except FileNotFoundError:
+            return None
+        entry = CachedRecord(record, dumps(record), version, size)
+        if self.cache is not None:
+            self.cache.put(doc_id, entry)
+        return entry
+
+    def _patch(self, doc_id: str, kind: str, patch: Any, expected_version: Optional[int],
+               validate: Optional[Callable[[Any], None]]) -> Optional[Any]:
+        with self._lock_for(doc_id):
+            while True:
+                current = self._read_versioned(doc_id)
+                if current is None:
+                    return None
+                record, pending, delta_token = current[2], current[3], current[4]
+                if not isinstance(record, dict):
+                    raise PatchError("记录格式不支持修改")
+                version = record.get("version", 0)
+                if expected_version is not None and expected_version != version:
+                    raise VersionConflict(version)
+
+                patched = apply_patch(record, kind, patch)
+                if not isinstance(patched, dict) or any(patched.get(f) != record.get(f) for f in IMMUTABLE_FIELDS):
+                    raise PatchError(f"不允许修改字段: {', '.join(IMMUTABLE_FIELDS)}")
+                if validate is not None:
+                    validate(patched)
+                delta = {
+                    "version": version + 1,
+                    "kind": kind,
+                    "patch": patch,
+                    "updated_at": datetime.now().isoformat()
+                }
+                patched["version"] = delta["version"]
+                patched["updated_at"] = delta["updated_at"]
+
+                # 其它进程或节点在读取之后修改了日志：重新读取，携带 If-Match 时通常以版本冲突结束
+                try:
+                    append_delta_if(self.backend, self._delta_key(doc_id), delta, delta_token)
+                except PreconditionFailed:
+                    continue
+                if pending + 1 >= DELTA_COMPACT_THRESHOLD:
+                    self._compact_locked(doc_id)
+                return patched
+
+    def _compact_locked(self, doc_id: str) -> bool:
+        current = self._read_versioned(doc_id)
+        if current is None:
+            # 记录已删除，遗留的日志直接删除
+            return remove_delta_log(self.backend, self._delta_key(doc_id))
+        key, token, record, pending, delta_token = current
+        if pending == 0:
+            return False
+        return self._write_back(doc_id, key, token, record, delta_token)
+
+    def _compact(self, doc_id: str) -> bool:
+        """把增量日志合并回记录，没有待重放的增量时返回 False"""
+        with self._lock_for(doc_id):
+            return self._compact_locked(doc_id)
+
+    def _cleanup(self) -> int:
+        removed = self.backend.cleanup(self.prefix)
+        for filename in self.backend.list(self.prefix):
+            if filename.endswith(DELTA_LOG_SUFFIX):
+                doc_id = filename[:-len(DELTA_LOG_SUFFIX)]
+                if is_valid_doc_id(doc_id):
+                    self._compact(doc_id)
+        return removed
+
+    def _delete(self, doc_id: str) -> bool:
+        remove_delta_log(self.backend, self._delta_key(doc_id))
+        deleted = False
+        for key in self._candidate_keys(doc_id):
+            deleted = self.backend.delete(key) or deleted
+        return deleted
+
+    def _list_ids(self) -> List[str]:
+        doc_ids = {}
+        for filename in self.backend.list(self.prefix):
+            for extension in self.extensions:
+                if filename.endswith(extension):
+                    doc_id = filename[:-len(extension)]
+                    if is_valid_doc_id(doc_id):
+                        doc_ids[doc_id] = None
+                    break
+        return list(doc_ids)
+
+    def _load_many(self, doc_ids: List[str], loader: Optional[Callable] = None) -> List[Tuple[str, Any]]:
+        """
+        读取一批记录；非本地后端先用一次批量读取取回整批记录及其增量日志，避免逐条往返
+
+        :param loader: loader(doc_id, blobs)，blobs 为批量预读结果（本地后端为 None）
+        """
+        loader = loader or self._load
+        blobs = None
+        if self.backend.local_path(self.prefix) is None:
+            keys = [key for doc_id in doc_ids for key in self._candidate_keys(doc_id)]
+            keys += [self._delta_key(doc_id) for doc_id in doc_ids]
+            blobs = self.backend.get_many(keys)
+        items = []
+        for doc_id in doc_ids:
+            try:
+                record = loader(doc_id, blobs)
+            except Exception:
+                # 损坏或格式不正确的记录直接跳过
+                continue
+            if record is not None:
+                items.append((doc_id, record))
+        return items
+
+    async def save(self, doc_id: str, record: Any) -> None:
+        """保存记录（覆盖同ID的旧记录）"""
+        try:
+            await run_io(f"{self.name}.save", self._save, doc_id, record)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(doc_id)
+
+    async def save_if_version(self, doc_id: str, record: Any, expected_version: int) -> bool:
+        """
+        仅当记录当前版本仍为 expected_version 时整体保存（用于补写派生字段，如图谱布局），
+        记录已被修改或已删除时不写入并返回 False，避免覆盖并发的补丁
+        """
+        if not is_valid_doc_id(doc_id):
+            return False
+        try:
+            return await run_io(f"{self.name}.save", self._save_if_version, doc_id, record, expected_version)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(doc_id)
+
+    async def load(self, doc_id: str) -> Optional[Any]:
+        """读取记录，不存在或ID非法时返回 None"""
+        if not is_valid_doc_id(doc_id):
+            return None
+        return await run_io(f"{self.name}.load", self._load, doc_id)
+
+    async def load_cached(self, doc_id: str) -> Optional[CachedRecord]:
+        """
+        读取记录（经过缓存），返回包含解析结果与序列化字节的缓存项，不存在时返回 None
+        """
+        if not is_valid_doc_id(doc_id):
+            return None
+        return await run_io(f"{self.name}.load_cached", self._load_cached, doc_id)
+
+    async def exists(self, doc_id: str) -> bool:
+        if not is_valid_doc_id(doc_id):
+            return False
+        return await run_io(f"{self.name}.exists", self._find, doc_id) is not None
+
+    async def delete(self, doc_id: str) -> bool:
+        """删除记录，返回是否确实删除了记录"""
+        if not is_valid_doc_id(doc_id):
+            return False
+        try:
+            return await run_io(f"{self.name}.delete", self._delete, doc_id)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(doc_id)
+
+    async def patch(self, doc_id: str, kind: str, patch: Any, expected_version: Optional[int] = None,
+                    validate: Optional[Callable[[Any], None]] = None) -> Optional[Any]:
+        """
+        以补丁方式修改记录，只追加增量日志；返回修改后的记录，记录不存在时返回 None
+
+        :param kind: json-patch 或 merge-patch
+        :param expected_version: 客户端持有的版本（If-Match），不一致时抛出 VersionConflict
+        :param validate: 校验修改后的记录，不合法时抛出 PatchError
+        :raises PatchError: 补丁无法应用、修改了不可变字段或校验不通过
+        """
+        if not is_valid_doc_id(doc_id):
+            return None
+        try:
+            return await run_io(f"{self.name}.patch", self._patch, doc_id, kind, patch, expected_version, validate)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(doc_id)
+
+    async def cleanup(self) -> int:
+        """清理崩溃遗留的临时文件，并合并遗留的增量日志"""
+        return await run_io(f"{self.name}.cleanup", self._cleanup)
+
+    async def list_ids(self) -> List[str]:
+        return await run_io(f"{self.name}.list", self._list_ids)
+
+    async def items(self, batch_size: int = 64, loader: Optional[Callable] = None) -> List[Tuple[str, Any]]:
+        """
+        读取全部记录，返回 (记录ID, 记录) 列表，跳过无法解析的记录
+
+        按批提交到线程池，多个批次可并行读取
+        """
+        doc_ids = await self.list_ids()
+        batches = [doc_ids[i:i + batch_size] for i in range(0, len(doc_ids), batch_size)]
+        results = await asyncio.gather(*(
+            run_io(f"{self.name}.load_many", self._load_many, batch, loader) for batch in batches
+        ))
+        return [item for batch in results for item in batch]
+
+    async def list(self) -> List[Any]:
+        """读取全部记录"""
+        return [record for _, record in await self.items()]
+
+
+class KnowledgeGraphStore(DocumentStore):
+    """
+    知识点图谱存储：按配置以 JSON 或紧凑二进制格式（.kgb，见 utils/graph_codec）保存，
+    读取时两种格式都能识别；.kgb 格式下列表与单节点查询不需要解码整个图谱
+    （本地后端直接 mmap 文件，只读取所需分区）
+    """
+    extensions = (graph_codec.FILE_EXTENSION, ".json")
+
+    def __init__(self, name: str, prefix: str, cache_bytes: int = 0,
+                 storage_format: str = "json", codec: Optional[str] = None,
+                 backend: Optional[StorageBackend] = None):
+        super().__init__(name, prefix, cache_bytes, backend)
+        if storage_format not in ("json", "compact"):
+            raise ValueError(f"未知的图谱存储格式: {storage_format}")
+        self.storage_format = storage_format
+        self.codec = graph_codec.CODEC_NAMES[codec] if codec else graph_codec.default_codec()
+
+    def _decode(self, key: str, data: bytes) -> Any:
+        if key.endswith(graph_codec.FILE_EXTENSION):
+            return graph_codec.read_record(data)
+        return loads(data)
+
+    def _encode(self, key: str, record: Any) -> bytes:
+        # 按键的扩展名编码：合并写回时沿用记录现有的格式，切换格式只在整体保存时进行
+        if key.endswith(graph_codec.FILE_EXTENSION):
+            return graph_codec.encode_record(record, self.codec)
+        return dumps(record)
+
+    def _write(self, doc_id: str, record: Any) -> None:
+        base_key = f"{self.prefix}/{doc_id}"
+        if self.storage_format == "compact":
+            target, stale = base_key + graph_codec.FILE_EXTENSION, base_key + ".json"
+        else:
+            target, stale = base_key + ".json", base_key + graph_codec.FILE_EXTENSION
+        self.backend.put(target, self._encode(target, record))
+        # 切换格式后删除旧格式的文件，避免读取到过期版本
+        self.backend.delete(stale)
+
+    def _compact_source(self, key: str, blobs: Optional[Dict[str, bytes]]) -> Any:
+        """.kgb 的读取来源：本地后端为文件路径（mmap 按需读取），其它后端为对象内容"""
+        if blobs is None:
+            path = self.backend.local_path(key)
+            if path is not None:
+                return path
+        return self._get(key, blobs)
+
+    def _load_metadata(self, doc_id: str, blobs: Optional[Dict[str, bytes]] = None) -> Optional[dict]:
+        key = self._find(doc_id, blobs)
+        if key is None:
+            return None
+        delta_data = self._get(self._delta_key(doc_id), blobs)
+        if key.endswith(graph_codec.FILE_EXTENSION) and not has_patches(delta_data):
+            source = self._compact_source(key, blobs)
+            return graph_codec.read_metadata(source) if source is not None else None
+        data = self._get(key, blobs)
+        if data is None:
+            return None
+        record = self._materialize(doc_id, key, data, parse_deltas(delta_data))[0]
+        return {k: v for k, v in record.items() if k != "graph"} if isinstance(record, dict) else None
+
+    def _load_node(self, doc_id: str, node_id: str) -> Optional[dict]:
+        key = self._find(doc_id)
+        if key is None:
+            return None
+        if key.endswith(graph_codec.FILE_EXTENSION) and not has_patches(self.backend.get(self._delta_key(doc_id))):
+            source = self._compact_source(key, None)
+            return graph_codec.read_node(source, node_id) if source is not None else None
+        entry = self._load_cached(doc_id)
+        graph = entry.record.get("graph") if entry and isinstance(entry.record, dict) else None
+        for node in (graph or {}).get("nodes", []) if isinstance(graph, dict) else []:
+            if isinstance(node, dict) and isinstance(node.get("data"), dict) and node["data"].get("id") == node_id:
+                return node
+        return None
+
+    async def list_metadata(self) -> List[dict]:
+        """读取全部图谱的元数据（不含 graph 字段）"""
+        return [meta for _, meta in await self.items(loader=self._load_metadata)]
+
+    async def load_graph_index(self, doc_id: str) -> Optional[GraphIndex]:
+        """
+        获取图谱的查询索引：按记录版本缓存，首次访问或图谱更新后在线程池中重建
+        """
+        entry = await self.load_cached(doc_id)
+        if entry is None or not isinstance(entry.record, dict):
+            graph_index_cache.invalidate(doc_id)
+            return None
+        version = (entry.mtime_ns, entry.size)
+        index = graph_index_cache.get(doc_id, version)
+        if index is None:
+            index = await run_io(f"{self.name}.graph_index", GraphIndex, entry.record.get("graph"))
+            graph_index_cache.put(doc_id, version, index)
+        return index
+
+    async def load_node(self, doc_id: str, node_id: str) -> Optional[dict]:
+        """读取图谱中的单个节点，图谱或节点不存在时返回 None"""
+        if not is_valid_doc_id(doc_id):
+            return None
+        return await run_io(f"{self.name}.load_node", self._load_node, doc_id, node_id)
+
+
+# 各类记录的存储（键前缀相对存储根目录，本地后端即 data/ 下的子目录）
+prd_store = DocumentStore("prd", "prd", cache_bytes=RECORD_CACHE_MAX_BYTES)
+knowledge_store = KnowledgeGraphStore(
+    "knowledge",
+    "knowledge",
+    cache_bytes=RECORD_CACHE_MAX_BYTES,
+    storage_format=os.getenv("KNOWLEDGE_STORAGE_FORMAT", "json"),
+    codec=os.getenv("KNOWLEDGE_COMPACT_CODEC") or None
+)
+task_store = DocumentStore("task", RESULTS_PREFIX)
+# 上传页面的分析结果（PRD、知识点图谱），供近似重复的上传直接复用
+analysis_store = DocumentStore("analysis", "analysis")
+
+ALL_STORES = (prd_store, knowledge_store, task_store, analysis_store)
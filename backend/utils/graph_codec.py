@@ -0,0 +1,421 @@
+"""
+知识点图谱紧凑存储格式（.kgb）
+
+文件布局：
+    头部     MAGIC(4) | 版本 u16 | 压缩方式 u16 | 分区数 u32
+    分区表   每个分区：名称长度 u16 | 名称 | 偏移 u64 | 存储长度 u64 | 原始长度 u64
+    分区数据 各分区独立压缩（zstd / zlib / 不压缩）
+
+分区：
+    meta       记录的非图谱字段与键顺序（JSON）
+    strings    字符串池：所有键名与取值去重后只存一份
+    list:<键>  图谱中的 nodes / edges 等数组，按列存储（u32 数组，值为字符串池下标）
+
+读取时通过 mmap 映射文件，按需解压分区：读取元数据只解压 meta，
+读取单个节点只解压 strings 与对应数组分区，不会解码整个文件。
+解码结果与原 JSON 结构（含键顺序）完全一致。
+"""
+import sys
+import json
+import mmap
+import zlib
+import struct
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+MAGIC = b"KGB1"
+VERSION = 1
+FILE_EXTENSION = ".kgb"
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+# u32 数组中表示“缺失”的取值
+MISSING = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<4sHHI")
+_SECTION_ENTRY = struct.Struct("<QQQ")
+
+# 字符串池中的取值类型前缀：s = 字符串原文，j = 其他类型的 JSON 文本
+_TAG_STR = b"s"
+_TAG_JSON = b"j"
+
+
+def default_codec() -> int:
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 6)
+    return data
+
+
+def _decompress(data, codec: int, raw_len: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("该图谱文件使用 zstd 压缩，需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=raw_len)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def _u32_array(values) -> bytes:
+    arr = array("I", values)
+    if arr.itemsize != 4:  # pragma: no cover - 仅在 unsigned int 非 4 字节的平台上出现
+        arr = array("L", values)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _as_u32(data) -> "memoryview":
+    """将小端 u32 字节视为数组（小端平台上零拷贝）"""
+    if sys.byteorder == "little":
+        return memoryview(data).cast("I")
+    arr = array("I")
+    arr.frombytes(bytes(data))
+    arr.byteswap()
+    return memoryview(arr)
+
+
+class _StringPool:
+    """编码时使用：字符串与 JSON 取值去重"""
+
+    def __init__(self):
+        self.index: Dict[bytes, int] = {}
+        self.items: List[bytes] = []
+
+    def add_token(self, token: bytes) -> int:
+        position = self.index.get(token)
+        if position is None:
+            position = len(self.items)
+            self.index[token] = position
+            self.items.append(token)
+        return position
+
+    def add_value(self, value: Any) -> int:
+        if isinstance(value, str):
+            return self.add_token(_TAG_STR + value.encode("utf-8"))
+        return self.add_token(_TAG_JSON + json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def to_bytes(self) -> bytes:
+        offsets = [0]
+        for item in self.items:
+            offsets.append(offsets[-1] + len(item))
+        return _u32_array([len(self.items)] + offsets) + b"".join(self.items)
+
+
+def _is_columnar_element(element: Any) -> bool:
+    return isinstance(element, dict) and len(element) == 1 and isinstance(element.get("data"), dict)
+
+
+def _encode_list(elements: List[Any], pool: _StringPool) -> bytes:
+    """
+    将 [{"data": {...}}, ...] 数组按列编码；不符合该形状的元素整体存为 JSON
+    """
+    n = len(elements)
+    columns: Dict[str, int] = {}
+    shapes: Dict[Tuple[int, ...], int] = {}
+    shape_of = [MISSING] * n
+    raw = [MISSING] * n
+    cells: List[Dict[int, int]] = []
+
+    for i, element in enumerate(elements):
+        if not _is_columnar_element(element):
+            raw[i] = pool.add_value(element)
+            cells.append({})
+            continue
+        row = {}
+        shape = []
+        for key, value in element["data"].items():
+            column = columns.setdefault(key, len(columns))
+            shape.append(column)
+            row[column] = pool.add_value(value)
+        shape_of[i] = shapes.setdefault(tuple(shape), len(shapes))
+        cells.append(row)
+
+    values = [n, len(columns)]
+    values.extend(pool.add_token(_TAG_STR + key.encode("utf-8")) for key in columns)
+    values.append(len(shapes))
+    for shape in shapes:
+        values.append(len(shape))
+        values.extend(shape)
+    values.extend(shape_of)
+    for column in range(len(columns)):
+        values.extend(row.get(column, MISSING) for row in cells)
+    values.extend(raw)
+    return _u32_array(values)
+
+
+def encode_record(record: dict, codec: Optional[int] = None) -> bytes:
+    """
+    将知识点图谱记录（{"id", "name", "graph", "created_at", ...}）编码为 .kgb 字节
+    """
+    codec = default_codec() if codec is None else codec
+    graph = record.get("graph")
+    pool = _StringPool()
+    sections: List[Tuple[str, bytes]] = []
+
+    meta: Dict[str, Any] = {"record_keys": list(record.keys())}
+    meta["fields"] = {k: v for k, v in record.items() if k != "graph"}
+    if isinstance(graph, dict):
+        meta["graph_keys"] = list(graph.keys())
+        meta["graph_fields"] = {}
+        for key, value in graph.items():
+            if isinstance(value, list):
+                sections.append((f"list:{key}", _encode_list(value, pool)))
+            else:
+                meta["graph_fields"][key] = value
+    elif "graph" in record:
+        meta["graph_value"] = graph
+
+    all_sections = [("meta", json.dumps(meta, ensure_ascii=False).encode("utf-8"))]
+    all_sections.append(("strings", pool.to_bytes()))
+    all_sections.extend(sections)
+
+    table = b""
+    header_size = _HEADER.size + sum(2 + len(name.encode()) + _SECTION_ENTRY.size for name, _ in all_sections)
+    offset = header_size
+    blobs = []
+    for name, raw in all_sections:
+        stored = _compress(raw, codec)
+        encoded_name = name.encode()
+        table += struct.pack("<H", len(encoded_name)) + encoded_name
+        table += _SECTION_ENTRY.pack(offset, len(stored), len(raw))
+        blobs.append(stored)
+        offset += len(stored)
+
+    return _HEADER.pack(MAGIC, VERSION, codec, len(all_sections)) + table + b"".join(blobs)
+
+
+class _ListSection:
+    """按列存储的数组分区，元素按需解码"""
+
+    def __init__(self, data: memoryview, graph_file: "LazyGraphFile"):
+        self.graph_file = graph_file
+        values = _as_u32(data)
+        pos = 0
+        self.n = values[pos]
+        n_columns = values[pos + 1]
+        pos += 2
+        self.column_keys = [graph_file.string(values[pos + c]) for c in range(n_columns)]
+        pos += n_columns
+        n_shapes = values[pos]
+        pos += 1
+        self.shapes = []
+        for _ in range(n_shapes):
+            k = values[pos]
+            self.shapes.append(tuple(values[pos + 1:pos + 1 + k]))
+            pos += 1 + k
+        self.shape_of = values[pos:pos + self.n]
+        pos += self.n
+        self.columns = [values[pos + c * self.n:pos + (c + 1) * self.n] for c in range(n_columns)]
+        pos += n_columns * self.n
+        self.raw = values[pos:pos + self.n]
+
+    def element(self, i: int) -> Any:
+        shape_index = self.shape_of[i]
+        if shape_index == MISSING:
+            return self.graph_file.value(self.raw[i])
+        value = self.graph_file.value
+        data = {self.column_keys[c]: value(self.columns[c][i]) for c in self.shapes[shape_index]}
+        return {"data": data}
+
+    def elements(self) -> List[Any]:
+        return [self.element(i) for i in range(self.n)]
+
+    def find_index(self, key: str, expected: str) -> Optional[int]:
+        """按 data 中某个字符串字段查找元素下标（比较字符串池下标，不解码其他取值）"""
+        if key not in self.column_keys:
+            return None
+        target = self.graph_file.find_string(_TAG_STR + expected.encode("utf-8"))
+        if target is None:
+            return None
+        column = self.columns[self.column_keys.index(key)]
+        for i in range(self.n):
+            if column[i] == target:
+                return i
+        return None
+
+
+class LazyGraphFile:
+    """
+    以 mmap 方式打开 .kgb 文件（或直接使用已读入内存的字节），按需解压分区
+
+    用法：
+        with LazyGraphFile(path) as graph_file:
+            graph_file.metadata()       # 只解压 meta
+            graph_file.node("1_1")      # 解压 strings 与 list:nodes
+            graph_file.to_record()      # 完整还原 JSON 结构
+    """
+
+    def __init__(self, source: Union[str, bytes]):
+        self._file = None
+        self._mmap = None
+        self._decoded: Dict[str, Any] = {}
+        self._meta: Optional[dict] = None
+        self._string_offsets = None
+        self._string_blob = None
+        self._string_lookup: Optional[Dict[bytes, int]] = None
+        if isinstance(source, str):
+            self._file = open(source, "rb")
+            try:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法 mmap
+                self._file.close()
+                raise ValueError(f"无效的图谱文件: {source}")
+            buffer = self._mmap
+        else:
+            buffer = source
+        name = source if isinstance(source, str) else "<bytes>"
+        self._view = memoryview(buffer)
+        if len(self._view) < _HEADER.size:
+            self.close()
+            raise ValueError(f"无效的图谱文件: {name}")
+        magic, version, self.codec, section_count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"无效的图谱文件: {name}")
+
+        self._sections: Dict[str, Tuple[int, int, int]] = {}
+        pos = _HEADER.size
+        for _ in range(section_count):
+            (name_len,) = struct.unpack_from("<H", self._view, pos)
+            pos += 2
+            name = bytes(self._view[pos:pos + name_len]).decode()
+            pos += name_len
+            self._sections[name] = _SECTION_ENTRY.unpack_from(self._view, pos)
+            pos += _SECTION_ENTRY.size
+
+    def __enter__(self) -> "LazyGraphFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._decoded.clear()
+        self._string_offsets = None
+        self._string_blob = None
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+
+    def _section(self, name: str):
+        offset, stored_len, raw_len = self._sections[name]
+        stored = self._view[offset:offset + stored_len]
+        if self.codec == CODEC_NONE:
+            return stored
+        return _decompress(stored, self.codec, raw_len)
+
+    # ---- 字符串池 ----
+
+    def _load_strings(self) -> None:
+        if self._string_offsets is not None:
+            return
+        data = self._section("strings")
+        count = _as_u32(data[:4])[0]
+        offsets_end = 4 * (count + 2)
+        self._string_offsets = _as_u32(data[4:offsets_end])
+        self._string_blob = memoryview(data)[offsets_end:]
+
+    def _token(self, index: int) -> bytes:
+        self._load_strings()
+        return bytes(self._string_blob[self._string_offsets[index]:self._string_offsets[index + 1]])
+
+    def string(self, index: int) -> str:
+        return self._token(index)[1:].decode("utf-8")
+
+    def value(self, index: int) -> Any:
+        if index == MISSING:
+            return None
+        token = self._token(index)
+        if token[:1] == _TAG_STR:
+            return token[1:].decode("utf-8")
+        return json.loads(token[1:].decode("utf-8"))
+
+    def find_string(self, token: bytes) -> Optional[int]:
+        if self._string_lookup is None:
+            self._load_strings()
+            self._string_lookup = {
+                self._token(i): i for i in range(len(self._string_offsets) - 1)
+            }
+        return self._string_lookup.get(token)
+
+    # ---- 对外接口 ----
+
+    def metadata(self) -> dict:
+        """记录的非图谱字段（id、name、created_at 等），只解压 meta 分区"""
+        if self._meta is None:
+            self._meta = json.loads(bytes(self._section("meta")).decode("utf-8"))
+        return dict(self._meta["fields"])
+
+    def list_section(self, key: str) -> Optional[_ListSection]:
+        name = f"list:{key}"
+        if name not in self._sections:
+            return None
+        if name not in self._decoded:
+            self._decoded[name] = _ListSection(self._section(name), self)
+        return self._decoded[name]
+
+    def node(self, node_id: str) -> Optional[dict]:
+        """按 data.id 读取单个节点"""
+        nodes = self.list_section("nodes")
+        if nodes is None:
+            return None
+        index = nodes.find_index("id", node_id)
+        return None if index is None else nodes.element(index)
+
+    def to_record(self) -> dict:
+        """完整还原为原始 JSON 结构"""
+        self.metadata()
+        meta = self._meta
+        record = {}
+        for key in meta["record_keys"]:
+            if key != "graph":
+                record[key] = meta["fields"][key]
+            elif "graph_keys" in meta:
+                graph = {}
+                for graph_key in meta["graph_keys"]:
+                    if graph_key in meta["graph_fields"]:
+                        graph[graph_key] = meta["graph_fields"][graph_key]
+                    else:
+                        graph[graph_key] = self.list_section(graph_key).elements()
+                record["graph"] = graph
+            else:
+                record["graph"] = meta.get("graph_value")
+        return record
+
+
+def read_record(source: Union[str, bytes]) -> dict:
+    """读取完整的 .kgb 记录（文件路径或文件内容）"""
+    with LazyGraphFile(source) as graph_file:
+        return graph_file.to_record()
+
+
+def read_metadata(source: Union[str, bytes]) -> dict:
+    """只读取 .kgb 记录的元数据"""
+    with LazyGraphFile(source) as graph_file:
+        return graph_file.metadata()
+
+
+def read_node(source: Union[str, bytes], node_id: str) -> Optional[dict]:
+    """只读取 .kgb 记录中的单个节点"""
+    with LazyGraphFile(source) as graph_file:
+        return graph_file.node(node_id)
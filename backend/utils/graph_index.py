@@ -0,0 +1,280 @@
+"""
+知识点图谱查询引擎
+
+把图谱（Cytoscape 元素格式的 dict）转换为紧凑的内存表示：
+- 节点 ID -> 下标的映射，节点 data 按下标存放
+- 出边 / 入边两套 CSR 邻接数组（indptr + indices），每条边带类型编码（edges / dependent_edges）
+
+在此之上提供 k 跳邻域、子图提取、拓扑学习顺序、最短前置路径等查询，
+每个查询只访问实际涉及的边。索引按已保存的图谱惰性构建，并按文件版本缓存
+"""
+import os
+import heapq
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.metrics import registry
+
+# 边的类型，与图谱中的键名一致
+EDGE_TYPES = ("edges", "dependent_edges")
+
+graph_index_cache_hits = registry.counter("graph_index_cache_hits", "图谱查询索引缓存命中次数")
+graph_index_cache_misses = registry.counter("graph_index_cache_misses", "图谱查询索引缓存未命中次数")
+
+
+def _build_csr(sources: np.ndarray, targets: np.ndarray, kinds: np.ndarray,
+               node_count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=indptr[1:])
+    return indptr, targets[order].astype(np.int32), kinds[order]
+
+
+class GraphIndex:
+    """
+    单个知识点图谱的只读查询索引
+    """
+
+    def __init__(self, graph: Any):
+        self.node_ids: List[str] = []
+        self.node_data: List[Dict[str, Any]] = []
+        self.index: Dict[str, int] = {}
+        for node in graph.get("nodes", []) if isinstance(graph, dict) else []:
+            data = node.get("data") if isinstance(node, dict) else None
+            if isinstance(data, dict) and data.get("id") is not None:
+                node_id = str(data["id"])
+                if node_id not in self.index:
+                    self.index[node_id] = len(self.node_ids)
+                    self.node_ids.append(node_id)
+                    self.node_data.append(data)
+
+        sources, targets, kinds = [], [], []
+        seen = set()
+        for kind, key in enumerate(EDGE_TYPES):
+            edges = graph.get(key, []) if isinstance(graph, dict) else []
+            for edge in edges or []:
+                data = edge.get("data") if isinstance(edge, dict) else None
+                if not isinstance(data, dict):
+                    continue
+                source = self.index.get(str(data.get("source")))
+                target = self.index.get(str(data.get("target")))
+                # 忽略悬空边和同类型的重复边
+                if source is None or target is None or (source, target, kind) in seen:
+                    continue
+                seen.add((source, target, kind))
+                sources.append(source)
+                targets.append(target)
+                kinds.append(kind)
+
+        node_count = len(self.node_ids)
+        sources = np.array(sources, dtype=np.int64)
+        targets = np.array(targets, dtype=np.int64)
+        kinds = np.array(kinds, dtype=np.uint8)
+        self.edge_count = len(sources)
+        self.out_indptr, self.out_indices, self.out_kinds = _build_csr(sources, targets, kinds, node_count)
+        self.in_indptr, self.in_indices, self.in_kinds = _build_csr(targets, sources, kinds, node_count)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @staticmethod
+    def kind_mask(edge_types: Optional[Iterable[str]]) -> int:
+        """把边类型名转换为位掩码，None 表示全部类型"""
+        if edge_types is None:
+            return (1 << len(EDGE_TYPES)) - 1
+        mask = 0
+        for edge_type in edge_types:
+            if edge_type not in EDGE_TYPES:
+                raise ValueError(f"未知的边类型: {edge_type}")
+            mask |= 1 << EDGE_TYPES.index(edge_type)
+        return mask
+
+    def node_index(self, node_id: str) -> int:
+        index = self.index.get(node_id)
+        if index is None:
+            raise KeyError(node_id)
+        return index
+
+    def _neighbors(self, node: int, direction: str, mask: int) -> List[int]:
+        result = []
+        if direction in ("out", "both"):
+            start, stop = self.out_indptr[node], self.out_indptr[node + 1]
+            for target, kind in zip(self.out_indices[start:stop].tolist(), self.out_kinds[start:stop].tolist()):
+                if mask >> kind & 1:
+                    result.append(target)
+        if direction in ("in", "both"):
+            start, stop = self.in_indptr[node], self.in_indptr[node + 1]
+            for source, kind in zip(self.in_indices[start:stop].tolist(), self.in_kinds[start:stop].tolist()):
+                if mask >> kind & 1:
+                    result.append(source)
+        return result
+
+    def k_hop(self, node_id: str, k: Optional[int] = 1, direction: str = "both",
+              edge_types: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        k 跳邻域（广度优先），返回 {节点ID: 跳数}，包含起点本身（跳数 0）
+
+        :param k: 最大跳数，None 表示不限（如 direction="in" 时即全部前置知识点）
+        :param direction: out 沿边方向（后续）、in 逆边方向（前置）、both 不区分方向
+        """
+        if direction not in ("out", "in", "both"):
+            raise ValueError(f"未知的方向: {direction}")
+        mask = self.kind_mask(edge_types)
+        start = self.node_index(node_id)
+        distances = {start: 0}
+        frontier = [start]
+        depth = 0
+        while frontier and (k is None or depth < k):
+            depth += 1
+            next_frontier = []
+            for node in frontier:
+                for neighbor in self._neighbors(node, direction, mask):
+                    if neighbor not in distances:
+                        distances[neighbor] = depth
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return {self.node_ids[node]: distance for node, distance in distances.items()}
+
+    def subgraph(self, node_ids: Sequence[str], edge_types: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        提取由指定节点导出的子图（Cytoscape 元素格式），未知节点 ID 会被忽略
+        """
+        mask = self.kind_mask(edge_types)
+        members = []
+        member_set = set()
+        for node_id in node_ids:
+            index = self.index.get(node_id)
+            if index is not None and index not in member_set:
+                member_set.add(index)
+                members.append(index)
+        members.sort()
+
+        result: Dict[str, Any] = {"nodes": [{"data": self.node_data[node]} for node in members]}
+        for key in EDGE_TYPES:
+            result[key] = []
+        for node in members:
+            start, stop = self.out_indptr[node], self.out_indptr[node + 1]
+            for target, kind in zip(self.out_indices[start:stop].tolist(), self.out_kinds[start:stop].tolist()):
+                if mask >> kind & 1 and target in member_set:
+                    result[EDGE_TYPES[kind]].append({
+                        "data": {"source": self.node_ids[node], "target": self.node_ids[target]}
+                    })
+        return result
+
+    def learning_order(self, target: Optional[str] = None,
+                       edge_types: Optional[Iterable[str]] = None) -> Tuple[List[str], bool]:
+        """
+        拓扑排序得到学习顺序：边的起点先于终点，同时可学的节点按图谱中的原始顺序排列
+
+        :param target: 只排列学习该节点所需的前置节点（含自身）
+        :return: (节点ID列表, 是否存在环)；有环时环上的节点按原始顺序追加在末尾
+        """
+        mask = self.kind_mask(edge_types)
+        if target is not None:
+            scope = sorted(self.node_index(node_id) for node_id in self.k_hop(target, None, "in", edge_types))
+        else:
+            scope = list(range(len(self.node_ids)))
+        in_scope = set(scope)
+
+        in_degree = {node: 0 for node in scope}
+        for node in scope:
+            for successor in self._neighbors(node, "out", mask):
+                if successor in in_scope:
+                    in_degree[successor] += 1
+
+        ready = [node for node in scope if in_degree[node] == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            node = heapq.heappop(ready)
+            order.append(node)
+            for successor in self._neighbors(node, "out", mask):
+                if successor in in_scope:
+                    in_degree[successor] -= 1
+                    if in_degree[successor] == 0:
+                        heapq.heappush(ready, successor)
+
+        has_cycle = len(order) < len(scope)
+        if has_cycle:
+            ordered = set(order)
+            order.extend(node for node in scope if node not in ordered)
+        return [self.node_ids[node] for node in order], has_cycle
+
+    def shortest_path(self, target: str, source: Optional[str] = None,
+                      edge_types: Optional[Iterable[str]] = None) -> Optional[List[str]]:
+        """
+        最短前置路径：从 source 沿边到达 target 的最短路径；
+        不指定 source 时，返回从任一起点（没有前置的节点）到 target 的最短路径
+
+        从 target 逆边方向广度优先搜索，只访问必要的边
+        :return: 从起点到 target 的节点ID列表，不可达时返回 None
+        """
+        mask = self.kind_mask(edge_types)
+        goal = self.node_index(target)
+        origin = self.node_index(source) if source is not None else None
+
+        parents = {goal: -1}
+        queue = deque([goal])
+        found = None
+        while queue:
+            node = queue.popleft()
+            predecessors = self._neighbors(node, "in", mask)
+            if node == origin or (origin is None and not predecessors):
+                found = node
+                break
+            for predecessor in predecessors:
+                if predecessor not in parents:
+                    parents[predecessor] = node
+                    queue.append(predecessor)
+        if found is None:
+            return None
+
+        path = []
+        node = found
+        while node != -1:
+            path.append(self.node_ids[node])
+            node = parents[node]
+        return path
+
+    def nodes(self, node_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """按 ID 取节点 data"""
+        return [self.node_data[self.index[node_id]] for node_id in node_ids if node_id in self.index]
+
+
+class GraphIndexCache:
+    """
+    按图谱ID缓存查询索引（LRU，按条数限制），缓存项带文件版本（mtime + 大小），图谱更新后自动重建
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], GraphIndex]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: Tuple[int, int]) -> Optional[GraphIndex]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                graph_index_cache_misses.inc()
+                return None
+            self._entries.move_to_end(key)
+        graph_index_cache_hits.inc()
+        return entry[1]
+
+    def put(self, key: str, version: Tuple[int, int], index: GraphIndex) -> None:
+        with self._lock:
+            self._entries[key] = (version, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+# 全局索引缓存，容量可通过环境变量调整
+graph_index_cache = GraphIndexCache(max_entries=int(os.getenv("GRAPH_INDEX_CACHE_SIZE", "64")))
@@ -0,0 +1,237 @@
+"""
+知识点图谱布局预计算
+
+保存图谱时在服务端计算一次节点坐标，随图谱一起保存，前端用 Cytoscape 的 preset 布局直接渲染，
+避免在浏览器中对几百个节点运行 cose 布局。
+
+算法：
+1. 分层初始化：沿 edges / dependent_edges 按最长路径分层（有环时断开环），层内按前驱位置排序，过宽的层折行
+2. 力导向迭代（Fruchterman-Reingold）：节点间斥力 + 边的引力 + 向所在层的弱回拉力，
+   斥力按行分块用 NumPy 广播计算，内存占用与节点数成线性关系
+
+布局计算是 CPU 密集型任务，接口中通过 compute_layout_async 在专用的小线程池中执行（LAYOUT_MAX_WORKERS，默认 2），
+不占用共享的 I/O 线程池，同时计算的布局数有上限，多出的请求排队等待
+"""
+import os
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from utils.metrics import registry
+from utils.tracing import current_span, span
+
+LAYOUT_ALGORITHM = "layered-force"
+LAYOUT_VERSION = 1
+
+# 相邻节点的理想间距（像素，节点直径为 100）
+NODE_SPACING = 160.0
+# 向所在层回拉的强度，0 表示纯力导向
+LAYER_STRENGTH = 0.05
+# 斥力分块计算时每块的最大元素数（行数 × 节点数）
+REPULSION_BLOCK_SIZE = 1 << 20
+PADDING = 50.0
+
+# 同时计算布局的线程数
+LAYOUT_MAX_WORKERS = int(os.getenv("LAYOUT_MAX_WORKERS", "2"))
+
+graph_layout_seconds = registry.histogram("graph_layout_seconds", "知识点图谱布局计算耗时（秒）")
+graph_layout_queue_seconds = registry.histogram("graph_layout_queue_seconds", "布局计算在线程池中的排队时间（秒）")
+
+_layout_executor = ThreadPoolExecutor(max_workers=LAYOUT_MAX_WORKERS, thread_name_prefix="graph-layout")
+
+
+def _collect_graph(graph: Any) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """提取节点 ID 列表和边的 (起点下标, 终点下标) 数组，忽略指向不存在节点的边与自环"""
+    node_ids: List[str] = []
+    index: Dict[str, int] = {}
+    for node in graph.get("nodes", []) if isinstance(graph, dict) else []:
+        data = node.get("data") if isinstance(node, dict) else None
+        if isinstance(data, dict) and data.get("id") is not None:
+            node_id = str(data["id"])
+            if node_id not in index:
+                index[node_id] = len(node_ids)
+                node_ids.append(node_id)
+
+    sources, targets = [], []
+    for key in ("edges", "dependent_edges"):
+        for edge in graph.get(key, []) or []:
+            data = edge.get("data") if isinstance(edge, dict) else None
+            if not isinstance(data, dict):
+                continue
+            source, target = index.get(str(data.get("source"))), index.get(str(data.get("target")))
+            if source is not None and target is not None and source != target:
+                sources.append(source)
+                targets.append(target)
+    return node_ids, np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+
+def assign_layers(node_count: int, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    按最长路径分层：入度为 0 的节点在第 0 层，其余节点位于所有前驱的下一层；
+    剩余的环从入度最小的节点断开后继续排序
+    """
+    successors: List[List[int]] = [[] for _ in range(node_count)]
+    in_degree = np.zeros(node_count, dtype=np.int64)
+    for source, target in zip(sources.tolist(), targets.tolist()):
+        successors[source].append(target)
+        in_degree[target] += 1
+
+    layers = np.zeros(node_count, dtype=np.int64)
+    visited = np.zeros(node_count, dtype=bool)
+    remaining = in_degree.copy()
+    queue = deque(np.flatnonzero(remaining == 0).tolist())
+    while True:
+        while queue:
+            node = queue.popleft()
+            visited[node] = True
+            for successor in successors[node]:
+                layers[successor] = max(layers[successor], layers[node] + 1)
+                remaining[successor] -= 1
+                if remaining[successor] == 0:
+                    queue.append(successor)
+        unvisited = np.flatnonzero(~visited)
+        if len(unvisited) == 0:
+            break
+        # 剩余节点都在环上：从入度最小的节点断开环继续
+        start = int(unvisited[np.argmin(remaining[unvisited])])
+        remaining[start] = 0
+        queue.append(start)
+    return layers
+
+
+def _initial_positions(layers: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+                       spacing: float) -> np.ndarray:
+    """
+    分层初始坐标：层内按前驱节点的平均横坐标排序（减少边交叉），
+    节点过多的层折成多行，避免极宽的单行
+    """
+    node_count = len(layers)
+    positions = np.zeros((node_count, 2), dtype=np.float64)
+    row_width = max(4, int(np.ceil(np.sqrt(node_count) * 1.5)))
+    predecessors: List[List[int]] = [[] for _ in range(node_count)]
+    for source, target in zip(sources.tolist(), targets.tolist()):
+        if layers[source] < layers[target]:
+            predecessors[target].append(source)
+
+    row = 0
+    for layer in np.unique(layers):
+        members = np.flatnonzero(layers == layer)
+        barycenters = np.array([
+            positions[predecessors[m], 0].mean() if predecessors[m] else float(rank)
+            for rank, m in enumerate(members.tolist())
+        ])
+        members = members[np.argsort(barycenters, kind="stable")]
+        for chunk_start in range(0, len(members), row_width):
+            chunk = members[chunk_start:chunk_start + row_width]
+            positions[chunk, 0] = (np.arange(len(chunk)) - (len(chunk) - 1) / 2) * spacing
+            positions[chunk, 1] = row * spacing
+            row += 1
+    return positions
+
+
+def _repulsion(positions: np.ndarray, k: float) -> np.ndarray:
+    """计算所有节点对之间的斥力 k² / d，按行分块避免 n×n×2 的大数组"""
+    node_count = len(positions)
+    displacement = np.zeros_like(positions)
+    block_rows = max(1, REPULSION_BLOCK_SIZE // max(node_count, 1))
+    for start in range(0, node_count, block_rows):
+        stop = min(start + block_rows, node_count)
+        delta = positions[start:stop, None, :] - positions[None, :, :]
+        distance_sq = np.einsum("ijk,ijk->ij", delta, delta)
+        # 自身不受力；重合的节点给一个极小距离，由初始抖动把它们分开
+        distance_sq[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        np.maximum(distance_sq, 1e-2, out=distance_sq)
+        displacement[start:stop] = np.einsum("ijk,ij->ik", delta, (k * k) / distance_sq)
+    return displacement
+
+
+def default_iterations(node_count: int) -> int:
+    """节点越多迭代次数越少，控制总计算量（分层初始化已提供大致结构）"""
+    if node_count <= 1:
+        return 0
+    return int(max(30, min(300, 3e7 / (node_count * node_count))))
+
+
+def compute_layout(graph: Any, iterations: int = None, spacing: float = NODE_SPACING) -> Dict[str, Any]:
+    """
+    计算图谱的节点坐标
+
+    :param graph: 知识点图谱（nodes / edges / dependent_edges，Cytoscape 元素格式）
+    :param iterations: 力导向迭代次数，默认按节点数自动选择
+    :param spacing: 相邻节点的理想间距
+    :return: {"algorithm", "version", "positions": {节点ID: {"x", "y"}}}
+    """
+    started = time.perf_counter()
+    node_ids, sources, targets = _collect_graph(graph)
+    node_count = len(node_ids)
+    if iterations is None:
+        iterations = default_iterations(node_count)
+
+    layers = assign_layers(node_count, sources, targets)
+    positions = _initial_positions(layers, sources, targets, spacing)
+    layer_y = positions[:, 1].copy()
+    # 固定种子的小幅抖动：打破对称，且同一图谱每次计算结果一致
+    rng = np.random.default_rng(node_count)
+    positions += rng.uniform(-spacing * 0.05, spacing * 0.05, size=positions.shape)
+
+    k = spacing
+    temperature = spacing * max(1.0, np.sqrt(node_count) / 2)
+    cooling = (0.01 ** (1 / iterations)) if iterations else 1.0
+    for _ in range(iterations):
+        displacement = _repulsion(positions, k)
+        if len(sources):
+            delta = positions[sources] - positions[targets]
+            distance = np.maximum(np.linalg.norm(delta, axis=1), 1e-2)
+            attraction = delta * (distance / k)[:, None]
+            np.add.at(displacement, sources, -attraction)
+            np.add.at(displacement, targets, attraction)
+        displacement[:, 1] += (layer_y - positions[:, 1]) * LAYER_STRENGTH * k
+
+        length = np.maximum(np.linalg.norm(displacement, axis=1), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= cooling
+
+    if node_count:
+        positions -= positions.min(axis=0) - PADDING
+
+    graph_layout_seconds.observe(time.perf_counter() - started)
+    return {
+        "algorithm": LAYOUT_ALGORITHM,
+        "version": LAYOUT_VERSION,
+        "positions": {
+            node_id: {"x": round(float(x), 1), "y": round(float(y), 1)}
+            for node_id, (x, y) in zip(node_ids, positions)
+        },
+    }
+
+
+def layout_is_current(layout: Any, graph: Any) -> bool:
+    """已保存的布局是否仍然可用（算法版本一致且覆盖全部节点）"""
+    if not isinstance(layout, dict) or layout.get("version") != LAYOUT_VERSION:
+        return False
+    positions = layout.get("positions")
+    if not isinstance(positions, dict):
+        return False
+    node_ids, _, _ = _collect_graph(graph)
+    return all(node_id in positions for node_id in node_ids)
+
+
+async def compute_layout_async(graph: Any) -> Dict[str, Any]:
+    """在布局专用线程池中计算图谱的节点坐标（参数与返回值同 compute_layout）"""
+    submitted_at = time.perf_counter()
+
+    def run():
+        graph_layout_queue_seconds.observe(time.perf_counter() - submitted_at)
+        if current_span() is None:
+            return compute_layout(graph)
+        with span("knowledge.layout"):
+            return compute_layout(graph)
+
+    # 在调用方的上下文中执行，日志与链路 span 归属到当前请求
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_layout_executor, context.run, run)
@@ -0,0 +1,86 @@
+"""
+JSON 编解码：优先使用 orjson，未安装时回退到标准库 json
+
+- 落盘使用紧凑格式（无缩进），下载时才格式化输出
+- 输出均为 UTF-8 原文（等价于 ensure_ascii=False）
+"""
+import json
+from typing import Any, Optional, Union
+from urllib.parse import quote
+
+from starlette.responses import Response
+
+from utils.atomic_writer import atomic_write
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    _COMPACT_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    _PRETTY_OPTIONS = _COMPACT_OPTIONS | orjson.OPT_INDENT_2
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """
+    序列化为 UTF-8 字节串
+
+    :param obj: 待序列化对象
+    :param pretty: 是否缩进（仅用于下载等给人看的场景）
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=_PRETTY_OPTIONS if pretty else _COMPACT_OPTIONS)
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """反序列化 JSON 字节串或字符串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_file(path: str, obj: Any) -> None:
+    """以紧凑格式原子写入 JSON 文件"""
+    atomic_write(path, dumps(obj))
+
+
+def load_file(path: str) -> Any:
+    """读取 JSON 文件（兼容旧的缩进格式）"""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+class FastJSONResponse(Response):
+    """使用 orjson 渲染的 JSON 响应，作为应用的默认响应类"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def json_bytes_response(body: bytes, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """直接返回已序列化好的 JSON 字节，跳过 FastAPI 的 jsonable_encoder"""
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def json_download_response(body: bytes, filename: str) -> Response:
+    """
+    以附件形式返回 JSON 内容
+
+    :param body: 已序列化的 JSON 字节（通常为格式化后的版本）
+    :param filename: 下载文件名，支持中文
+    """
+    quoted = quote(filename)
+    if quoted != filename:
+        content_disposition = f"attachment; filename*=utf-8''{quoted}"
+    else:
+        content_disposition = f'attachment; filename="{filename}"'
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Content-Disposition": content_disposition},
+    )
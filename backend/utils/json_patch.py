@@ -0,0 +1,198 @@
+"""
+JSON Patch（RFC 6902）与 JSON Merge Patch（RFC 7396）
+
+补丁应用在记录的深拷贝上，任何一步失败都不会修改原记录
+"""
+import re
+import copy
+from typing import Any, List, Optional, Tuple
+
+JSON_PATCH_MEDIA_TYPE = "application/json-patch+json"
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+
+_ETAG_PATTERN = re.compile(r'^(?:W/)?"(\d+)"$')
+
+
+class PatchError(ValueError):
+    """补丁格式错误或无法应用"""
+
+
+class PatchTestFailed(PatchError):
+    """test 操作的比较结果不一致"""
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """解析 JSON Pointer（RFC 6901），返回路径片段列表"""
+    if pointer == "":
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith("/"):
+        raise PatchError(f"非法的路径: {pointer}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise PatchError(f"非法的数组下标: {token}")
+    index = int(token)
+    limit = len(container) if allow_end else len(container) - 1
+    if index > limit:
+        raise PatchError(f"数组下标越界: {token}")
+    return index
+
+
+def _resolve_parent(document: Any, parts: List[str]) -> Tuple[Any, str]:
+    target = document
+    for token in parts[:-1]:
+        if isinstance(target, dict):
+            if token not in target:
+                raise PatchError(f"路径不存在: {token}")
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_list_index(target, token, allow_end=False)]
+        else:
+            raise PatchError(f"路径不存在: {token}")
+    return target, parts[-1]
+
+
+def _get(document: Any, pointer: str) -> Any:
+    parts = parse_pointer(pointer)
+    if not parts:
+        return document
+    parent, token = _resolve_parent(document, parts)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"路径不存在: {pointer}")
+        return parent[token]
+    if isinstance(parent, list):
+        return parent[_list_index(parent, token, allow_end=False)]
+    raise PatchError(f"路径不存在: {pointer}")
+
+
+def _add(document: Any, pointer: str, value: Any) -> Any:
+    parts = parse_pointer(pointer)
+    if not parts:
+        return value
+    parent, token = _resolve_parent(document, parts)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, token, allow_end=True), value)
+    else:
+        raise PatchError(f"路径不存在: {pointer}")
+    return document
+
+
+def _remove(document: Any, pointer: str) -> Any:
+    parts = parse_pointer(pointer)
+    if not parts:
+        raise PatchError("不能删除整个文档")
+    parent, token = _resolve_parent(document, parts)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"路径不存在: {pointer}")
+        del parent[token]
+    elif isinstance(parent, list):
+        del parent[_list_index(parent, token, allow_end=False)]
+    else:
+        raise PatchError(f"路径不存在: {pointer}")
+    return document
+
+
+def apply_json_patch(document: Any, operations: Any) -> Any:
+    """
+    应用 JSON Patch 操作列表，返回新文档
+
+    :raises PatchTestFailed: test 操作不通过
+    :raises PatchError: 操作格式错误或路径不存在
+    """
+    if not isinstance(operations, list):
+        raise PatchError("JSON Patch 必须是操作数组")
+    document = copy.deepcopy(document)
+    for operation in operations:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise PatchError(f"非法的补丁操作: {operation}")
+        op, path = operation["op"], operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"{op} 操作缺少 value")
+        if op in ("move", "copy") and "from" not in operation:
+            raise PatchError(f"{op} 操作缺少 from")
+
+        if op == "add":
+            document = _add(document, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            document = _remove(document, path)
+        elif op == "replace":
+            _get(document, path)
+            if path == "":
+                document = copy.deepcopy(operation["value"])
+            else:
+                document = _add(_remove(document, path), path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            source = operation["from"]
+            if path != source and path.startswith(source + "/"):
+                raise PatchError("不能把节点移动到它自己的子节点下")
+            value = _get(document, source)
+            document = _add(_remove(document, source), path, value)
+        elif op == "copy":
+            document = _add(document, path, copy.deepcopy(_get(document, operation["from"])))
+        elif op == "test":
+            if _get(document, path) != operation["value"]:
+                raise PatchTestFailed(f"test 操作不通过: {path}")
+        else:
+            raise PatchError(f"未知的补丁操作: {op}")
+    return document
+
+
+def apply_merge_patch(document: Any, patch: Any) -> Any:
+    """应用 JSON Merge Patch，返回新文档（值为 null 的字段被删除）"""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(document) if isinstance(document, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def apply_patch(document: Any, kind: str, patch: Any) -> Any:
+    """按补丁类型（json-patch / merge-patch）应用补丁"""
+    if kind == "json-patch":
+        return apply_json_patch(document, patch)
+    if kind == "merge-patch":
+        return apply_merge_patch(document, patch)
+    raise PatchError(f"未知的补丁类型: {kind}")
+
+
+def version_etag(version: int) -> str:
+    """记录版本对应的 ETag"""
+    return f'"{version}"'
+
+
+def parse_if_match(header: Optional[str]) -> Optional[int]:
+    """
+    解析 If-Match 请求头中的版本号，未提供或为 * 时返回 None
+
+    :raises PatchError: 格式不正确
+    """
+    if header is None or header.strip() == "*":
+        return None
+    match = _ETAG_PATTERN.match(header.strip())
+    if match is None:
+        raise PatchError(f"非法的 If-Match: {header}")
+    return int(match.group(1))
+
+
+def patch_kind_for(content_type: Optional[str], body: Any) -> str:
+    """
+    根据 Content-Type 判断补丁类型；普通 application/json 时按请求体推断（数组为 JSON Patch）
+    """
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type == JSON_PATCH_MEDIA_TYPE:
+        return "json-patch"
+    if media_type == MERGE_PATCH_MEDIA_TYPE:
+        return "merge-patch"
+    return "json-patch" if isinstance(body, list) else "merge-patch"
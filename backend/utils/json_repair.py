@@ -0,0 +1,212 @@
+"""
+容错的增量 JSON 解析：修复模型输出中常见的格式问题，尽量不丢弃已生成的内容
+
+- 跳过 JSON 前后的说明文字与 ```json 代码块标记；说明文字中的括号（如 "Here [is] the JSON: {...}"）
+  闭合后无法解析或未通过校验时，从其后的下一个 { / [ 重新开始
+- 字符串中的换行等控制字符转义，字符串外的直接丢弃；字符串外的连续空白合并为一个空格（仍能发现缺少逗号等错误）
+- 去掉多余的逗号（尾随逗号、连续逗号），修正非法的转义序列
+- 输出被截断时补全字符串与括号；补全后仍不合法或未通过校验，则依次退回到之前完整的元素
+- 可以分块 feed()，每块只处理新增部分，随时用 value() 取得当前可解析的结果
+
+用法：
+    data = loads_lenient(raw, validate=KnowledgePointGenerateResponse.parse_obj)
+
+    parser = IncrementalJSONParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    data = parser.value()
+"""
+import json
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from utils.metrics import registry
+
+json_repairs = registry.counter("llm_json_repairs", "模型输出 JSON 的修复次数（按修复类型）")
+
+_CLOSERS = {"{": "}", "[": "]"}
+_VALID_ESCAPES = set('"\\/bfnrtu')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+# 截断修复时最多退回的完整元素个数
+MAX_BACKTRACK = 16
+
+
+class JSONRepairError(ValueError):
+    """输出中没有可以修复的 JSON"""
+
+
+class IncrementalJSONParser:
+    """逐字符扫描模型输出，边扫描边修复，保留括号栈以便随时补全被截断的内容"""
+
+    def __init__(self):
+        self._out: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._complete = False
+        # 每个完整元素之后的位置及当时的括号栈，截断修复失败时从后往前退回
+        self._safe: List[Tuple[int, Tuple[str, ...]]] = []
+        # 已输入的原文与字符数，根对象闭合之后的位置：根对象不是 JSON 时从该位置重新开始
+        self._chunks: List[str] = []
+        self._fed = 0
+        self._end = 0
+        self.repairs: Set[str] = set()
+
+    @property
+    def complete(self) -> bool:
+        """根对象是否已经闭合"""
+        return self._complete
+
+    def feed(self, chunk: str) -> None:
+        out = self._out
+        base = self._fed
+        self._chunks.append(chunk)
+        self._fed += len(chunk)
+        for index, ch in enumerate(chunk):
+            if self._complete:
+                if not ch.isspace():
+                    self.repairs.add("surrounding_text")
+                continue
+            if not self._started:
+                if ch in _CLOSERS:
+                    self._started = True
+                    self._open(ch)
+                elif not ch.isspace():
+                    self.repairs.add("surrounding_text")
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    if ch not in _VALID_ESCAPES:
+                        # 如 \d：把反斜杠本身转义
+                        out.append("\\")
+                        self.repairs.add("invalid_escape")
+                    out.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    out.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    out.append(ch)
+                elif ch < " ":
+                    out.append(_CONTROL_ESCAPES.get(ch, "\\u%04x" % ord(ch)))
+                    self.repairs.add("control_char")
+                else:
+                    out.append(ch)
+            elif ch == '"':
+                self._in_string = True
+                out.append(ch)
+            elif ch in _CLOSERS:
+                self._open(ch)
+            elif ch in "}]":
+                self._close()
+                if self._complete:
+                    self._end = base + index + 1
+            elif ch == ",":
+                self._strip_space()
+                if not out or out[-1] in ",{[:":
+                    self.repairs.add("extra_comma")
+                    continue
+                self._safe.append((len(out), tuple(self._stack)))
+                out.append(ch)
+            elif ch.isspace():
+                if out[-1] != " ":
+                    out.append(" ")
+            elif ch < " " or ch == "\x7f":
+                self.repairs.add("control_char")
+            else:
+                out.append(ch)
+
+    def _open(self, ch: str) -> None:
+        self._stack.append(ch)
+        self._out.append(ch)
+        self._safe.append((len(self._out), tuple(self._stack)))
+
+    def _strip_space(self) -> None:
+        while self._out[-1] == " ":
+            self._out.pop()
+
+    def _close(self) -> None:
+        self._strip_space()
+        if self._out[-1] == ",":
+            self._out.pop()
+            self.repairs.add("trailing_comma")
+        # 括号不匹配时按栈顶补全
+        self._out.append(_CLOSERS[self._stack.pop()])
+        if self._stack:
+            self._safe.append((len(self._out), tuple(self._stack)))
+        else:
+            self._complete = True
+
+    def value(self, validate: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        解析当前已输入的内容，截断时补全后返回
+
+        :param validate: 校验并转换解析结果，不通过时抛出异常；截断时会退回到更早的完整元素重试
+        :raises JSONRepairError: 没有找到 JSON，或修复后仍不合法
+        :raises Exception: 未截断的输出没有通过 validate 时，抛出其异常（之后还有候选时抛出最后一个候选的异常）
+        """
+        parser = self
+        while True:
+            try:
+                return parser._value(validate)
+            except ValueError:
+                rest = parser._rest()
+                if rest is None:
+                    raise
+            finally:
+                if parser is not self:
+                    self.repairs |= parser.repairs
+            # 闭合的根对象不是所需的 JSON（多为说明文字中的括号），从其后重新扫描
+            self.repairs.add("surrounding_text")
+            parser = IncrementalJSONParser()
+            parser.feed(rest)
+
+    def _rest(self) -> Optional[str]:
+        """根对象闭合之后的原文，其中没有其它 { / [ 时返回 None"""
+        if not self._complete:
+            return None
+        rest = "".join(self._chunks)[self._end:]
+        return rest if "{" in rest or "[" in rest else None
+
+    def _value(self, validate: Optional[Callable[[Any], Any]]) -> Any:
+        validate = validate or (lambda data: data)
+        if not self._started:
+            raise JSONRepairError("输出中没有 JSON 对象")
+        if self._complete:
+            try:
+                data = json.loads("".join(self._out))
+            except ValueError as e:
+                raise JSONRepairError(f"JSON 无法解析: {e}")
+            return validate(data)
+        self.repairs.add("truncated")
+        out = self._out[:-1] if self._escape else list(self._out)
+        if self._in_string:
+            out.append('"')
+        while out and out[-1] in ",: ":
+            out.pop()
+        candidates = [("".join(out), self._stack)]
+        candidates += [("".join(self._out[:length]), stack) for length, stack in reversed(self._safe[-MAX_BACKTRACK:])]
+        error: Exception = JSONRepairError("截断的 JSON 无法修复")
+        for text, stack in candidates:
+            try:
+                return validate(json.loads(text + _closing(stack)))
+            except ValueError as e:
+                # json.JSONDecodeError 与 pydantic.ValidationError 均为 ValueError
+                error = e
+        raise JSONRepairError(f"截断的 JSON 无法修复: {error}")
+
+
+def _closing(stack) -> str:
+    return "".join(_CLOSERS[ch] for ch in reversed(stack))
+
+
+def loads_lenient(raw: str, validate: Optional[Callable[[Any], Any]] = None) -> Any:
+    """一次性解析模型输出，记录用到的修复类型"""
+    parser = IncrementalJSONParser()
+    parser.feed(raw)
+    try:
+        return parser.value(validate)
+    finally:
+        for repair in parser.repairs:
+            json_repairs.inc(repair=repair)
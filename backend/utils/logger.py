@@ -0,0 +1,304 @@
+"""
+结构化日志：调用方只把日志条目放入内存队列，格式化为 JSON 与写文件由后台线程完成
+
+- 每条日志是一行 JSON：时间、级别、模块、消息、上下文字段（task_id / request_id 等）和调用时附带的字段
+- 上下文通过 contextvars 传递：请求中间件绑定 request_id，任务执行时用 log_context(task_id=...) 绑定
+- 高频日志可传 sample=0.1 按比例采样，输出中带 sample_rate 便于统计时还原
+- 队列满时丢弃新日志并计数，不阻塞请求；文件按大小轮转
+
+用法：
+    logger = get_logger(__name__)
+    logger.info("知识点已保存", key=save_key, nodes=len(nodes))
+    logger.debug("生成知识点", sample=0.1, node_id=node_id)
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import queue
+import atexit
+import random
+import threading
+import traceback
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.json_codec import dumps
+from utils.metrics import registry
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_LEVELS_BY_NAME = {name: level for level, name in LEVEL_NAMES.items()}
+
+# 日志级别与输出位置，可通过环境变量调整；LOG_FILE 设为空字符串时只输出到控制台
+LOG_LEVEL = _LEVELS_BY_NAME.get(os.getenv("LOG_LEVEL", "INFO").upper(), INFO)
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("data", "logs", "server.jsonl"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "1") not in ("0", "false", "False", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# 后台线程每次最多合并写入的条数
+_BATCH_SIZE = 512
+
+log_records_dropped = registry.counter("log_records_dropped", "日志队列已满而丢弃的日志条数")
+log_write_errors = registry.counter("log_write_errors", "日志写入失败次数")
+
+_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+
+def get_context() -> Dict[str, Any]:
+    return _context.get()
+
+
+@contextmanager
+def log_context(**fields):
+    """在代码块内为日志附加上下文字段（如 task_id），离开后恢复"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class RotatingFile:
+    """按大小轮转的文件（日志与追踪导出共用）：server.jsonl -> server.jsonl.1 -> ... -> server.jsonl.N"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        self._size = self._file.tell()
+
+    def write(self, data: bytes) -> None:
+        if self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+            self._file = open(self.path, "ab")
+        else:
+            self._file = open(self.path, "wb")
+        self._size = 0
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def format_record(record: tuple) -> bytes:
+    """把队列中的日志条目格式化为一行 JSON"""
+    created, level, name, message, fields, context, exc_info, sample = record
+    entry = {
+        "ts": datetime.fromtimestamp(created, timezone.utc).isoformat(timespec="milliseconds"),
+        "level": LEVEL_NAMES.get(level, str(level)),
+        "logger": name,
+        "msg": message,
+    }
+    entry.update(context)
+    entry.update(fields)
+    if sample is not None:
+        entry["sample_rate"] = sample
+    if exc_info is not None:
+        entry["exc"] = "".join(traceback.format_exception(*exc_info)).rstrip()
+    try:
+        return dumps(entry) + b"\n"
+    except TypeError:
+        # 字段中有无法序列化的对象时转为字符串
+        return dumps({key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                      for key, value in entry.items()}) + b"\n"
+
+
+class _LogWriter:
+    """后台写日志线程：批量取出队列中的条目，格式化后写入控制台与轮转文件"""
+
+    def __init__(self):
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.max_size = LOG_QUEUE_SIZE
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._outputs: List[Any] = []
+
+    def _open_outputs(self) -> None:
+        if LOG_CONSOLE:
+            self._outputs.append(sys.stderr.buffer if hasattr(sys.stderr, "buffer") else None)
+        if LOG_FILE:
+            try:
+                self._outputs.append(RotatingFile(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT))
+            except OSError as e:
+                sys.stderr.write(f"日志文件无法打开，只输出到控制台: {e}\n")
+        self._outputs = [output for output in self._outputs if output is not None]
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._open_outputs()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, record: tuple) -> None:
+        if self._thread is None:
+            self.start()
+        if self.queue.qsize() >= self.max_size:
+            log_records_dropped.inc()
+            return
+        self.queue.put(record)
+
+    def _run(self) -> None:
+        while True:
+            record = self.queue.get()
+            batch = [record]
+            while record is not None and len(batch) < _BATCH_SIZE:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(record)
+            stop = batch[-1] is None
+            self._write([format_record(item) for item in batch if item is not None])
+            if stop:
+                return
+
+    def _write(self, lines: List[bytes]) -> None:
+        if not lines:
+            return
+        data = b"".join(lines)
+        for output in self._outputs:
+            try:
+                output.write(data)
+                if hasattr(output, "flush"):
+                    output.flush()
+            except (OSError, ValueError):
+                log_write_errors.inc()
+
+    def shutdown(self, timeout: float = 2.0) -> None:
+        """写完队列中剩余的日志并停止后台线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self.queue.put(None)
+        thread.join(timeout)
+        for output in self._outputs:
+            if isinstance(output, RotatingFile):
+                output.close()
+        self._outputs = []
+
+
+_writer = _LogWriter()
+atexit.register(_writer.shutdown)
+
+
+class Logger:
+    """
+    结构化日志记录器：调用方只做级别判断、采样和入队，不做格式化与 I/O
+
+    关键字参数作为字段写入日志；sample 为保留参数，表示该条日志的采样比例（0~1）
+    """
+
+    def __init__(self, name: str, level: int = LOG_LEVEL):
+        self.name = name
+        self.level = level
+
+    def is_enabled_for(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, message: str, exc_info: Any = None, sample: Optional[float] = None,
+            **fields) -> None:
+        if level < self.level:
+            return
+        if sample is not None and random.random() >= sample:
+            return
+        if exc_info is True:
+            exc_info = sys.exc_info()
+            if exc_info[0] is None:
+                exc_info = None
+        _writer.submit((time.time(), level, self.name, message, fields, _context.get(), exc_info or None, sample))
+
+    def debug(self, message: str, **fields) -> None:
+        self.log(DEBUG, message, **fields)
+
+    def info(self, message: str, **fields) -> None:
+        self.log(INFO, message, **fields)
+
+    def warning(self, message: str, **fields) -> None:
+        self.log(WARNING, message, **fields)
+
+    def error(self, message: str, **fields) -> None:
+        self.log(ERROR, message, **fields)
+
+    def exception(self, message: str, **fields) -> None:
+        """记录 ERROR 级别日志并附带当前异常的堆栈"""
+        self.log(ERROR, message, exc_info=True, **fields)
+
+
+_loggers: Dict[str, Logger] = {}
+
+
+def get_logger(name: str) -> Logger:
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, Logger(name))
+    return logger
+
+
+def shutdown_logging() -> None:
+    _writer.shutdown()
+
+
+# 客户端传入的请求ID只接受常见字符，避免日志注入
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._\-]{1,128}$")
+
+
+class RequestContextMiddleware:
+    """
+    为每个请求绑定 request_id（沿用客户端的 X-Request-ID，否则生成），并在响应头中返回
+    """
+
+    def __init__(self, app: ASGIApp, header_name: str = "X-Request-ID"):
+        self.app = app
+        self.header_name = header_name
+        self._header_key = header_name.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for key, value in scope["headers"]:
+            if key == self._header_key:
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[self.header_name] = request_id
+            await send(message)
+
+        token = _context.set({**_context.get(), "request_id": request_id})
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _context.reset(token)
@@ -0,0 +1,202 @@
+"""
+事件循环监控：持续采样事件循环延迟，并记录阻塞事件循环超过阈值的调用栈
+
+- 监控协程每隔 LOOP_MONITOR_INTERVAL 秒休眠一次，实际唤醒时间与预期之差即为事件循环延迟，计入直方图
+- 看门狗线程检查监控协程的心跳，超过 LOOP_BLOCK_THRESHOLD 秒未更新时读取事件循环线程的当前调用栈，
+  即正在阻塞的回调（同步模型调用、大文件 json.dump 等）；阻塞结束后按调用位置汇总次数与时长
+- 指标：event_loop_lag_seconds、event_loop_blocked_seconds 直方图，event_loop_blocking_sites 为
+  阻塞时长最多的调用位置（含调用栈），均在 /api/metrics 中输出
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.logger import get_logger
+from utils.metrics import registry
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "1") not in ("0", "false", "False")
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.25"))
+# 保留的阻塞调用位置数，超出时淘汰累计阻塞时长最少的
+LOOP_BLOCK_TOP_SITES = int(os.getenv("LOOP_BLOCK_TOP_SITES", "20"))
+
+# 调用栈最多记录的帧数
+MAX_STACK_FRAMES = 40
+
+# 项目代码所在目录：调用位置取调用栈中最内层的项目代码帧
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+event_loop_lag_seconds = registry.histogram("event_loop_lag_seconds", "事件循环延迟（秒）", LAG_BUCKETS)
+event_loop_blocked_seconds = registry.histogram(
+    "event_loop_blocked_seconds", f"延迟超过 {LOOP_BLOCK_THRESHOLD} 秒的阻塞事件（秒）", LAG_BUCKETS
+)
+
+logger = get_logger(__name__)
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(BASE_DIR + os.sep):
+        filename = os.path.relpath(filename, BASE_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{frame.f_lineno} {code.co_name}"
+
+
+def _is_project_frame(frame) -> bool:
+    filename = frame.f_code.co_filename
+    return (filename.startswith(BASE_DIR + os.sep) and "site-packages" not in filename
+            and filename != __file__)
+
+
+def capture_stack(frame) -> Dict[str, Any]:
+    """提取调用栈（从外到内）与调用位置（最内层的项目代码帧，没有时取最内层帧）"""
+    frames = []
+    site = None
+    while frame is not None:
+        if site is None and _is_project_frame(frame):
+            site = _format_frame(frame)
+        frames.append(_format_frame(frame))
+        frame = frame.f_back
+    return {"site": site or (frames[0] if frames else "unknown"),
+            "stack": list(reversed(frames[:MAX_STACK_FRAMES]))}
+
+
+class BlockingSites:
+    """
+    阻塞事件循环的调用位置排行，按累计阻塞时长保留前 N 个，作为自定义指标注册到指标注册表
+    """
+
+    def __init__(self, name: str, description: str = "", limit: int = LOOP_BLOCK_TOP_SITES):
+        self.name = name
+        self.description = description
+        self.limit = limit
+        self._sites: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, site: str, seconds: float, stack: List[str]) -> None:
+        with self._lock:
+            entry = self._sites.get(site)
+            if entry is None:
+                if len(self._sites) >= self.limit:
+                    weakest = min(self._sites, key=lambda key: self._sites[key]["total_seconds"])
+                    if self._sites[weakest]["total_seconds"] > seconds:
+                        return
+                    del self._sites[weakest]
+                entry = self._sites[site] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["last_seen"] = time.time()
+            entry["stack"] = stack
+
+    def top(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [dict(entry, site=site) for site, entry in self._sites.items()]
+        return sorted(items, key=lambda entry: entry["total_seconds"], reverse=True)
+
+    def snapshot(self) -> dict:
+        values = {}
+        for entry in self.top():
+            values[entry["site"]] = {
+                "count": entry["count"],
+                "total_seconds": round(entry["total_seconds"], 6),
+                "max_seconds": round(entry["max_seconds"], 6),
+                "last_seen": entry["last_seen"],
+                "stack": entry["stack"],
+            }
+        return {"type": "top", "description": self.description, "values": values}
+
+
+blocking_sites = registry.register(BlockingSites("event_loop_blocking_sites", "阻塞事件循环最久的调用位置"))
+
+
+class EventLoopMonitor:
+    """
+    事件循环延迟与阻塞监控：在事件循环中调用 start()，服务关闭时调用 stop()
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        # 看门狗为当前这次阻塞抓取的调用栈，阻塞结束后由监控协程汇总
+        self._pending: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(1.0)
+            self._watchdog = None
+
+    async def _sample(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            with self._lock:
+                self._heartbeat = now
+                pending, self._pending = self._pending, None
+            event_loop_lag_seconds.observe(lag)
+            if lag >= self.threshold:
+                self._record_block(lag, pending)
+
+    def _record_block(self, seconds: float, pending: Optional[Dict[str, Any]]) -> None:
+        # 阻塞在看门狗两次检查之间结束时没有抓到调用栈
+        captured = pending or {"site": "unknown", "stack": []}
+        event_loop_blocked_seconds.observe(seconds)
+        blocking_sites.record(captured["site"], seconds, captured["stack"])
+        logger.warning("事件循环被阻塞", seconds=round(seconds, 3), site=captured["site"],
+                       stack=captured["stack"][-8:])
+
+    def _watch(self) -> None:
+        check_interval = max(min(self.threshold / 4, 0.05), 0.005)
+        captured_for = None
+        while not self._stopped.wait(check_interval):
+            with self._lock:
+                heartbeat = self._heartbeat
+            if heartbeat == captured_for or time.monotonic() - heartbeat < self.interval + self.threshold:
+                continue
+            # 同一次阻塞只抓取一次调用栈
+            captured_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            captured = capture_stack(frame)
+            del frame
+            with self._lock:
+                if self._heartbeat == heartbeat:
+                    self._pending = captured
+
+
+# 全局事件循环监控
+loop_monitor = EventLoopMonitor()
@@ -0,0 +1,171 @@
+"""
+进程内指标：计数器、瞬时值与直方图，供 /api/metrics 接口汇总输出
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 默认直方图分桶（适合以秒为单位的耗时）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...]) -> str:
+    return ",".join(f"{k}={v}" for k, v in key)
+
+
+class Counter:
+    """单调递增计数器，可按标签区分"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = {_format_labels(k) or "total": v for k, v in self._values.items()}
+        return {"type": "counter", "description": self.description, "values": values}
+
+
+class Gauge:
+    """可增可减的瞬时值（如排队中的任务数），可按标签区分"""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value: float = 1, **labels) -> None:
+        self.inc(-value, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = {_format_labels(k) or "total": v for k, v in self._values.items()}
+        return {"type": "gauge", "description": self.description, "values": values}
+
+
+class Histogram:
+    """分桶直方图，记录观测值的分布，可按标签区分"""
+
+    def __init__(self, name: str, description: str = "", buckets: Optional[List[float]] = None):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._series: Dict[Tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"count": 0, "sum": 0.0, "max": value, "bucket_counts": [0] * (len(self.buckets) + 1)}
+                self._series[key] = series
+            series["count"] += 1
+            series["sum"] += value
+            series["max"] = max(series["max"], value)
+            series["bucket_counts"][index] += 1
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """根据分桶估算分位数（返回所在桶的上界）"""
+        series = self._series.get(_label_key(labels))
+        if not series or series["count"] == 0:
+            return None
+        target = q * series["count"]
+        cumulative = 0
+        for upper, count in zip(self.buckets, series["bucket_counts"]):
+            cumulative += count
+            if cumulative >= target:
+                return upper
+        return series["max"]
+
+    def snapshot(self) -> dict:
+        values = {}
+        with self._lock:
+            items = [(k, dict(v, bucket_counts=list(v["bucket_counts"]))) for k, v in self._series.items()]
+        for key, series in items:
+            label = _format_labels(key) or "total"
+            buckets = {}
+            cumulative = 0
+            for upper, count in zip(self.buckets, series["bucket_counts"]):
+                cumulative += count
+                buckets[str(upper)] = cumulative
+            buckets["+Inf"] = series["count"]
+            values[label] = {
+                "count": series["count"],
+                "sum": round(series["sum"], 6),
+                "avg": round(series["sum"] / series["count"], 6) if series["count"] else 0,
+                "max": round(series["max"], 6),
+                "buckets": buckets,
+            }
+        return {"type": "histogram", "description": self.description, "values": values}
+
+
+class MetricsRegistry:
+    """指标注册表：同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(name, description)
+            return metric
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Gauge(name, description)
+            return metric
+
+    def histogram(self, name: str, description: str = "", buckets: Optional[List[float]] = None) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, description, buckets)
+            return metric
+
+    def register(self, metric):
+        """注册自定义指标（需有 name 属性与 snapshot() 方法），同名指标已存在时返回已有的"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
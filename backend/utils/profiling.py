@@ -0,0 +1,422 @@
+"""
+按需请求剖析：通过管理接口为指定路由或请求头开启剖析，命中的前 N 个请求记录调用栈耗时与内存分配
+
+- 未开启剖析时中间件只判断一次会话列表是否为空，没有额外开销
+- 耗时（墙钟时间）剖析引擎：
+  pyinstrument - 已安装时默认使用，async 模式下按协程归属调用栈，输出 speedscope 格式
+  sampler      - 内置采样器：后台线程定时读取所有线程的调用栈，包含 run_io / 线程池中执行的生成流程
+  cprofile     - 标准库确定性剖析，只记录事件循环线程，输出 .prof（pstats）和折叠栈
+- 内存：请求期间开启 tracemalloc，结束时按分配位置的调用栈汇总仍存活的内存与峰值
+- 结果经存储后端保存在 profiles/ 下：<id>.meta.json 记录请求信息，
+  *.collapsed 为折叠栈（flamegraph.pl、speedscope 等可直接打开），*.speedscope.json 可在 speedscope 中打开
+- 同一进程同时只剖析一个请求（cProfile、tracemalloc 均为进程级），剖析进行中命中的请求照常处理、不计入次数
+"""
+import io
+import os
+import importlib.util
+import sys
+import time
+import uuid
+import pstats
+import marshal
+import cProfile
+import fnmatch
+import threading
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.file_manager import run_io
+from utils.json_codec import dumps, loads
+from utils.logger import get_context, get_logger
+from utils.metrics import registry
+from utils.storage import StorageBackend, join_key, storage
+
+# 可选依赖：pyinstrument 只在开启剖析时导入，这里只检查是否已安装
+HAS_PYINSTRUMENT = importlib.util.find_spec("pyinstrument") is not None
+
+PROFILES_PREFIX = "profiles"
+META_SUFFIX = ".meta.json"
+
+ENGINES = ("pyinstrument", "sampler", "cprofile")
+DEFAULT_ENGINE = "pyinstrument" if HAS_PYINSTRUMENT else "sampler"
+
+# 内置采样器的采样间隔（秒）与 tracemalloc 记录的栈深度
+SAMPLER_INTERVAL = float(os.getenv("PROFILE_SAMPLER_INTERVAL", "0.005"))
+MEMORY_FRAMES = int(os.getenv("PROFILE_MEMORY_FRAMES", "32"))
+# 折叠栈最大深度，cProfile 结果展开为折叠栈时使用
+MAX_STACK_DEPTH = 64
+
+profiles_recorded = registry.counter("profiles_recorded", "已保存的请求剖析结果数（按引擎）")
+profiles_skipped = registry.counter("profiles_skipped", "因已有剖析进行中而跳过的请求数")
+
+logger = get_logger(__name__)
+
+
+class ProfileSession:
+    """
+    一次剖析会话：匹配路径（支持通配符）、方法和/或请求头，剖析接下来命中的 count 个请求
+    """
+
+    def __init__(self, path: Optional[str] = None, method: Optional[str] = None,
+                 header: Optional[str] = None, header_value: Optional[str] = None,
+                 count: int = 1, engine: str = DEFAULT_ENGINE, memory: bool = False):
+        if engine not in ENGINES:
+            raise ValueError(f"不支持的剖析引擎: {engine}")
+        if engine == "pyinstrument" and not HAS_PYINSTRUMENT:
+            raise ValueError("未安装 pyinstrument")
+        if not path and not header:
+            raise ValueError("至少需要指定路径或请求头")
+        self.session_id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.method = method.upper() if method else None
+        self.header = header.lower().encode("latin-1") if header else None
+        self.header_name = header
+        self.header_value = header_value
+        self.count = count
+        self.remaining = count
+        self.engine = engine
+        self.memory = memory
+        self.created_at = time.time()
+        self.profile_ids: List[str] = []
+
+    def matches(self, scope: Scope) -> bool:
+        if self.method and scope["method"] != self.method:
+            return False
+        if self.path and scope["path"] != self.path and not fnmatch.fnmatchcase(scope["path"], self.path):
+            return False
+        if self.header:
+            for key, value in scope["headers"]:
+                if key == self.header and (self.header_value is None
+                                           or value.decode("latin-1") == self.header_value):
+                    return True
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "path": self.path,
+            "method": self.method,
+            "header": self.header_name,
+            "header_value": self.header_value,
+            "count": self.count,
+            "remaining": self.remaining,
+            "engine": self.engine,
+            "memory": self.memory,
+            "created_at": self.created_at,
+            "profile_ids": list(self.profile_ids),
+        }
+
+
+# ----------------------------------------------------------------------
+# 折叠栈（flamegraph.pl 格式：以分号连接的调用栈 + 空格 + 权重）
+# ----------------------------------------------------------------------
+
+def _frame_label(name: str, filename: str, lineno: int) -> str:
+    label = f"{name} ({os.path.basename(filename)}:{lineno})" if filename and filename != "~" else name
+    return label.replace(";", ",")
+
+
+def collapse(stacks: Dict[Tuple[str, ...], float]) -> bytes:
+    """把 {调用栈: 权重} 输出为折叠栈文本，权重取整（耗时为微秒，内存为字节）"""
+    lines = [";".join(stack) + f" {int(weight)}\n" for stack, weight in stacks.items() if int(weight) > 0]
+    return "".join(sorted(lines)).encode("utf-8")
+
+
+def pstats_to_stacks(stats: pstats.Stats) -> Dict[Tuple[str, ...], float]:
+    """
+    把 cProfile 的调用关系展开为调用栈（微秒）
+
+    cProfile 只记录调用者与被调用者之间的累计耗时，展开时按调用边占被调用函数总耗时的比例分摊，结果为近似值
+    """
+    entries = stats.stats
+    callees: Dict[tuple, List[tuple]] = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    roots = [func for func, (_, _, _, _, callers) in entries.items()
+             if not any(caller in entries for caller in callers)]
+    stacks: Dict[Tuple[str, ...], float] = {}
+
+    def walk(func: tuple, seconds: float, stack: Tuple[str, ...], visiting: frozenset) -> None:
+        _, _, self_time, total_time, _ = entries[func]
+        stack = stack + (_frame_label(func[2], func[0], func[1]),)
+        if total_time <= 0:
+            return
+        stacks[stack] = stacks.get(stack, 0.0) + seconds * self_time / total_time * 1e6
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for callee in callees.get(func, ()):
+            if callee in visiting:
+                continue
+            edge_time = entries[callee][4][func][3]
+            share = seconds * edge_time / total_time
+            # 小于 1 微秒的分支不再展开
+            if share >= 1e-6:
+                walk(callee, share, stack, visiting | {callee})
+
+    for root in roots:
+        walk(root, entries[root][3], (), frozenset((root,)))
+    return stacks
+
+
+def snapshot_to_stacks(snapshot: tracemalloc.Snapshot) -> Dict[Tuple[str, ...], float]:
+    """按分配位置的调用栈汇总仍存活的内存（字节）"""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    stacks: Dict[Tuple[str, ...], float] = {}
+    for stat in snapshot.statistics("traceback"):
+        # Traceback 中的帧从最外层到最内层排列
+        stack = tuple(f"{os.path.basename(frame.filename)}:{frame.lineno}".replace(";", ",")
+                      for frame in stat.traceback)
+        stacks[stack] = stacks.get(stack, 0.0) + stat.size
+    return stacks
+
+
+class _StackSampler:
+    """内置采样器：定时读取所有线程的调用栈，按线程名分组累计墙钟时间"""
+
+    def __init__(self, interval: float = SAMPLER_INTERVAL):
+        self.interval = interval
+        self.stacks: Dict[Tuple[str, ...], float] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = (now - last) * 1e6, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(_frame_label(code.co_name, code.co_filename, frame.f_lineno))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0.0) + elapsed
+
+
+# ----------------------------------------------------------------------
+# 剖析管理
+# ----------------------------------------------------------------------
+
+class RequestProfiler:
+    """
+    管理剖析会话与结果
+    """
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.backend = backend or storage
+        self.sessions: List[ProfileSession] = []
+        self._lock = threading.Lock()
+        self._busy = False
+
+    def start_session(self, **options) -> ProfileSession:
+        session = ProfileSession(**options)
+        with self._lock:
+            self.sessions = self.sessions + [session]
+        logger.info("开启请求剖析", **session.to_dict())
+        return session
+
+    def stop_session(self, session_id: str) -> Optional[ProfileSession]:
+        with self._lock:
+            for session in self.sessions:
+                if session.session_id == session_id:
+                    self.sessions = [item for item in self.sessions if item is not session]
+                    return session
+        return None
+
+    def acquire(self, scope: Scope) -> Optional[ProfileSession]:
+        """为请求领取一次剖析名额；没有匹配的会话或已有剖析进行中时返回 None"""
+        with self._lock:
+            for session in self.sessions:
+                if not session.matches(scope):
+                    continue
+                if self._busy:
+                    profiles_skipped.inc()
+                    return None
+                self._busy = True
+                session.remaining -= 1
+                if session.remaining <= 0:
+                    # 次数用完后移除，之后的请求回到零开销路径
+                    self.sessions = [item for item in self.sessions if item is not session]
+                return session
+        return None
+
+    def release(self) -> None:
+        with self._lock:
+            self._busy = False
+
+    # ------------------------------------------------------------------
+    # 结果
+    # ------------------------------------------------------------------
+
+    def save(self, profile_id: str, meta: Dict[str, Any], files: Dict[str, bytes]) -> None:
+        """保存剖析结果（阻塞，调用方放到 I/O 线程池中执行）"""
+        for suffix, data in files.items():
+            self.backend.put(join_key(PROFILES_PREFIX, f"{profile_id}.{suffix}"), data)
+        self.backend.put(join_key(PROFILES_PREFIX, profile_id + META_SUFFIX), dumps(meta))
+
+    def list(self) -> List[Dict[str, Any]]:
+        names = [name for name in self.backend.list(PROFILES_PREFIX) if name.endswith(META_SUFFIX)]
+        blobs = self.backend.get_many(join_key(PROFILES_PREFIX, name) for name in names)
+        profiles = [loads(content) for content in blobs.values()]
+        return sorted(profiles, key=lambda meta: meta["created_at"], reverse=True)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        content = self.backend.get(join_key(PROFILES_PREFIX, profile_id + META_SUFFIX))
+        return loads(content) if content is not None else None
+
+    def delete(self, profile_id: str) -> bool:
+        meta = self.get(profile_id)
+        if meta is None:
+            return False
+        for filename in meta["files"]:
+            self.backend.delete(join_key(PROFILES_PREFIX, filename))
+        self.backend.delete(join_key(PROFILES_PREFIX, profile_id + META_SUFFIX))
+        return True
+
+
+# 全局请求剖析器
+request_profiler = RequestProfiler()
+
+
+class _ActiveProfile:
+    """一次请求的剖析过程：按会话配置启动 / 停止各引擎并收集输出文件"""
+
+    def __init__(self, session: ProfileSession):
+        self.session = session
+        self.files: Dict[str, bytes] = {}
+        self.peak_memory: Optional[int] = None
+        self._instrument = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> None:
+        if self.session.memory:
+            tracemalloc.start(MEMORY_FRAMES)
+        if self.session.engine == "pyinstrument":
+            from pyinstrument import Profiler
+            self._instrument = Profiler(async_mode="enabled")
+            self._instrument.start()
+        elif self.session.engine == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._sampler = _StackSampler()
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._instrument is not None:
+            self._instrument.stop()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self.session.memory:
+            self._snapshot = tracemalloc.take_snapshot()
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def render(self) -> None:
+        """生成输出文件（阻塞，在 I/O 线程池中执行）"""
+        if self._instrument is not None:
+            from pyinstrument.renderers import SpeedscopeRenderer
+            self.files["cpu.speedscope.json"] = self._instrument.output(SpeedscopeRenderer()).encode("utf-8")
+        if self._cprofile is not None:
+            stats = pstats.Stats(self._cprofile, stream=io.StringIO())
+            # 与 Stats.dump_stats 写出的 .prof 文件格式相同，可用 snakeviz、flameprof 等打开
+            self.files["cpu.prof"] = marshal.dumps(stats.stats)
+            self.files["cpu.collapsed"] = collapse(pstats_to_stacks(stats))
+        if self._sampler is not None:
+            self.files["cpu.collapsed"] = collapse(self._sampler.stacks)
+        if self._snapshot is not None:
+            self.files["memory.collapsed"] = collapse(snapshot_to_stacks(self._snapshot))
+            self._snapshot = None
+
+
+async def _finish(active: _ActiveProfile, scope: Scope, status_code: Optional[int], started_at: float,
+                  duration: float, request_id: Optional[str]) -> None:
+    session = active.session
+    profile_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(started_at)) + "-" + uuid.uuid4().hex[:8]
+    try:
+        await run_io("profiling.render", active.render)
+        meta = {
+            "profile_id": profile_id,
+            "session_id": session.session_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status_code": status_code,
+            "request_id": request_id,
+            "engine": session.engine,
+            "duration_ms": round(duration * 1000, 3),
+            "peak_memory_bytes": active.peak_memory,
+            "files": [f"{profile_id}.{suffix}" for suffix in active.files],
+            "created_at": started_at,
+        }
+        await run_io("profiling.save", request_profiler.save, profile_id, meta, active.files)
+    except Exception:
+        logger.exception("剖析结果保存失败", session_id=session.session_id, path=scope["path"])
+        return
+    session.profile_ids.append(profile_id)
+    profiles_recorded.inc(engine=session.engine)
+    logger.info("请求剖析已保存", profile_id=profile_id, path=scope["path"], duration_ms=meta["duration_ms"])
+
+
+class ProfilingMiddleware:
+    """
+    剖析命中会话的请求；没有会话时直接调用下游应用
+    """
+
+    def __init__(self, app: ASGIApp, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler or request_profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.sessions:
+            await self.app(scope, receive, send)
+            return
+        session = self.profiler.acquire(scope)
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        active = _ActiveProfile(session)
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            active.start()
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                active.stop()
+        finally:
+            self.profiler.release()
+        await _finish(active, scope, status_code, started_at, time.perf_counter() - start,
+                      get_context().get("request_id"))
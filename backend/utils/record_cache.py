@@ -0,0 +1,111 @@
+"""
+记录缓存：按字节数限制容量的 LRU，缓存解析后的记录及其序列化字节
+
+缓存项带有文件的 mtime 与大小，读取时与磁盘状态比对，文件被外部修改后自动失效
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from utils.json_codec import dumps
+from utils.metrics import registry
+
+record_cache_hits = registry.counter("record_cache_hits", "记录缓存命中次数")
+record_cache_misses = registry.counter("record_cache_misses", "记录缓存未命中次数")
+record_cache_evictions = registry.counter("record_cache_evictions", "记录缓存淘汰次数（容量或失效）")
+record_cache_bytes = registry.gauge("record_cache_bytes", "记录缓存占用的估算字节数")
+record_cache_hit_ratio = registry.gauge("record_cache_hit_ratio", "记录缓存命中率")
+
+
+class CachedRecord:
+    """
+    缓存项：解析后的记录 + 紧凑序列化字节，格式化的下载版本按需生成
+    """
+    __slots__ = ("record", "body", "_pretty_body", "mtime_ns", "size")
+
+    def __init__(self, record: Any, body: bytes, mtime_ns: int, size: int):
+        self.record = record
+        self.body = body
+        self._pretty_body: Optional[bytes] = None
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    @property
+    def pretty_body(self) -> bytes:
+        """格式化后的 JSON（用于下载）"""
+        if self._pretty_body is None:
+            self._pretty_body = dumps(self.record, pretty=True)
+        return self._pretty_body
+
+    @property
+    def nbytes(self) -> int:
+        """
+        估算占用：序列化字节 + 解析后对象（按序列化字节的 2 倍估算）
+        下载用的格式化版本按同样大小预留
+        """
+        return len(self.body) * 4
+
+
+class RecordCache:
+    """线程安全的 LRU 缓存，总容量按字节数限制"""
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedRecord]" = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, mtime_ns: int, size: int) -> Optional[CachedRecord]:
+        """
+        查询缓存；文件的 mtime 或大小与缓存项不一致时视为失效
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.mtime_ns != mtime_ns or entry.size != size):
+                self._remove(key)
+                record_cache_evictions.inc(cache=self.name, reason="stale")
+                entry = None
+            if entry is None:
+                record_cache_misses.inc(cache=self.name)
+            else:
+                self._entries.move_to_end(key)
+                record_cache_hits.inc(cache=self.name)
+        record_cache_hit_ratio.set(round(self.hit_ratio(), 4), cache=self.name)
+        return entry
+
+    def put(self, key: str, entry: CachedRecord) -> None:
+        if entry.nbytes > self.max_bytes:
+            # 单条记录超过缓存容量，不缓存
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._current_bytes += entry.nbytes
+            while self._current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                record_cache_evictions.inc(cache=self.name, reason="capacity")
+            record_cache_bytes.set(self._current_bytes, cache=self.name)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                record_cache_bytes.set(self._current_bytes, cache=self.name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+            record_cache_bytes.set(0, cache=self.name)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._current_bytes -= entry.nbytes
+
+    def hit_ratio(self) -> float:
+        hits = record_cache_hits.get(cache=self.name)
+        total = hits + record_cache_misses.get(cache=self.name)
+        return hits / total if total else 0.0
@@ -0,0 +1,374 @@
+"""
+全文检索：增量维护的内存倒排索引
+
+- 分词：中文等 CJK 文字按字符二元组（bigram）切分，无需分词器；英文/数字按单词切分并转小写
+- 排序：BM25，各字段可设置权重（如标题权重高于正文）
+- 前缀查询：词项表保持有序，用二分查找展开前缀（如 "fle" -> "flex"、"布" -> "布局"）
+- 索引在保存/删除 PRD 与知识点图谱时增量更新，服务启动时从存储全量重建
+"""
+import re
+import math
+import time
+import bisect
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import registry
+
+search_query_seconds = registry.histogram("search_query_seconds", "全文检索查询耗时（秒）")
+search_index_documents = registry.gauge("search_index_documents", "全文检索索引中的文档数")
+search_index_terms = registry.gauge("search_index_terms", "全文检索索引中的词项数")
+
+# 连续的 CJK 字符，或连续的字母数字
+_TOKEN_PATTERN = re.compile(
+    r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]+|[0-9a-z]+"
+)
+_CJK_PATTERN = re.compile(r"[^0-9a-z]")
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 单个前缀最多展开的词项数
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def _is_cjk_run(run: str) -> bool:
+    return _CJK_PATTERN.match(run) is not None
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    将文本切分为词项：CJK 字符串切分为二元组（单字时保留单字），其余按单词切分
+    """
+    if not text:
+        return []
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if _is_cjk_run(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def tokenize_query(text: str, prefix: bool = True) -> List[Tuple[str, bool]]:
+    """
+    切分查询串，返回 (词项, 是否按前缀匹配) 列表
+
+    开启前缀查询时，最后一个英文单词以及单个 CJK 字符按前缀匹配（边输入边搜索）
+    """
+    if not text:
+        return []
+    runs = _TOKEN_PATTERN.findall(text.lower())
+    terms = []
+    for index, run in enumerate(runs):
+        is_last = index == len(runs) - 1
+        if _is_cjk_run(run):
+            if len(run) == 1:
+                # 单字可能只出现在二元组中，按前缀匹配
+                terms.append((run, prefix))
+            else:
+                terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+        else:
+            terms.append((run, prefix and is_last))
+    return terms
+
+
+class _Document:
+    __slots__ = ("key", "slot", "length", "terms", "meta", "group")
+
+    def __init__(self, key: str, length: float, terms: Dict[str, float], meta: Dict[str, Any],
+                 group: Optional[str]):
+        self.key = key
+        self.slot = -1
+        self.length = length
+        self.terms = terms
+        self.meta = meta
+        self.group = group
+
+
+class InvertedIndex:
+    """
+    线程安全的倒排索引
+
+    文档以字符串 key 标识，可归属到一个分组（如同一知识点图谱的所有节点），便于整组删除。
+    每篇文档分配一个整数槽位，倒排表以 dict 增量维护；查询时按词项惰性构建 numpy 数组，
+    BM25 打分对整条倒排表向量化计算，高频词（出现在大部分文档中）也只需毫秒级
+    """
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None):
+        self.field_weights = field_weights or {}
+        # 词项 -> {槽位: 加权词频}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # 词项 -> (槽位数组, 词频数组)，倒排表变化时失效
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._sorted_terms: List[str] = []
+        self._documents: Dict[str, _Document] = {}
+        self._slots: List[Optional[_Document]] = []
+        self._free_slots: List[int] = []
+        self._lengths = np.zeros(1024, dtype=np.float64)
+        self._groups: Dict[str, set] = {}
+        self._total_length = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add_document(self, key: str, fields: Dict[str, str], meta: Dict[str, Any],
+                     group: Optional[str] = None) -> None:
+        """
+        添加或替换文档
+
+        :param key: 文档唯一标识
+        :param fields: 字段名 -> 文本，词频按字段权重累加
+        :param meta: 检索结果中返回的附加信息
+        :param group: 所属分组
+        """
+        terms: Dict[str, float] = {}
+        length = 0.0
+        for field, text in fields.items():
+            weight = self.field_weights.get(field, 1.0)
+            for token in tokenize(text or ""):
+                terms[token] = terms.get(token, 0.0) + weight
+                length += weight
+
+        with self._lock:
+            self._remove(key)
+            document = _Document(key, length, terms, meta, group)
+            slot = self._allocate_slot(document)
+            self._documents[key] = document
+            self._total_length += length
+            for term, frequency in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._sorted_terms, term)
+                postings[slot] = frequency
+                self._arrays.pop(term, None)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            self._update_gauges()
+
+    def remove_document(self, key: str) -> bool:
+        with self._lock:
+            removed = self._remove(key)
+            self._update_gauges()
+            return removed
+
+    def remove_group(self, group: str) -> int:
+        """删除分组内的全部文档，返回删除的文档数"""
+        with self._lock:
+            keys = list(self._groups.get(group, ()))
+            for key in keys:
+                self._remove(key)
+            self._update_gauges()
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._arrays.clear()
+            self._sorted_terms.clear()
+            self._documents.clear()
+            self._slots.clear()
+            self._free_slots.clear()
+            self._lengths = np.zeros(1024, dtype=np.float64)
+            self._groups.clear()
+            self._total_length = 0.0
+            self._update_gauges()
+
+    def _allocate_slot(self, document: _Document) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slots[slot] = document
+        else:
+            slot = len(self._slots)
+            self._slots.append(document)
+            if slot >= len(self._lengths):
+                lengths = np.zeros(len(self._lengths) * 2, dtype=np.float64)
+                lengths[:len(self._lengths)] = self._lengths
+                self._lengths = lengths
+        self._lengths[slot] = document.length
+        document.slot = slot
+        return slot
+
+    def _remove(self, key: str) -> bool:
+        document = self._documents.pop(key, None)
+        if document is None:
+            return False
+        self._total_length -= document.length
+        for term in document.terms:
+            self._arrays.pop(term, None)
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(document.slot, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._sorted_terms, term)
+                if position < len(self._sorted_terms) and self._sorted_terms[position] == term:
+                    del self._sorted_terms[position]
+        self._slots[document.slot] = None
+        self._lengths[document.slot] = 0.0
+        self._free_slots.append(document.slot)
+        if document.group is not None:
+            members = self._groups.get(document.group)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._groups[document.group]
+        return True
+
+    def _update_gauges(self) -> None:
+        search_index_documents.set(len(self._documents))
+        search_index_terms.set(len(self._sorted_terms))
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        expansions = []
+        for term in self._sorted_terms[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not term.startswith(prefix):
+                break
+            expansions.append(term)
+        return expansions
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            slots = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            arrays = self._arrays[term] = (slots, frequencies)
+        return arrays
+
+    def _matches(self, slot: int, filters: Dict[str, Any]) -> bool:
+        meta = self._slots[slot].meta
+        return all(meta.get(k) == v for k, v in filters.items())
+
+    def search(self, query: str, limit: int = 20, prefix: bool = True,
+               filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        BM25 排序检索
+
+        :param query: 查询串
+        :param limit: 返回结果数上限
+        :param prefix: 是否对最后一个词启用前缀匹配
+        :param filters: 按 meta 字段精确过滤，如 {"type": "prd"}
+        :return: meta 附加 score 字段的结果列表，按得分降序
+        """
+        started = time.perf_counter()
+        query_terms = tokenize_query(query, prefix)
+
+        with self._lock:
+            document_count = len(self._documents)
+            if not query_terms or not document_count:
+                return []
+            slot_count = len(self._slots)
+            average_length = self._total_length / document_count or 1.0
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[:slot_count] / average_length)
+            scores = np.zeros(slot_count, dtype=np.float64)
+
+            for term, is_prefix in query_terms:
+                candidates = self._expand_prefix(term) if is_prefix else [term]
+                # 前缀展开出的多个词项视为同一个查询词，每篇文档只取得分最高的一个
+                term_scores = scores if len(candidates) == 1 else np.zeros(slot_count, dtype=np.float64)
+                for candidate in candidates:
+                    arrays = self._term_arrays(candidate)
+                    if arrays is None:
+                        continue
+                    slots, frequencies = arrays
+                    idf = math.log(1 + (document_count - len(slots) + 0.5) / (len(slots) + 0.5))
+                    candidate_scores = idf * frequencies * (BM25_K1 + 1) / (frequencies + norms[slots])
+                    if term_scores is scores:
+                        scores[slots] += candidate_scores
+                    else:
+                        term_scores[slots] = np.maximum(term_scores[slots], candidate_scores)
+                if term_scores is not scores:
+                    scores += term_scores
+
+            matched = np.flatnonzero(scores)
+            if not filters and len(matched) > limit:
+                # 只对前 limit 个做完整排序
+                matched = matched[np.argpartition(-scores[matched], limit)[:limit]]
+            ordered = matched[np.argsort(-scores[matched], kind="stable")]
+
+            results = []
+            for slot in ordered:
+                if filters and not self._matches(slot, filters):
+                    continue
+                results.append(dict(self._slots[slot].meta, score=round(float(scores[slot]), 4)))
+                if len(results) >= limit:
+                    break
+
+        search_query_seconds.observe(time.perf_counter() - started)
+        return results
+
+
+# 全局索引：标题/名称权重高于正文
+search_index = InvertedIndex(field_weights={"title": 3.0, "label": 3.0, "category": 1.0, "content": 1.0})
+
+
+def _iter_graph_nodes(graph: Any) -> Iterable[Dict[str, Any]]:
+    nodes = graph.get("nodes", []) if isinstance(graph, dict) else []
+    for node in nodes if isinstance(nodes, list) else []:
+        data = node.get("data") if isinstance(node, dict) else None
+        if isinstance(data, dict) and data.get("id") is not None:
+            yield data
+
+
+def index_prd(record: Dict[str, Any]) -> None:
+    """索引 PRD 记录的标题与正文"""
+    search_index.add_document(
+        f"prd:{record['id']}",
+        {"title": record.get("title", ""), "content": record.get("content", "")},
+        {"type": "prd", "id": record["id"], "title": record.get("title", "")},
+    )
+
+
+def remove_prd(prd_id: str) -> None:
+    search_index.remove_document(f"prd:{prd_id}")
+
+
+def index_knowledge_graph(record: Dict[str, Any]) -> None:
+    """索引知识点图谱中每个节点的名称与类别（替换该图谱原有的索引）"""
+    knowledge_id = record["id"]
+    search_index.remove_group(f"knowledge:{knowledge_id}")
+    for data in _iter_graph_nodes(record.get("graph")):
+        node_id = str(data["id"])
+        category = data.get("category") or data.get("type") or ""
+        search_index.add_document(
+            f"node:{knowledge_id}:{node_id}",
+            {"label": str(data.get("label", "")), "category": str(category)},
+            {
+                "type": "node",
+                "id": node_id,
+                "knowledge_id": knowledge_id,
+                "knowledge_name": record.get("name", ""),
+                "title": str(data.get("label", "")),
+                "category": category,
+            },
+            group=f"knowledge:{knowledge_id}",
+        )
+
+
+def remove_knowledge_graph(knowledge_id: str) -> None:
+    search_index.remove_group(f"knowledge:{knowledge_id}")
+
+
+def rebuild_from_records(prd_records: Iterable[Any], knowledge_records: Iterable[Any]) -> int:
+    """从存储中的全部记录重建索引，返回索引的文档数（跳过缺少 id 的文件）"""
+    search_index.clear()
+    for record in prd_records:
+        if isinstance(record, dict) and record.get("id"):
+            index_prd(record)
+    for record in knowledge_records:
+        if isinstance(record, dict) and record.get("id"):
+            index_knowledge_graph(record)
+    return len(search_index)
@@ -0,0 +1,179 @@
+"""
+服务配置：启动时从环境变量与 .env 构建一次并校验，所有组件共用同一份配置对象
+
+- get_settings() 返回当前配置（不可修改）；reload_settings() 重新读取 .env 并整体替换，
+  由 SIGHUP 信号或管理接口 POST /api/admin/settings/reload 触发
+- 重载时进程启动时已有的环境变量优先，.env 中的修改生效；校验失败时保留原配置
+- 其它组件通过 on_reload() 注册回调，在配置替换后收到新配置（如模型客户端池的切换）
+- 日志、存储、追踪等模块在导入时读取的环境变量不在此列，修改后仍需重启
+"""
+import os
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+from dotenv import dotenv_values, find_dotenv
+from pydantic import BaseSettings, Field, ValidationError, validator
+
+
+def _logger():
+    # 延迟导入：日志模块在导入时读取 LOG_* 环境变量，须在 .env 加载之后
+    from utils.logger import get_logger
+    return get_logger(__name__)
+
+
+JSON_MODES = ("json_object", "json_schema", "off")
+
+
+class Settings(BaseSettings):
+    """可热重载的服务配置"""
+
+    api_key: str = Field("", env="API_KEY")
+    fast_model: str = Field("gpt-3.5-turbo", env="FAST_MODEL")
+    slow_model: str = Field("gpt-4", env="SLOW_MODEL")
+    # Executor_MODEL 为旧的变量名，仍然兼容
+    executor_model: str = Field("gpt-4", env=["EXECUTOR_MODEL", "Executor_MODEL"])
+    # PRD、学习内容与测试题先用快模型生成，输出未通过校验时再用慢模型（agents.cascade）
+    llm_cascade: bool = Field(True, env="LLM_CASCADE")
+    # 结构化输出：json_object（JSON 模式）、json_schema（按接口的 JSON Schema 约束）或 off
+    llm_json_mode: str = Field("json_object", env="LLM_JSON_MODE")
+    # 启用对冲请求的任务（逗号分隔，如 learning_content,test_task），见 agents.hedging
+    llm_hedge_tasks: str = Field("", env="LLM_HEDGE_TASKS")
+    # 对冲延迟：首 token 耗时的分位数；样本不足时使用固定延迟（秒）
+    llm_hedge_percentile: float = Field(95.0, env="LLM_HEDGE_PERCENTILE")
+    llm_hedge_delay: float = Field(3.0, env="LLM_HEDGE_DELAY")
+    # 对冲请求最多占调用次数的比例
+    llm_hedge_budget: float = Field(0.1, env="LLM_HEDGE_BUDGET")
+    # 模型客户端连接池的最大连接数（各角色共用）
+    llm_max_connections: int = Field(20, env="LLM_MAX_CONNECTIONS")
+    # 设置后，管理接口需在请求头 X-Admin-Token 中携带该值
+    admin_token: str = Field("", env="ADMIN_TOKEN")
+
+    class Config:
+        case_sensitive = True
+        allow_mutation = False
+
+    @validator("fast_model", "slow_model", "executor_model")
+    def model_not_empty(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("模型名称不能为空")
+        return value
+
+    @validator("llm_json_mode")
+    def known_json_mode(cls, value: str) -> str:
+        if value not in JSON_MODES:
+            raise ValueError(f"LLM_JSON_MODE 只能是 {', '.join(JSON_MODES)}")
+        return value
+
+    @validator("llm_hedge_percentile")
+    def valid_percentile(cls, value: float) -> float:
+        if not 0 < value < 100:
+            raise ValueError("分位数必须在 0 到 100 之间")
+        return value
+
+    @validator("llm_hedge_delay", "llm_hedge_budget")
+    def not_negative(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("不能为负数")
+        return value
+
+    @validator("llm_max_connections")
+    def positive_connections(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("连接数必须大于 0")
+        return value
+
+    def public_dict(self) -> Dict[str, object]:
+        """用于展示的配置：密钥只保留末尾 4 位（较短的密钥完全隐藏）"""
+        data = self.dict()
+        for key in ("api_key", "admin_token"):
+            if data[key]:
+                data[key] = "****" + (data[key][-4:] if len(data[key]) > 12 else "")
+        return data
+
+
+_lock = threading.Lock()
+_settings: Optional[Settings] = None
+_version = 0
+_loaded_at = 0.0
+_listeners: List[Callable[[Settings], None]] = []
+# 进程启动时已有的环境变量名：这些变量优先于 .env，重载时不覆盖
+_process_env_keys = frozenset(os.environ)
+# 上次从 .env 写入的变量名：.env 中删除的变量重载时一并移除
+_dotenv_keys: frozenset = frozenset()
+
+
+def _apply_dotenv() -> None:
+    """把 .env 中的值写入环境变量（进程启动时已有的变量除外），重载时 .env 的修改可以生效"""
+    global _dotenv_keys
+    path = find_dotenv()
+    values = {key: value for key, value in (dotenv_values(path) if path else {}).items()
+              if key not in _process_env_keys and value is not None}
+    for key in _dotenv_keys - values.keys():
+        os.environ.pop(key, None)
+    os.environ.update(values)
+    _dotenv_keys = frozenset(values)
+
+
+def _build() -> Settings:
+    _apply_dotenv()
+    settings = Settings()
+    if "EXECUTOR_MODEL" not in os.environ and "Executor_MODEL" in os.environ:
+        _logger().warning("环境变量 Executor_MODEL 已更名为 EXECUTOR_MODEL，请更新配置")
+    return settings
+
+
+def get_settings() -> Settings:
+    """返回当前配置，首次调用时加载（服务启动时由 main.py 调用）"""
+    settings = _settings
+    if settings is None:
+        with _lock:
+            if _settings is None:
+                _swap(_build())
+            settings = _settings
+    return settings
+
+
+def _swap(settings: Settings) -> None:
+    global _settings, _version, _loaded_at
+    _settings = settings
+    _version += 1
+    _loaded_at = time.time()
+
+
+def settings_info() -> Dict[str, object]:
+    return {"version": _version, "loaded_at": _loaded_at, "settings": get_settings().public_dict()}
+
+
+def on_reload(callback: Callable[[Settings], None]) -> None:
+    """注册配置重载后的回调"""
+    _listeners.append(callback)
+
+
+def reload_settings() -> List[str]:
+    """
+    重新读取 .env 与环境变量并替换当前配置，返回发生变化的配置项
+
+    :raises ValueError: 新配置校验失败（此时保留原配置）
+    """
+    get_settings()
+    with _lock:
+        old = _settings
+        try:
+            new = _build()
+        except ValidationError as e:
+            _logger().error("配置重载失败，保留原配置", error=str(e))
+            raise ValueError(f"配置校验失败: {e}")
+        changed = [key for key, value in new.dict().items() if getattr(old, key) != value]
+        if not changed:
+            return []
+        _swap(new)
+        # 在锁内通知，并发重载时回调按替换顺序执行
+        for callback in list(_listeners):
+            try:
+                callback(new)
+            except Exception:
+                _logger().exception("配置重载回调失败", callback=getattr(callback, "__qualname__", str(callback)))
+    _logger().info("配置已重载", changed=changed, version=_version)
+    return changed
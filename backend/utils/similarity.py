@@ -0,0 +1,174 @@
+"""
+近似重复页面检测：SimHash 指纹 + LSH 分段索引
+
+- 归一化：去掉 script/style/注释等，去掉数字串（时间戳、版本号、统计参数不影响指纹），空白折叠
+- 特征：页面文本的词项三元组（中文按字符二元组切分）+ DOM 标签序列的四元组
+- 指纹：64 位 SimHash，两页面的差异程度用汉明距离衡量
+- 索引：把 64 位切成 max_distance + 1 段，汉明距离不超过 max_distance 的两个指纹
+  至少有一段完全相同（抽屉原理），因此只需比对某一段相同的候选，查询为亚线性
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils.metrics import registry
+from utils.search_index import tokenize
+
+FINGERPRINT_BITS = 64
+
+duplicate_lookup_seconds = registry.histogram("duplicate_lookup_seconds", "近似重复查询耗时（秒）")
+duplicate_candidates = registry.histogram(
+    "duplicate_candidates", "每次查询需要比对的候选指纹数", buckets=[0, 1, 2, 4, 8, 16, 32, 64, 128, 256]
+)
+
+_REMOVED_BLOCKS = re.compile(
+    r"<(script|style|noscript|template|svg)\b[^>]*>.*?</\1\s*>|<!--.*?-->",
+    re.IGNORECASE | re.DOTALL
+)
+_TAG_PATTERN = re.compile(r"<\s*([a-zA-Z][a-zA-Z0-9-]*)[^>]*>")
+_ANY_TAG = re.compile(r"<[^>]+>")
+_ENTITY = re.compile(r"&[a-zA-Z0-9#]+;")
+_DIGITS = re.compile(r"\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+# 文本特征与结构特征的权重
+TEXT_WEIGHT = 1.0
+DOM_WEIGHT = 0.5
+
+
+def normalize_html(html: str) -> Tuple[str, List[str]]:
+    """
+    归一化 HTML，返回 (页面文本, 标签序列)
+    """
+    html = _REMOVED_BLOCKS.sub(" ", html or "")
+    tags = [tag.lower() for tag in _TAG_PATTERN.findall(html)]
+    text = _ENTITY.sub(" ", _ANY_TAG.sub(" ", html))
+    text = _DIGITS.sub(" ", text)
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    return text, tags
+
+
+def _shingles(items: List[str], size: int) -> List[str]:
+    if len(items) <= size:
+        return [" ".join(items)] if items else []
+    return [" ".join(items[i:i + size]) for i in range(len(items) - size + 1)]
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(weighted_features: Dict[str, float]) -> int:
+    """计算 64 位 SimHash 指纹"""
+    vector = [0.0] * FINGERPRINT_BITS
+    for feature, weight in weighted_features.items():
+        value = _hash64(feature)
+        for bit in range(FINGERPRINT_BITS):
+            if value >> bit & 1:
+                vector[bit] += weight
+            else:
+                vector[bit] -= weight
+    fingerprint = 0
+    for bit in range(FINGERPRINT_BITS):
+        if vector[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def page_fingerprint(html: str) -> int:
+    """计算网页的 SimHash 指纹（文本 + DOM 结构）"""
+    text, tags = normalize_html(html)
+    features: Dict[str, float] = {}
+    for shingle in _shingles(tokenize(text), 3):
+        features["t:" + shingle] = features.get("t:" + shingle, 0.0) + TEXT_WEIGHT
+    for shingle in _shingles(tags, 4):
+        features["d:" + shingle] = features.get("d:" + shingle, 0.0) + DOM_WEIGHT
+    return simhash(features)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def similarity_score(distance: int) -> float:
+    """把汉明距离换算成 0~1 的相似度"""
+    return round(1 - distance / FINGERPRINT_BITS, 4)
+
+
+class SimHashIndex:
+    """
+    按 LSH 分段组织的指纹索引，查找汉明距离不超过 max_distance 的已知指纹
+    """
+
+    def __init__(self, max_distance: int = 3):
+        if not 0 <= max_distance < FINGERPRINT_BITS // 2:
+            raise ValueError(f"max_distance 超出范围: {max_distance}")
+        self.max_distance = max_distance
+        # 把 64 位尽量均匀地分成 max_distance + 1 段，记录每段的 (起始位, 位数)
+        band_count = max_distance + 1
+        widths = [FINGERPRINT_BITS // band_count + (1 if i < FINGERPRINT_BITS % band_count else 0)
+                  for i in range(band_count)]
+        self._bands = []
+        offset = 0
+        for width in widths:
+            self._bands.append((offset, width))
+            offset += width
+        self._tables: List[Dict[int, set]] = [{} for _ in self._bands]
+        self._fingerprints: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        return [fingerprint >> offset & ((1 << width) - 1) for offset, width in self._bands]
+
+    def add(self, key: str, fingerprint: int) -> None:
+        with self._lock:
+            self._remove(key)
+            self._fingerprints[key] = fingerprint
+            for table, band_key in zip(self._tables, self._band_keys(fingerprint)):
+                table.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        fingerprint = self._fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        for table, band_key in zip(self._tables, self._band_keys(fingerprint)):
+            members = table.get(band_key)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del table[band_key]
+
+    def find(self, fingerprint: int, max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        查找近似重复，返回按汉明距离升序的 (key, 距离) 列表
+
+        :param max_distance: 本次查询的距离阈值，不能超过建索引时的 max_distance
+        """
+        started = time.perf_counter()
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        with self._lock:
+            candidates = set()
+            for table, band_key in zip(self._tables, self._band_keys(fingerprint)):
+                candidates.update(table.get(band_key, ()))
+            matches = []
+            for key in candidates:
+                distance = hamming_distance(fingerprint, self._fingerprints[key])
+                if distance <= limit:
+                    matches.append((key, distance))
+        duplicate_candidates.observe(len(candidates))
+        duplicate_lookup_seconds.observe(time.perf_counter() - started)
+        return sorted(matches, key=lambda item: item[1])
+
+
+# 已分析页面的指纹索引，阈值可通过环境变量调整（默认汉明距离 3，约 95% 相似）
+duplicate_index = SimHashIndex(max_distance=int(os.getenv("DUPLICATE_MAX_DISTANCE", "3")))
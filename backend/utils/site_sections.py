@@ -0,0 +1,259 @@
+"""
+示例网页的分段管理：按知识点组件把生成的页面拆分为分段，只重新生成输入发生变化的分段
+
+- 分段：ID 符合 `[知识点ID]_[组件类型]` 规范的最外层元素，嵌套在其中的其它知识点组件归入同一分段
+- 清单（manifest）：记录生成页面时各知识点的输入哈希、页面级输入（PRD、用户备注）的哈希，以及各分段的内容哈希
+- 再次生成时与清单比对：只有关联知识点发生变化的分段需要重新生成，新增知识点生成新分段插入页面，
+  删除的知识点对应分段直接移除；页面级输入变化或页面已被改动时回退为整页生成
+"""
+import hashlib
+import json
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional
+
+MANIFEST_VERSION = 1
+
+# 需要重新生成的分段超过该比例时，直接整页生成更划算
+FULL_REGENERATION_RATIO = 0.6
+
+# 没有结束标签的元素
+_VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr",
+}
+
+
+def _hash(value: Any) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+def graph_node_data(graph: Any) -> Dict[str, Dict[str, Any]]:
+    """知识点图谱中各节点的 data，按节点ID索引"""
+    nodes = {}
+    for node in graph.get("nodes", []) if isinstance(graph, dict) else []:
+        data = node.get("data") if isinstance(node, dict) else None
+        if isinstance(data, dict) and data.get("id") is not None:
+            nodes.setdefault(str(data["id"]), data)
+    return nodes
+
+
+def node_hashes(graph: Any) -> Dict[str, str]:
+    """各知识点输入的哈希"""
+    return {node_id: _hash(data) for node_id, data in graph_node_data(graph).items()}
+
+
+def page_hash(prd_content: str, user_note: str = "") -> str:
+    """页面级输入（参考网站 PRD、用户备注）的哈希，变化时整页重新生成"""
+    return _hash({"prd": prd_content or "", "user_note": user_note or ""})
+
+
+def node_for_element_id(element_id: str, node_ids: Iterable[str]) -> Optional[str]:
+    """按 `[知识点ID]_[组件类型]` 规范找出组件所属的知识点（取最长匹配）"""
+    best = None
+    for node_id in node_ids:
+        if element_id == node_id or element_id.startswith(node_id + "_"):
+            if best is None or len(node_id) > len(best):
+                best = node_id
+    return best
+
+
+class _SectionParser(HTMLParser):
+    """记录每个分段在页面中的起止位置（字符偏移）"""
+
+    def __init__(self, html: str, node_ids: Iterable[str]):
+        super().__init__(convert_charrefs=False)
+        self.html = html
+        self.node_ids = list(node_ids)
+        self.line_starts = [0]
+        for index, char in enumerate(html):
+            if char == "\n":
+                self.line_starts.append(index + 1)
+        # 栈中每项为 (标签名, 所在分段下标或 None)
+        self.stack: List[tuple] = []
+        self.sections: List[Dict[str, Any]] = []
+        self.open_section: Optional[int] = None
+        self.seen_ids = set()
+
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+
+    def _match(self, attrs) -> Optional[tuple]:
+        element_id = dict(attrs).get("id")
+        if not element_id or element_id in self.seen_ids:
+            return None
+        node_id = node_for_element_id(element_id, self.node_ids)
+        if node_id is None:
+            return None
+        self.seen_ids.add(element_id)
+        return element_id, node_id
+
+    def handle_starttag(self, tag, attrs):
+        start = self._offset()
+        match = self._match(attrs)
+        if match is not None:
+            if self.open_section is None:
+                self.sections.append({"id": match[0], "start": start, "end": None, "node_ids": {match[1]}})
+                if tag in _VOID_ELEMENTS:
+                    self.sections[-1]["end"] = start + len(self.get_starttag_text())
+                    return
+                self.stack.append((tag, len(self.sections) - 1))
+                self.open_section = len(self.sections) - 1
+                return
+            self.sections[self.open_section]["node_ids"].add(match[1])
+        if tag not in _VOID_ELEMENTS:
+            self.stack.append((tag, None))
+
+    def handle_startendtag(self, tag, attrs):
+        start = self._offset()
+        match = self._match(attrs)
+        if match is None:
+            return
+        if self.open_section is None:
+            self.sections.append({
+                "id": match[0], "start": start,
+                "end": start + len(self.get_starttag_text()), "node_ids": {match[1]},
+            })
+        else:
+            self.sections[self.open_section]["node_ids"].add(match[1])
+
+    def handle_endtag(self, tag):
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        # 未闭合的子元素（如省略结束标签的 li / p）随父元素一起结束
+        while self.stack:
+            open_tag, section = self.stack.pop()
+            if section is not None:
+                end = self.html.find(">", self._offset()) + 1
+                self.sections[section]["end"] = end
+                self.open_section = None
+            if open_tag == tag:
+                break
+
+
+def extract_sections(html: str, node_ids: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    按知识点组件ID拆分页面
+
+    :return: 按出现顺序排列的分段列表，每项含 id、start、end、node_ids、hash；未闭合的分段会被忽略
+    """
+    parser = _SectionParser(html, node_ids)
+    parser.feed(html)
+    parser.close()
+    sections = []
+    for section in parser.sections:
+        if section["end"] is None:
+            continue
+        sections.append({
+            "id": section["id"],
+            "start": section["start"],
+            "end": section["end"],
+            "node_ids": sorted(section["node_ids"]),
+            "hash": _hash(html[section["start"]:section["end"]]),
+        })
+    return sections
+
+
+def build_manifest(html: str, graph: Any, prd_content: str, user_note: str = "") -> Dict[str, Any]:
+    """生成页面的分段清单，随任务结果保存，作为下次增量生成的比对基准"""
+    nodes = node_hashes(graph)
+    return {
+        "version": MANIFEST_VERSION,
+        "page_hash": page_hash(prd_content, user_note),
+        "nodes": nodes,
+        "sections": [
+            {"id": section["id"], "node_ids": section["node_ids"], "hash": section["hash"]}
+            for section in extract_sections(html, nodes)
+        ],
+    }
+
+
+def plan_regeneration(manifest: Any, html: str, graph: Any, prd_content: str,
+                      user_note: str = "") -> Dict[str, Any]:
+    """
+    比对基准任务的清单与新的输入，决定生成方式
+
+    :return: {"mode": "full" | "sections" | "unchanged", "reason",
+              "regenerate": 需重新生成的分段ID, "remove": 需移除的分段ID, "new_nodes": 需新增分段的知识点ID,
+              "base_node_ids": 基准页面的知识点ID（用于在基准页面中定位分段）}
+    """
+    def full(reason: str) -> Dict[str, Any]:
+        return {"mode": "full", "reason": reason, "regenerate": [], "remove": [], "new_nodes": [],
+                "base_node_ids": []}
+
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return full("基准任务没有分段清单")
+    if manifest.get("page_hash") != page_hash(prd_content, user_note):
+        return full("PRD 或用户备注发生变化")
+
+    old_nodes = manifest.get("nodes", {})
+    new_nodes = node_hashes(graph)
+    recorded = manifest.get("sections", [])
+    if not recorded:
+        return full("基准页面中没有可识别的分段")
+
+    current = {section["id"]: section for section in extract_sections(html, old_nodes)}
+    for section in recorded:
+        if section["id"] not in current or current[section["id"]]["hash"] != section["hash"]:
+            return full("基准页面已被修改")
+
+    changed = {node_id for node_id, value in new_nodes.items()
+               if node_id in old_nodes and old_nodes[node_id] != value}
+    removed_nodes = set(old_nodes) - set(new_nodes)
+    added = [node_id for node_id in new_nodes if node_id not in old_nodes]
+
+    # 变化的知识点如果没有对应分段（如章节节点），不影响页面
+    regenerate, remove = [], []
+    for section in recorded:
+        node_ids = set(section["node_ids"])
+        if node_ids <= removed_nodes:
+            remove.append(section["id"])
+        elif node_ids & (changed | removed_nodes):
+            regenerate.append(section["id"])
+
+    if not regenerate and not remove and not added:
+        mode = "unchanged"
+        reason = "输入未发生变化"
+    elif len(regenerate) + len(added) > FULL_REGENERATION_RATIO * max(len(recorded), 1):
+        return full("变化的分段过多")
+    else:
+        mode = "sections"
+        reason = f"重新生成 {len(regenerate)} 个分段，新增 {len(added)} 个，移除 {len(remove)} 个"
+    return {"mode": mode, "reason": reason, "regenerate": regenerate, "remove": remove, "new_nodes": added,
+            "base_node_ids": list(old_nodes)}
+
+
+def splice_sections(html: str, node_ids: Iterable[str], replacements: Dict[str, str],
+                    remove: Iterable[str] = (), insert: Iterable[str] = ()) -> str:
+    """
+    把重新生成的分段拼接回页面
+
+    :param replacements: {分段ID: 新的分段HTML}
+    :param remove: 需要移除的分段ID
+    :param insert: 新增的分段HTML，插入到最后一个分段之后
+    """
+    sections = extract_sections(html, node_ids)
+    remove = set(remove)
+    insert = list(insert)
+    edits = []
+    for section in sections:
+        if section["id"] in remove:
+            edits.append((section["start"], section["end"], ""))
+        elif section["id"] in replacements:
+            edits.append((section["start"], section["end"], replacements[section["id"]]))
+    if insert:
+        if sections:
+            position = sections[-1]["end"]
+        else:
+            lowered = html.lower()
+            position = lowered.rfind("</body>")
+            if position < 0:
+                position = len(html)
+        edits.append((position, position, "".join("\n" + block for block in insert)))
+
+    # 从后往前替换，前面分段的偏移不受影响
+    for start, end, text in sorted(edits, reverse=True):
+        html = html[:start] + text + html[end:]
+    return html
@@ -0,0 +1,248 @@
+"""
+静态文件响应：为生成网页的素材提供条件请求、长缓存与 Range 分段下载
+
+本地文件直接发送（支持零拷贝）；非本地存储后端中的对象按块流式读取
+"""
+import os
+import re
+import stat
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+import anyio
+from starlette.concurrency import iterate_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from utils.storage import StorageBackend
+
+# 文件名中带内容哈希（如 app.3f9a1c2b.js、hero-5d41402abc4b.png）时内容永不变化，可长期缓存
+HASHED_NAME_PATTERN = re.compile(r"[.\-_][0-9a-fA-F]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# ASGI 零拷贝扩展（服务器支持时直接 sendfile，否则回退为分块读取）
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """根据修改时间和大小生成 ETag"""
+    return _version_etag(stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def _version_etag(version: int, size: int) -> str:
+    etag_base = f"{version}-{size}"
+    return '"' + hashlib.md5(etag_base.encode()).hexdigest() + '"'
+
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range 请求头
+
+    :return: (start, end) 闭区间；无法满足时返回 (-1, -1)；格式不支持（如多段）时返回 None
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header)
+    if not match:
+        return None
+    start_str, end_str = match.groups()
+    if not start_str and not end_str:
+        return None
+
+    if not start_str:
+        # bytes=-N：最后 N 个字节
+        suffix_length = int(end_str)
+        if suffix_length == 0 or file_size == 0:
+            return (-1, -1)
+        return (max(file_size - suffix_length, 0), file_size - 1)
+
+    start = int(start_str)
+    end = int(end_str) if end_str else file_size - 1
+    if start >= file_size or start > end:
+        return (-1, -1)
+    return (start, min(end, file_size - 1))
+
+
+class StaticFileResponse(Response):
+    """
+    支持 Range 与零拷贝的文件响应
+
+    与 starlette 的 FileResponse 不同，这里只发送 [offset, offset + count) 区间，
+    且在 ASGI 服务器声明零拷贝扩展时直接交给服务器 sendfile。
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+        offset: int = 0,
+        count: Optional[int] = None,
+        method: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.status_code = status_code
+        self.offset = offset
+        self.count = stat_result.st_size - offset if count is None else count
+        self.send_header_only = method is not None and method.upper() == "HEAD"
+        self.media_type = media_type or guess_type(path)[0] or "application/octet-stream"
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.send_header_only or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": ZERO_COPY_EXTENSION,
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+            if remaining > 0:
+                # 文件在发送过程中被截断，结束响应体
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _is_not_modified(request: Request, etag: str, modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(modified) <= since
+    return False
+
+
+def _cache_headers(name: str, etag: str, modified: float) -> dict:
+    cache_control = (
+        IMMUTABLE_CACHE_CONTROL
+        if HASHED_NAME_PATTERN.search(os.path.basename(name))
+        else REVALIDATE_CACHE_CONTROL
+    )
+    return {
+        "etag": etag,
+        "last-modified": formatdate(modified, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+
+
+async def build_static_response(request: Request, path: str) -> Response:
+    """
+    为本地文件构造响应：处理 ETag/Last-Modified 条件请求、缓存策略和 Range 分段
+
+    :param request: 当前请求
+    :param path: 已校验过的文件绝对路径
+    """
+    stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+
+    etag = make_etag(stat_result)
+    headers = _cache_headers(path, etag, stat_result.st_mtime)
+
+    if _is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    file_size = stat_result.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_range_header(range_header, file_size)
+        if byte_range == (-1, -1):
+            headers["content-range"] = f"bytes */{file_size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+            return StaticFileResponse(
+                path,
+                stat_result,
+                status_code=206,
+                headers=headers,
+                offset=start,
+                count=end - start + 1,
+                method=request.method,
+            )
+
+    return StaticFileResponse(path, stat_result, headers=headers, method=request.method)
+
+
+async def build_storage_response(request: Request, backend: StorageBackend, key: str) -> Response:
+    """
+    为存储后端中的对象构造响应：本地后端按文件发送（零拷贝），其它后端分块流式读取，
+    条件请求、缓存策略和 Range 分段的处理与本地文件一致
+
+    :raises FileNotFoundError: 对象不存在
+    """
+    path = backend.local_path(key)
+    if path is not None:
+        return await build_static_response(request, path)
+
+    info = await anyio.to_thread.run_sync(backend.stat, key)
+    if info is None:
+        raise FileNotFoundError(key)
+    etag = _version_etag(info.version, info.size)
+    headers = _cache_headers(key, etag, info.modified)
+    if _is_not_modified(request, etag, info.modified):
+        return Response(status_code=304, headers=headers)
+
+    status_code, offset, count = 200, 0, info.size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_range_header(range_header, info.size)
+        if byte_range == (-1, -1):
+            headers["content-range"] = f"bytes */{info.size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{info.size}"
+            status_code, offset, count = 206, start, end - start + 1
+
+    headers["content-length"] = str(count)
+    media_type = guess_type(key)[0] or "application/octet-stream"
+    if request.method.upper() == "HEAD" or count == 0:
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    chunks = await anyio.to_thread.run_sync(backend.open_read, key, offset, count)
+    if chunks is None:
+        raise FileNotFoundError(key)
+    return StreamingResponse(iterate_in_threadpool(chunks), status_code=status_code,
+                             headers=headers, media_type=media_type)
@@ -0,0 +1,807 @@
+"""
+存储后端：记录、任务产物、上传文件统一按键（如 prd/<id>.json、results/project/<task_id>/public/index.html）读写
+
+- LocalStorage：本地目录（默认 data/），写入走组提交，保证崩溃安全
+- SQLiteStorage：单个 SQLite 数据库中的 blob 表，WAL 模式，连接池复用连接
+- S3Storage：S3 兼容对象存储（AWS S3、MinIO 等），需要安装 boto3；多个 API 节点可共享同一存储
+
+三种后端都提供原子的条件写入（put_if / append_if，按 get_versioned 返回的版本标记比较后写入）：
+本地目录为文件锁（flock），SQLite 为 BEGIN IMMEDIATE 事务，S3 为带 If-Match / If-None-Match 的 PUT。
+记录的补丁以此保证多个进程或节点共享同一存储时不会丢失并发的修改
+
+通过环境变量 STORAGE_URL 选择后端：
+    data                                    本地目录（默认）
+    sqlite:///data/storage.db               SQLite 数据库文件
+    s3://bucket/prefix?endpoint_url=http://127.0.0.1:9000&region=us-east-1
+                                            S3 兼容存储（本地可用 MinIO 等替代服务测试）
+
+所有方法都是阻塞调用，应通过 file_manager.run_io 在 I/O 线程池中执行
+"""
+import os
+import stat
+import fcntl
+import hashlib
+import time
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from utils.atomic_writer import fsync_directory, group_committer, remove_stale_temp_files, temp_path_for
+from utils.metrics import registry
+
+
+def _import_boto3():
+    """
+    可选依赖：只有使用 S3 后端时才需要，创建 S3 后端时才导入（boto3 导入耗时约 0.1 秒，不计入服务启动）
+    """
+    try:
+        import boto3
+        from botocore.config import Config as BotoConfig
+        from botocore.exceptions import ClientError
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("使用 S3 存储需要安装 boto3")
+    return boto3, BotoConfig, ClientError
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# SQLite / S3 连接池大小
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", "16"))
+
+storage_bytes_read = registry.counter("storage_bytes_read", "从存储后端读取的字节数")
+storage_bytes_written = registry.counter("storage_bytes_written", "写入存储后端的字节数")
+
+
+class StorageStat(NamedTuple):
+    """
+    对象的版本信息
+
+    version 在内容变化时改变（本地为 mtime_ns，SQLite 为写入序号，S3 由 ETag 换算），用作缓存版本与 HTTP ETag
+    """
+    version: int
+    size: int
+    modified: float
+
+
+class PreconditionFailed(Exception):
+    """条件写入失败：对象在读取之后已被其它写入方修改（或已被创建 / 删除）"""
+
+    def __init__(self, key: str):
+        super().__init__(f"对象已被修改: {key}")
+        self.key = key
+
+
+def check_key(key: str) -> str:
+    """校验存储键：使用 / 分隔的相对路径，不允许 .. 和空片段"""
+    if not key or key.startswith("/") or "\\" in key or "\x00" in key:
+        raise ValueError(f"非法的存储键: {key}")
+    if any(part in ("", ".", "..") for part in key.split("/")):
+        raise ValueError(f"非法的存储键: {key}")
+    return key
+
+
+def join_key(*parts: str) -> str:
+    return "/".join(part.strip("/") for part in parts if part and part.strip("/"))
+
+
+class StorageBackend:
+    """
+    存储后端接口
+
+    子类至少实现 get / put / delete / stat / list；流式读写、批量读取、追加写入有通用实现，
+    后端有更高效的方式时覆盖
+    """
+    name = "base"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取完整内容，不存在时返回 None"""
+        raise NotImplementedError
+
+    def put(self, key: str, data: bytes) -> None:
+        """写入（覆盖），返回时已持久化"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        """删除，返回是否确实存在"""
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[StorageStat]:
+        raise NotImplementedError
+
+    def list(self, prefix: str, recursive: bool = False) -> List[str]:
+        """
+        列出 prefix 目录下的条目，返回相对 prefix 的名称
+
+        :param recursive: 是否包含子目录中的条目（名称中带 /）
+        """
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """批量读取，结果中不包含不存在的键"""
+        result = {}
+        for key in keys:
+            data = self.get(key)
+            if data is not None:
+                result[key] = data
+        return result
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def open_read(self, key: str, offset: int = 0, length: Optional[int] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+        """流式读取 [offset, offset + length) 区间，不存在时返回 None"""
+        data = self.get(key)
+        if data is None:
+            return None
+        end = len(data) if length is None else min(len(data), offset + length)
+
+        def chunks():
+            for start in range(offset, end, chunk_size):
+                yield data[start:min(start + chunk_size, end)]
+        return chunks()
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> int:
+        """流式写入，返回写入的字节数"""
+        data = b"".join(chunks)
+        self.put(key, data)
+        return len(data)
+
+    def get_versioned(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """读取内容及其版本标记，不存在时返回 (None, None)；版本标记用于 put_if / append_if"""
+        raise NotImplementedError
+
+    def put_if(self, key: str, data: bytes, token: Optional[str]) -> None:
+        """
+        条件写入：仅当对象的版本标记仍为 token（None 表示对象不存在）时写入，否则抛出 PreconditionFailed
+
+        比较与写入是原子的，多个进程或节点同时写入同一对象时只有一个成功
+        """
+        raise NotImplementedError
+
+    def append_if(self, key: str, data: bytes, token: Optional[str]) -> None:
+        """条件追加，语义同 put_if"""
+        content, current = self.get_versioned(key)
+        if current != token:
+            raise PreconditionFailed(key)
+        self.put_if(key, (content or b"") + data, token)
+
+    def append(self, key: str, data: bytes) -> None:
+        """追加写入（不存在时创建），返回时已持久化；通用实现为条件读写，与其它写入方冲突时重试"""
+        while True:
+            content, token = self.get_versioned(key)
+            try:
+                self.put_if(key, (content or b"") + data, token)
+                return
+            except PreconditionFailed:
+                continue
+
+    def local_path(self, key: str) -> Optional[str]:
+        """对象在本地文件系统中的路径（仅本地后端），可用于 mmap、sendfile 等零拷贝读取"""
+        return None
+
+    def cleanup(self, prefix: str) -> int:
+        """清理崩溃遗留的临时数据，返回清理的条目数"""
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+class LocalStorage(StorageBackend):
+    """本地目录存储：键即相对根目录的路径"""
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *check_key(key).split("/"))
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+        storage_bytes_read.inc(len(data), backend=self.name)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        # 临时文件 + fsync + rename，崩溃时不会留下截断的文件；并发写入由组提交合并刷盘
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        group_committer.write(path, data)
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def get_versioned(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        # 版本标记与 S3 的 ETag 一致取内容的 MD5：文件被替换后 inode 可能复用、mtime 精度有限，都不可靠
+        data = self.get(key)
+        return data, (_content_token(data) if data is not None else None)
+
+    def put_if(self, key: str, data: bytes, token: Optional[str]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if token is None:
+            _create_exclusive(path, data)
+        else:
+            with _locked_file(key, path, token):
+                # 持有旧文件的锁完成 rename，等待中的写入方获得锁后发现文件已被替换
+                group_committer.write(path, data)
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def append_if(self, key: str, data: bytes, token: Optional[str]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if token is None:
+            _create_exclusive(path, data)
+        else:
+            with _locked_file(key, path, token) as fd:
+                _truncate_partial_tail(fd)
+                _write_all(fd, data)
+                os.fsync(fd)
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = temp_path_for(path)
+        total = 0
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    total += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        fsync_directory(os.path.dirname(path))
+        storage_bytes_written.inc(total, backend=self.name)
+        return total
+
+    def open_read(self, key: str, offset: int = 0, length: Optional[int] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+        try:
+            f = open(self._path(key), "rb")
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+
+        def chunks():
+            with f:
+                f.seek(offset)
+                remaining = length
+                while remaining is None or remaining > 0:
+                    chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    storage_bytes_read.inc(len(chunk), backend=self.name)
+                    yield chunk
+        return chunks()
+
+    def append(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        created = not os.path.exists(path)
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            _truncate_partial_tail(fd)
+            _write_all(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        if created:
+            fsync_directory(os.path.dirname(path))
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def delete(self, key: str) -> bool:
+        path = self._path(key)
+        try:
+            os.remove(path)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return False
+        fsync_directory(os.path.dirname(path))
+        return True
+
+    def stat(self, key: str) -> Optional[StorageStat]:
+        try:
+            stat_result = os.stat(self._path(key))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return StorageStat(stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_mtime)
+
+    def list(self, prefix: str, recursive: bool = False) -> List[str]:
+        directory = self._path(prefix) if prefix else self.root
+        if not os.path.isdir(directory):
+            return []
+        if not recursive:
+            with os.scandir(directory) as entries:
+                return [entry.name for entry in entries if entry.is_file()]
+        names = []
+        for current, _, filenames in os.walk(directory):
+            relative = os.path.relpath(current, directory)
+            for filename in filenames:
+                names.append(filename if relative == "." else join_key(relative.replace(os.sep, "/"), filename))
+        return names
+
+    def cleanup(self, prefix: str) -> int:
+        return remove_stale_temp_files(self._path(prefix) if prefix else self.root)
+
+
+def _content_token(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _read_all(fd: int) -> bytes:
+    chunks, offset = [], 0
+    while True:
+        chunk = os.pread(fd, DEFAULT_CHUNK_SIZE, offset)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+        offset += len(chunk)
+
+
+def _create_exclusive(path: str, data: bytes) -> None:
+    """仅当文件不存在时创建：先写好临时文件再 link，其它写入方不会看到写了一半的内容"""
+    temp_path = temp_path_for(path)
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            raise PreconditionFailed(path)
+    finally:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+    fsync_directory(os.path.dirname(path))
+
+
+@contextmanager
+def _locked_file(key: str, path: str, token: str):
+    """
+    对已存在的文件加排他锁（flock，跨进程有效）并核对版本标记，返回可追加写入的 fd
+
+    加锁期间文件可能已被 rename 替换：核对路径当前的 inode，已替换时视为版本不一致
+    """
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_APPEND)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        raise PreconditionFailed(key)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            replaced = os.stat(path).st_ino != os.fstat(fd).st_ino
+        except FileNotFoundError:
+            replaced = True
+        if replaced or _content_token(_read_all(fd)) != token:
+            raise PreconditionFailed(key)
+        yield fd
+    finally:
+        # 关闭 fd 时释放 flock
+        os.close(fd)
+
+
+def _truncate_partial_tail(fd: int) -> None:
+    """截断崩溃遗留的不完整末行（没有以换行结尾）"""
+    size = os.fstat(fd).st_size
+    if size == 0 or os.pread(fd, 1, size - 1) == b"\n":
+        return
+    position = size
+    block = 4096
+    while position > 0:
+        start = max(0, position - block)
+        chunk = os.pread(fd, position - start, start)
+        newline = chunk.rfind(b"\n")
+        if newline >= 0:
+            os.ftruncate(fd, start + newline + 1)
+            return
+        position = start
+    os.ftruncate(fd, 0)
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    SQLite blob 存储：所有对象保存在一张表中，适合大量小记录；
+    连接按需创建并放回池中复用，每个事务只占用一个连接
+    """
+    name = "sqlite"
+
+    # 批量读取时每条 SQL 的最大参数数
+    _BATCH = 500
+
+    # || 的结果是 TEXT，需转换回 BLOB
+    _APPEND_SQL = (
+        "INSERT INTO blobs (key, data, version, size, modified) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET data = CAST(data || excluded.data AS BLOB), version = excluded.version, "
+        "size = size + excluded.size, modified = excluded.modified"
+    )
+
+    def __init__(self, path: str, pool_size: int = STORAGE_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self._last_version = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, version INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, modified REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # 与本地后端一致：提交返回时数据已落盘
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _next_version(self) -> int:
+        # 写入序号：单调递增，同一纳秒内的多次写入也能区分
+        with self._version_lock:
+            self._last_version = max(time.time_ns(), self._last_version + 1)
+            return self._last_version
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT data FROM blobs WHERE key = ?", (check_key(key),)).fetchone()
+        if row is None:
+            return None
+        storage_bytes_read.inc(len(row[0]), backend=self.name)
+        return bytes(row[0])
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = [check_key(key) for key in keys]
+        result = {}
+        with self._connection() as conn:
+            for start in range(0, len(keys), self._BATCH):
+                batch = keys[start:start + self._BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for key, data in conn.execute(
+                    f"SELECT key, data FROM blobs WHERE key IN ({placeholders})", batch
+                ):
+                    result[key] = bytes(data)
+        storage_bytes_read.inc(sum(len(data) for data in result.values()), backend=self.name)
+        return result
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (key, data, version, size, modified) VALUES (?, ?, ?, ?, ?)",
+                (check_key(key), sqlite3.Binary(data), self._next_version(), len(data), time.time())
+            )
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def append(self, key: str, data: bytes) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                self._APPEND_SQL, (check_key(key), sqlite3.Binary(data), self._next_version(), len(data), time.time())
+            )
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    @contextmanager
+    def _transaction(self, key: str, token: Optional[str]):
+        """
+        写事务中核对版本标记：BEGIN IMMEDIATE 立即取得数据库写锁，
+        其它连接（包括其它进程）的写入在提交前无法插入到比较与写入之间
+        """
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT version FROM blobs WHERE key = ?", (key,)).fetchone()
+                if (str(row[0]) if row else None) != token:
+                    raise PreconditionFailed(key)
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def get_versioned(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT data, version FROM blobs WHERE key = ?", (check_key(key),)).fetchone()
+        if row is None:
+            return None, None
+        storage_bytes_read.inc(len(row[0]), backend=self.name)
+        return bytes(row[0]), str(row[1])
+
+    def put_if(self, key: str, data: bytes, token: Optional[str]) -> None:
+        with self._transaction(check_key(key), token) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (key, data, version, size, modified) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), self._next_version(), len(data), time.time())
+            )
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def append_if(self, key: str, data: bytes, token: Optional[str]) -> None:
+        with self._transaction(check_key(key), token) as conn:
+            conn.execute(self._APPEND_SQL, (key, sqlite3.Binary(data), self._next_version(), len(data), time.time()))
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def open_read(self, key: str, offset: int = 0, length: Optional[int] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+        info = self.stat(key)
+        if info is None:
+            return None
+        end = info.size if length is None else min(info.size, offset + length)
+
+        def chunks():
+            # 按块取 substr，不把整个 blob 读入内存，也不在块之间占用连接
+            for start in range(offset, end, chunk_size):
+                with self._connection() as conn:
+                    row = conn.execute(
+                        "SELECT substr(data, ?, ?) FROM blobs WHERE key = ?",
+                        (start + 1, min(chunk_size, end - start), key)
+                    ).fetchone()
+                if row is None or not row[0]:
+                    break
+                storage_bytes_read.inc(len(row[0]), backend=self.name)
+                yield bytes(row[0])
+        return chunks()
+
+    def delete(self, key: str) -> bool:
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM blobs WHERE key = ?", (check_key(key),)).rowcount > 0
+
+    def stat(self, key: str) -> Optional[StorageStat]:
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT version, size, modified FROM blobs WHERE key = ?", (check_key(key),)
+            ).fetchone()
+        return StorageStat(*row) if row else None
+
+    def list(self, prefix: str, recursive: bool = False) -> List[str]:
+        start = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        with self._connection() as conn:
+            if start:
+                # '0' 是 '/' 之后的下一个字符，范围查询可以走主键索引
+                rows = conn.execute(
+                    "SELECT key FROM blobs WHERE key >= ? AND key < ?", (start, start[:-1] + "0")
+                ).fetchall()
+            else:
+                rows = conn.execute("SELECT key FROM blobs").fetchall()
+        names = [row[0][len(start):] for row in rows]
+        return names if recursive else [name for name in names if "/" not in name]
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class _ChunkReader:
+    """把分块迭代器包装成只读文件对象，供 boto3 分段上传"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+        self.total = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.total += len(data)
+        return data
+
+
+class S3Storage(StorageBackend):
+    """
+    S3 兼容对象存储：客户端内部维护 HTTP 连接池（大小为 pool_size），批量读取并发执行
+
+    S3 不支持追加写入，append 为读取后带 If-Match 整体写回，ETag 已变化（412）时重新读取重试
+    """
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, pool_size: int = STORAGE_POOL_SIZE, client=None):
+        boto3, BotoConfig, self._client_error = _import_boto3()
+        if client is None:
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=region,
+                config=BotoConfig(max_pool_connections=pool_size, retries={"max_attempts": 3, "mode": "standard"}),
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="s3-io")
+
+    def _object_key(self, key: str) -> str:
+        return join_key(self.prefix, check_key(key))
+
+    @staticmethod
+    def _is_missing(error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("NoSuchKey", "404", "NotFound")
+
+    @staticmethod
+    def _is_precondition_failed(error) -> bool:
+        # 412：ETag 不一致或对象已存在；409：同一对象的条件写入正在并发进行
+        return error.response.get("Error", {}).get("Code") in (
+            "PreconditionFailed", "412", "ConditionalRequestConflict", "409"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as e:
+            if self._is_missing(e):
+                return None
+            raise
+        data = response["Body"].read()
+        storage_bytes_read.inc(len(data), backend=self.name)
+        return data
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        return {key: data for key, data in zip(keys, self._executor.map(self.get, keys)) if data is not None}
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def get_versioned(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as e:
+            if self._is_missing(e):
+                return None, None
+            raise
+        data = response["Body"].read()
+        storage_bytes_read.inc(len(data), backend=self.name)
+        return data, response["ETag"]
+
+    def put_if(self, key: str, data: bytes, token: Optional[str]) -> None:
+        condition = {"IfNoneMatch": "*"} if token is None else {"IfMatch": token}
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data, **condition)
+        except self._client_error as e:
+            if self._is_precondition_failed(e) or self._is_missing(e):
+                raise PreconditionFailed(key) from e
+            raise
+        storage_bytes_written.inc(len(data), backend=self.name)
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> int:
+        # upload_fileobj 按块读取，大对象自动使用分段上传
+        reader = _ChunkReader(chunks)
+        self.client.upload_fileobj(reader, self.bucket, self._object_key(key))
+        storage_bytes_written.inc(reader.total, backend=self.name)
+        return reader.total
+
+    def open_read(self, key: str, offset: int = 0, length: Optional[int] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if offset or length is not None:
+            if length == 0:
+                return iter(())
+            params["Range"] = f"bytes={offset}-" + (str(offset + length - 1) if length is not None else "")
+        try:
+            response = self.client.get_object(**params)
+        except self._client_error as e:
+            if self._is_missing(e):
+                return None
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return iter(())
+            raise
+
+        def chunks():
+            for chunk in response["Body"].iter_chunks(chunk_size):
+                storage_bytes_read.inc(len(chunk), backend=self.name)
+                yield chunk
+        return chunks()
+
+    def delete(self, key: str) -> bool:
+        if self.stat(key) is None:
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def stat(self, key: str) -> Optional[StorageStat]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as e:
+            if self._is_missing(e):
+                return None
+            raise
+        # ETag 随内容变化（LastModified 只精确到秒），取其前 60 位作为版本
+        etag = response.get("ETag", "").strip('"').split("-")[0]
+        version = int(etag[:15], 16) if etag else 0
+        return StorageStat(version, response["ContentLength"], response["LastModified"].timestamp())
+
+    def list(self, prefix: str, recursive: bool = False) -> List[str]:
+        base = join_key(self.prefix, prefix)
+        base = base + "/" if base else ""
+        params = {"Bucket": self.bucket, "Prefix": base}
+        if not recursive:
+            params["Delimiter"] = "/"
+        names = []
+        for page in self.client.get_paginator("list_objects_v2").paginate(**params):
+            for item in page.get("Contents", []):
+                names.append(item["Key"][len(base):])
+        return names
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def create_storage(url: str) -> StorageBackend:
+    """按 URL 创建存储后端（格式见模块说明）"""
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        # sqlite:///data/storage.db -> data/storage.db；sqlite:////abs/path.db -> /abs/path.db
+        path = parsed.path[1:] if parsed.path.startswith("/") else parsed.path
+        return SQLiteStorage(path)
+    if parsed.scheme == "s3":
+        options = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        return S3Storage(
+            bucket=parsed.netloc,
+            prefix=parsed.path,
+            endpoint_url=options.get("endpoint_url"),
+            region=options.get("region"),
+            pool_size=int(options.get("pool_size", STORAGE_POOL_SIZE)),
+        )
+    if parsed.scheme in ("", "file"):
+        return LocalStorage(parsed.path if parsed.scheme == "file" else url)
+    raise ValueError(f"未知的存储后端: {url}")
+
+
+# 全局存储后端
+storage = create_storage(os.getenv("STORAGE_URL", "data"))
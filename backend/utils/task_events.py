@@ -0,0 +1,275 @@
+"""
+任务事件日志：生成流程的每个阶段向 events/<task_id>.jsonl 追加一行带时间戳的事件
+
+- 追加写入经存储后端持久化（本地后端 fsync），每个任务的事件按 seq 递增编号
+- 内存索引记录每个任务的摘要（状态、当前阶段、事件数、生成的文件、起止时间），
+  按最后更新时间排序，列表查询直接分页，不扫描目录；服务启动时从事件日志重建
+- 索引只在本进程内维护：多个实例共用 STORAGE_URL 时，列表只包含本实例启动时已有的与本实例执行的任务；
+  按任务ID查询时（load_summary）本地索引中没有的任务从存储中的事件日志读取
+- 追加按任务加锁（同一任务的事件按 seq 顺序落盘），存储 I/O 期间不持有全局锁，不同任务的追加互不阻塞
+- 订阅者（实时跟踪接口）在事件追加后立即收到通知，可在任意线程中追加事件
+
+用法：
+    with log_context(task_id=task_id):
+        record_event("generate", "开始生成", model=model)   # task_id 取自日志上下文
+"""
+import time
+import asyncio
+import bisect
+import threading
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.json_codec import dumps
+from utils.delta_log import parse_deltas
+from utils.file_manager import run_io
+from utils.logger import get_context, get_logger
+from utils.metrics import registry
+from utils.storage import StorageBackend, join_key, storage
+
+EVENTS_PREFIX = "events"
+EVENT_LOG_SUFFIX = ".jsonl"
+
+# 任务的最终状态：出现后实时跟踪结束
+TERMINAL_STATUSES = ("success", "failed")
+
+task_events_recorded = registry.counter("task_events_recorded", "追加的任务事件数（按阶段）")
+task_event_subscribers = registry.gauge("task_event_subscribers", "正在实时跟踪任务事件的连接数")
+
+logger = get_logger(__name__)
+
+
+def event_log_key(task_id: str) -> str:
+    if not task_id or "/" in task_id or task_id in (".", ".."):
+        raise ValueError(f"非法的任务ID: {task_id}")
+    return join_key(EVENTS_PREFIX, task_id + EVENT_LOG_SUFFIX)
+
+
+class _Subscriber:
+    """实时跟踪的订阅者：事件经 call_soon_threadsafe 投递到其所在事件循环的队列"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    def notify(self, event: Dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+
+class TaskEventLog:
+    """
+    任务事件日志与摘要索引
+    """
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.backend = backend or storage
+        # 全局锁只保护内存索引与订阅者；按任务ID分片的锁串行化同一任务的追加
+        self._lock = threading.Lock()
+        self._task_locks = [threading.Lock() for _ in range(64)]
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        # (最后更新时间, 任务ID)，按时间升序，分页时倒序遍历
+        self._order: List[Tuple[float, str]] = []
+        self._subscribers: Dict[str, List[_Subscriber]] = {}
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def record(self, stage: str, message: str = "", task_id: Optional[str] = None,
+               status: Optional[str] = None, **fields) -> Optional[Dict[str, Any]]:
+        """
+        追加一条事件，返回事件内容；未指定 task_id 且上下文中也没有时不记录
+
+        :param stage: 流程阶段（如 plan、generate、save）
+        :param status: 任务状态变化（如 running、success、failed），不变时省略
+        """
+        task_id = task_id or get_context().get("task_id")
+        if not task_id:
+            return None
+        key = event_log_key(task_id)
+        # 在任务锁内分配 seq、追加并通知，保证同一任务的事件按 seq 顺序落盘与推送
+        with self._task_lock(task_id):
+            with self._lock:
+                summary = self._summaries.get(task_id)
+                seq = summary["events"] + 1 if summary else 1
+            event = {
+                "seq": seq,
+                "ts": time.time(),
+                "task_id": task_id,
+                "stage": stage,
+                "message": message,
+            }
+            if status is not None:
+                event["status"] = status
+            event.update(fields)
+            self.backend.append(key, dumps(event) + b"\n")
+            with self._lock:
+                self._index(event)
+                subscribers = list(self._subscribers.get(task_id, ()))
+            for subscriber in subscribers:
+                subscriber.notify(event)
+        task_events_recorded.inc(stage=stage)
+        return event
+
+    def _task_lock(self, task_id: str) -> threading.Lock:
+        return self._task_locks[hash(task_id) % len(self._task_locks)]
+
+    def _index(self, event: Dict[str, Any]) -> None:
+        """用一条事件更新任务摘要（调用方持有锁）"""
+        task_id = event["task_id"]
+        summary = self._summaries.get(task_id)
+        if summary is not None:
+            self._remove_order(task_id, summary["updated_at"])
+        summary = self._summaries[task_id] = _apply_event(summary, event)
+        bisect.insort(self._order, (summary["updated_at"], task_id))
+
+    def _remove_order(self, task_id: str, updated_at: float) -> None:
+        position = bisect.bisect_left(self._order, (updated_at, task_id))
+        if position < len(self._order) and self._order[position] == (updated_at, task_id):
+            del self._order[position]
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def summary(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """本地索引中的任务摘要"""
+        with self._lock:
+            summary = self._summaries.get(task_id)
+            return dict(summary) if summary else None
+
+    def load_summary(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        任务摘要：本地索引中没有时（其它实例执行的任务）从存储中的事件日志计算，不加入本地索引
+        （阻塞，调用方放到 I/O 线程池中执行）
+        """
+        summary = self.summary(task_id)
+        if summary is not None:
+            return summary
+        summary = None
+        for event in self.read(task_id):
+            if isinstance(event, dict) and event.get("seq"):
+                summary = _apply_event(summary, event)
+        return summary
+
+    def query(self, status: Optional[str] = None, stage: Optional[str] = None,
+              offset: int = 0, limit: int = 50) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        按最后更新时间倒序分页查询任务摘要
+
+        :return: (当前页的摘要, 满足条件的总数)
+        """
+        with self._lock:
+            if status is None and stage is None:
+                total = len(self._order)
+                end = max(total - offset, 0)
+                start = max(end - limit, 0)
+                page = [dict(self._summaries[task_id]) for _, task_id in reversed(self._order[start:end])]
+                return page, total
+            page, total = [], 0
+            for _, task_id in reversed(self._order):
+                summary = self._summaries[task_id]
+                if (status is None or summary["status"] == status) and (stage is None or summary["stage"] == stage):
+                    if offset <= total < offset + limit:
+                        page.append(dict(summary))
+                    total += 1
+            return page, total
+
+    def read(self, task_id: str, after: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """读取 seq 大于 after 的事件（阻塞，调用方放到 I/O 线程池中执行）"""
+        events = [event for event in parse_deltas(self.backend.get(event_log_key(task_id)))
+                  if event.get("seq", 0) > after]
+        return events[:limit] if limit is not None else events
+
+    # ------------------------------------------------------------------
+    # 维护
+    # ------------------------------------------------------------------
+
+    def delete(self, task_id: str) -> bool:
+        key = event_log_key(task_id)
+        with self._task_lock(task_id):
+            with self._lock:
+                summary = self._summaries.pop(task_id, None)
+                if summary is not None:
+                    self._remove_order(task_id, summary["updated_at"])
+            existed = self.backend.delete(key)
+        return existed or summary is not None
+
+    def rebuild(self) -> int:
+        """从已保存的事件日志重建摘要索引，返回任务数"""
+        names = [name for name in self.backend.list(EVENTS_PREFIX) if name.endswith(EVENT_LOG_SUFFIX)]
+        blobs = self.backend.get_many(join_key(EVENTS_PREFIX, name) for name in names)
+        with self._lock:
+            self._summaries.clear()
+            self._order.clear()
+            for content in blobs.values():
+                for event in parse_deltas(content):
+                    if isinstance(event, dict) and event.get("task_id") and event.get("seq"):
+                        self._index(event)
+            return len(self._summaries)
+
+    # ------------------------------------------------------------------
+    # 实时跟踪
+    # ------------------------------------------------------------------
+
+    def subscribe(self, task_id: str) -> _Subscriber:
+        """订阅任务的新事件（须在事件循环中调用）"""
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(task_id, []).append(subscriber)
+        task_event_subscribers.inc()
+        return subscriber
+
+    def unsubscribe(self, task_id: str, subscriber: _Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(task_id, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+                task_event_subscribers.dec()
+            if not subscribers:
+                self._subscribers.pop(task_id, None)
+
+
+def _apply_event(summary: Optional[Dict[str, Any]], event: Dict[str, Any]) -> Dict[str, Any]:
+    """用一条事件更新任务摘要，summary 为 None 时新建"""
+    if summary is None:
+        summary = {
+            "task_id": event["task_id"], "status": "running", "stage": None, "message": "",
+            "events": 0, "files": [], "created_at": event["ts"], "updated_at": event["ts"],
+        }
+    summary["events"] = event["seq"]
+    summary["stage"] = event["stage"]
+    summary["message"] = event.get("message", "")
+    summary["updated_at"] = event["ts"]
+    if event.get("status"):
+        summary["status"] = event["status"]
+    if isinstance(event.get("files"), list):
+        summary["files"] = event["files"]
+    return summary
+
+
+# 全局任务事件日志
+task_events = TaskEventLog()
+
+
+def record_event(stage: str, message: str = "", task_id: Optional[str] = None,
+                 status: Optional[str] = None, **fields) -> Optional[Dict[str, Any]]:
+    """
+    追加任务事件；写入失败只记录日志，不影响生成流程
+    """
+    try:
+        return task_events.record(stage, message, task_id=task_id, status=status, **fields)
+    except Exception:
+        logger.exception("任务事件写入失败", stage=stage)
+        return None
+
+
+async def record_event_async(stage: str, message: str = "", task_id: Optional[str] = None,
+                             status: Optional[str] = None, **fields) -> Optional[Dict[str, Any]]:
+    """在事件循环中追加任务事件：持久化放到 I/O 线程池中执行"""
+    return await run_io(f"events.{stage}", partial(record_event, stage, message, task_id=task_id,
+                                                  status=status, **fields))
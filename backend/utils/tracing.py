@@ -0,0 +1,435 @@
+"""
+轻量级链路追踪：用嵌套的 span 记录生成流程各阶段（提示词渲染、模型调用、代码解析、写文件、保存任务记录）的耗时
+
+- span 通过 contextvars 嵌套，跨 await、run_io 与 run_blocking 的线程池调用都能找到父 span
+- 结束的 span 按 OpenTelemetry（OTLP/JSON）格式由后台线程批量导出：
+  TRACE_EXPORT_FILE 写入本地文件（每行一个 ExportTraceServiceRequest，可由 Collector 的 otlpjsonfile 接收器读取），
+  OTEL_EXPORTER_OTLP_TRACES_ENDPOINT / OTEL_EXPORTER_OTLP_ENDPOINT 通过 OTLP/HTTP 发送到 Collector
+- trace_summary() 汇总当前链路中已结束的 span，随任务记录保存，在任务状态接口中返回
+
+用法：
+    with span("llm.call", kind=SPAN_KIND_CLIENT, model=model) as current:
+        response = client.chat.completions.create(...)
+        current.set_attribute("response_chars", len(raw))
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.json_codec import dumps
+from utils.logger import RotatingFile, get_context
+from utils.metrics import registry
+
+# 是否启用追踪；关闭时 span() 不做任何记录
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") not in ("0", "false", "False")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "scot-web-backend")
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_EXPORT_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") or (
+    os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "").rstrip("/") + "/v1/traces"
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") else ""
+)
+
+# 每条链路在内存中保留的 span 数上限（用于汇总），超出部分只导出不汇总
+MAX_SPANS_PER_TRACE = 1000
+
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+trace_spans_exported = registry.counter("trace_spans_exported", "导出的 span 数")
+trace_export_errors = registry.counter("trace_export_errors", "span 导出失败次数")
+trace_spans_dropped = registry.counter("trace_spans_dropped", "导出队列已满而丢弃的 span 数")
+
+
+class _Trace:
+    """一条链路：记录已结束的 span，供 trace_summary 汇总"""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.finished: List["Span"] = []
+        self.lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "trace", "span_id", "parent", "depth", "kind", "attributes", "events",
+                 "status", "status_message", "start_ns", "end_ns", "_start")
+
+    def __init__(self, name: str, trace: _Trace, parent: Optional["Span"], kind: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.kind = kind
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._start = time.perf_counter_ns()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def set_error(self, message: str) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.events.append({
+            "name": "exception",
+            "time_ns": time.time_ns(),
+            "attributes": {"exception.type": type(exc).__name__, "exception.message": str(exc)},
+        })
+        self.set_error(str(exc))
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else self.start_ns + time.perf_counter_ns() - self._start
+        return (end - self.start_ns) / 1e6
+
+    def end(self) -> None:
+        # 结束时间按单调时钟计算，避免系统时间调整导致负耗时
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._start
+        with self.trace.lock:
+            if len(self.trace.finished) < MAX_SPANS_PER_TRACE:
+                self.trace.finished.append(self)
+        _exporter.submit(self)
+
+
+class _NoopSpan:
+    """追踪关闭时 span() 返回的占位对象"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Iterator[Span]:
+    """
+    记录一个 span：当前没有父 span 时开启新链路；代码块抛出异常时记录异常并标记为错误
+
+    日志上下文中的 task_id / request_id 自动作为属性附加到根 span
+    """
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+    parent = _current.get()
+    if parent is None:
+        trace = _Trace()
+        for key in ("task_id", "request_id"):
+            value = get_context().get(key)
+            if value is not None:
+                attributes.setdefault(key, value)
+    else:
+        trace = parent.trace
+    current = Span(name, trace, parent, kind, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def trace_summary() -> Optional[Dict[str, Any]]:
+    """
+    汇总当前链路：已结束的 span 按开始时间排列（含层级与相对开始时间），以及按名称合计的耗时
+
+    :return: 不在链路中时返回 None
+    """
+    current = _current.get()
+    if current is None:
+        return None
+    root = current
+    while root.parent is not None:
+        root = root.parent
+    with current.trace.lock:
+        finished = sorted(current.trace.finished, key=lambda item: item.start_ns)
+
+    spans, stages = [], {}
+    for item in finished:
+        entry = {
+            "name": item.name,
+            "depth": item.depth,
+            "start_ms": round((item.start_ns - root.start_ns) / 1e6, 3),
+            "duration_ms": round(item.duration_ms, 3),
+        }
+        if item.status == STATUS_ERROR:
+            entry["error"] = item.status_message
+        spans.append(entry)
+        stage = stages.setdefault(item.name, {"count": 0, "total_ms": 0.0})
+        stage["count"] += 1
+        stage["total_ms"] = round(stage["total_ms"] + item.duration_ms, 3)
+    return {
+        "trace_id": current.trace.trace_id,
+        "duration_ms": round(root.duration_ms, 3),
+        "spans": spans,
+        "stages": stages,
+    }
+
+
+llm_tokens = registry.counter("llm_tokens", "模型调用的 token 数（按模型与类型 input/cached_input/output）")
+llm_prompt_cache_hit_ratio = registry.gauge("llm_prompt_cache_hit_ratio", "输入 token 中命中服务端提示词缓存的比例（按模型）")
+_token_totals_lock = threading.Lock()
+# 模型 -> [输入 token 数, 命中缓存的输入 token 数]
+_token_totals: Dict[str, List[int]] = {}
+
+
+def _cached_tokens(usage: Any) -> Optional[int]:
+    """命中提示词缓存的输入 token 数：OpenAI 为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens")
+    else:
+        cached = getattr(details, "cached_tokens", None)
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    return cached
+
+
+def record_llm_usage(current: Any, response: Any) -> None:
+    """把模型响应中的 token 用量（含命中提示词缓存的部分）按 OpenTelemetry GenAI 语义约定记录到 span，并累计到指标"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    input_tokens = getattr(usage, "prompt_tokens", None)
+    output_tokens = getattr(usage, "completion_tokens", None)
+    cached = _cached_tokens(usage)
+    current.set_attributes(**{
+        "gen_ai.usage.input_tokens": input_tokens,
+        "gen_ai.usage.output_tokens": output_tokens,
+        "gen_ai.usage.cache_read.input_tokens": cached,
+    })
+    model = getattr(response, "model", None) or "unknown"
+    if output_tokens:
+        llm_tokens.inc(output_tokens, model=model, type="output")
+    if not input_tokens:
+        return
+    llm_tokens.inc(input_tokens, model=model, type="input")
+    if cached:
+        llm_tokens.inc(cached, model=model, type="cached_input")
+    with _token_totals_lock:
+        totals = _token_totals.setdefault(model, [0, 0])
+        totals[0] += input_tokens
+        totals[1] += cached or 0
+        llm_prompt_cache_hit_ratio.set(round(totals[1] / totals[0], 4), model=model)
+
+
+# ---------------------------------------------------------------------------
+# OTLP/JSON 导出
+# ---------------------------------------------------------------------------
+
+def _any_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON 中 int64 以字符串表示
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_any_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _any_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(item: Span) -> Dict[str, Any]:
+    """把 span 转换为 OTLP/JSON 的 Span"""
+    data = {
+        "traceId": item.trace.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": item.kind,
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": _attributes(item.attributes),
+        "status": {"code": item.status},
+    }
+    if item.parent is not None:
+        data["parentSpanId"] = item.parent.span_id
+    if item.status_message:
+        data["status"]["message"] = item.status_message
+    if item.events:
+        data["events"] = [{
+            "name": event["name"],
+            "timeUnixNano": str(event["time_ns"]),
+            "attributes": _attributes(event["attributes"]),
+        } for event in item.events]
+    return data
+
+
+def export_request(spans: List[Span]) -> Dict[str, Any]:
+    """组装 OTLP ExportTraceServiceRequest"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{
+            "scope": {"name": "scot-web"},
+            "spans": [to_otlp(item) for item in spans],
+        }],
+    }]}
+
+
+class _SpanExporter:
+    """后台导出线程：攒批（最多 512 个或 1 秒）后写入文件和/或发送到 Collector"""
+
+    BATCH_SIZE = 512
+    FLUSH_INTERVAL = 1.0
+    MAX_QUEUE_SIZE = 10000
+
+    def __init__(self, path: str, endpoint: str):
+        self.path = path
+        self.endpoint = endpoint
+        self.enabled = bool(path or endpoint)
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file: Optional[RotatingFile] = None
+        self._client = None
+
+    def submit(self, item: Span) -> None:
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self._start()
+        if self.queue.qsize() >= self.MAX_QUEUE_SIZE:
+            trace_spans_dropped.inc()
+            return
+        self.queue.put(item)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            if self.path:
+                self._file = RotatingFile(self.path, TRACE_EXPORT_MAX_BYTES, 1)
+            if self.endpoint:
+                # 只有配置了 OTLP 端点时才导入 httpx
+                import httpx
+                self._client = httpx.Client(timeout=5.0)
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch: List[Span] = []
+            deadline = None
+            stop = False
+            while len(batch) < self.BATCH_SIZE:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.FLUSH_INTERVAL
+            if batch:
+                self._export(batch)
+            if stop:
+                return
+
+    def _export(self, batch: List[Span]) -> None:
+        body = dumps(export_request(batch))
+        try:
+            if self._file is not None:
+                self._file.write(body + b"\n")
+            if self._client is not None:
+                response = self._client.post(self.endpoint, content=body,
+                                             headers={"Content-Type": "application/json"})
+                response.raise_for_status()
+            trace_spans_exported.inc(len(batch))
+        except Exception:
+            # 文件写入或 OTLP 请求失败（OSError / httpx.HTTPError）只计数，不影响导出线程
+            trace_export_errors.inc()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """导出队列中剩余的 span 并停止后台线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self.queue.put(None)
+        thread.join(timeout)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+_exporter = _SpanExporter(TRACE_EXPORT_FILE, TRACE_EXPORT_ENDPOINT)
+atexit.register(_exporter.shutdown)
+
+
+def shutdown_tracing() -> None:
+    _exporter.shutdown()
+
+
+class TracingMiddleware:
+    """
+    为每个 HTTP 请求开启一条链路（根 span），路由与各阶段的 span 嵌套在其下
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        with span(method, kind=SPAN_KIND_SERVER, **{"http.request.method": method,
+                                                    "url.path": scope["path"]}) as current:
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        current.set_error(f"HTTP {message['status']}")
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # 路由匹配后按路由模板命名（如 POST /api/execute/），避免按具体路径产生大量名称
+                route = scope.get("route")
+                current.name = f"{method} {getattr(route, 'path', scope['path'])}"
@@ -17,6 +17,11 @@ export const uploadAPI = {
         return apiService.postForm('/api/upload/extract-knowledge', formData);
     },
 
+    // 查找与上传文件近似重复的已分析页面
+    findSimilarPages: (formData) => {
+        return apiService.postForm('/api/upload/similar', formData);
+    },
+
     // 获取上传文件列表
     listFiles: () => {
         return apiService.get('/api/upload/list');
@@ -45,6 +50,11 @@ export const prdAPI = {
         return apiService.get(`/api/prd/${id}`);
     },
 
+    // 增量修改PRD（只提交变化部分）
+    patchPRD: (id, patch, version) => {
+        return apiService.patch(`/api/prd/${id}`, patch, version);
+    },
+
     // 删除PRD
     deletePRD: (id) => {
         return apiService.delete(`/api/prd/${id}`);
@@ -78,6 +88,11 @@ export const knowledgeAPI = {
         return apiService.get(`/api/knowledge/${id}`);
     },
 
+    // 增量修改知识图谱（只提交变化部分）
+    patchKnowledgeGraph: (id, patch, version) => {
+        return apiService.patch(`/api/knowledge/${id}`, patch, version);
+    },
+
     // 删除知识图谱
     deleteKnowledgeGraph: (id) => {
         return apiService.delete(`/api/knowledge/${id}`);
@@ -138,13 +153,35 @@ export const previewAPI = {
 
 // 日志相关API
 export const logsAPI = {
-    // 获取日志列表
-    listLogs: () => {
-        return apiService.get('/api/logs');
+    // 获取日志列表（按最后更新时间倒序分页，可按状态过滤）
+    listLogs: ({ status, offset = 0, limit = 50 } = {}) => {
+        const query = new URLSearchParams({ offset, limit });
+        if (status) {
+            query.set('status', status);
+        }
+        return apiService.get(`/api/logs?${query}`);
     },
 
     // 获取日志详情
     getLogDetail: (taskId) => {
         return apiService.get(`/api/logs/${taskId}`);
+    },
+
+    // 分页读取任务事件
+    getTaskEvents: (taskId, after = 0) => {
+        return apiService.get(`/api/logs/${taskId}/events?after=${after}`);
+    },
+
+    // 实时跟踪任务事件（Server-Sent Events），返回 EventSource，调用方负责 close()
+    tailTaskEvents: (taskId, onEvent, onEnd) => {
+        const source = new EventSource(`/api/logs/${taskId}/tail`);
+        source.addEventListener('task_event', (e) => onEvent(JSON.parse(e.data)));
+        source.addEventListener('end', (e) => {
+            source.close();
+            if (onEnd) {
+                onEnd(JSON.parse(e.data));
+            }
+        });
+        return source;
     }
 };
\ No newline at end of file
@@ -88,6 +88,22 @@ class APIService {
     }
   }
 
+  // PATCH请求（JSON Patch 数组或 Merge Patch 对象），version 为当前版本号时附带 If-Match
+  async patch(url, data, version) {
+    try {
+      const headers = {
+        'Content-Type': Array.isArray(data) ? 'application/json-patch+json' : 'application/merge-patch+json'
+      };
+      if (version !== undefined && version !== null) {
+        headers['If-Match'] = `"${version}"`;
+      }
+      const response = await apiClient.patch(url, data, { headers });
+      return response;
+    } catch (error) {
+      throw this.handleError(error);
+    }
+  }
+
   // DELETE请求
   async delete(url) {
     try {